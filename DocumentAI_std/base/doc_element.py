@@ -1,8 +1,10 @@
 import torch
-from PIL import Image
 from torchvision import transforms
 
 from DocumentAI_std.base.doc_enum import ContentType
+from DocumentAI_std.base.page_cache import PageCache
+
+_to_tensor = transforms.ToTensor()
 
 
 class DocElement:
@@ -108,12 +110,12 @@ class DocElement:
                   - "content": The actual content of the document element.
         """
         return {
-            "x": self.__x,
-            "y": self.__y,
-            "w": self.__w,
-            "h": self.__h,
-            "content_type": self.__content_type,
-            "content": self.__content,
+            "x": self.x,
+            "y": self.y,
+            "w": self.w,
+            "h": self.h,
+            "content_type": self.content_type,
+            "content": self.content,
         }
 
     def to_json(self):
@@ -124,9 +126,9 @@ class DocElement:
         :rtype: dict
         """
         return {
-            "bbox": [self.__x, self.__y, self.__w, self.__h],
-            "content_type": self.__content_type,
-            "content": self.__content,
+            "bbox": [self.x, self.y, self.w, self.h],
+            "content_type": self.content_type,
+            "content": self.content,
         }
 
     def area(self) -> float:
@@ -136,30 +138,28 @@ class DocElement:
         Returns:
             float: The area of the DocElement, calculated as the product of its width (w) and height (h).
         """
-        return self.__h * self.__w
+        return self.h * self.w
 
     def extract_pixels(self, is_gray: bool = True) -> torch.Tensor:
         """
         Extract the pixels from the bounding box region of the image.
 
+        The decoded page is taken from the process-wide `PageCache`, so extracting the
+        pixels of many elements of the same page decodes the image only once.
+
         Args:
             is_gray (bool, optional): Flag to convert the extracted region to grayscale. Defaults to True.
 
         Returns:
             torch.Tensor: A PyTorch tensor representing the pixels within the bounding box.
         """
-        # Open the image using PIL
-        image = Image.open(self.img_path)
+        # Get the decoded page (converted to grayscale if necessary) from the shared cache
+        image = PageCache.get_page(self.img_path, is_gray=is_gray)
 
         # Crop the image to extract the region of interest (ROI) using the bounding box coordinates
-        roi = image.crop((self.__x, self.__y, self.__x + self.__w, self.__y + self.__h))
-
-        # Convert the ROI to grayscale if necessary
-        if is_gray and roi.mode != "L":
-            roi = roi.convert("L")
+        roi = image.crop((self.x, self.y, self.x + self.w, self.y + self.h))
 
         # Convert the PIL image to a PyTorch tensor
-        transform = transforms.ToTensor()
-        roi_tensor = transform(roi).to(self.device)
+        roi_tensor = _to_tensor(roi).to(self.device)
 
         return roi_tensor
@@ -64,13 +64,13 @@ class DocElementClassification(DocElement):
                   - device: The device used.
         """
         return {
-            "x": self.__x,
-            "y": self.__y,
-            "w": self.__w,
-            "h": self.__h,
-            "content_type": self.__content_type,
-            "content": self.__content,
-            "label": self.__label,
+            "x": self.x,
+            "y": self.y,
+            "w": self.w,
+            "h": self.h,
+            "content_type": self.content_type,
+            "content": self.content,
+            "label": self.label,
             "img_path": self.img_path,
             "device": self.device,
         }
@@ -83,5 +83,5 @@ class DocElementClassification(DocElement):
         :rtype: dict
         """
         doc_element_dict = super().to_json()
-        doc_element_dict["label"] = self.__label
+        doc_element_dict["label"] = self.label
         return doc_element_dict
@@ -1,10 +1,16 @@
 import os
-from typing import Any, List
+from typing import Any, List, Optional, Sequence
 
+import numpy as np
+import torch
 from PIL import Image
 
 from DocumentAI_std.base.doc_element import DocElement
 from DocumentAI_std.base.doc_enum import ContentType
+from DocumentAI_std.base.element_list import ElementList
+from DocumentAI_std.base.element_store import ElementStore
+from DocumentAI_std.base.page_cache import PageCache
+from DocumentAI_std.base.spatial_index import SpatialIndex
 
 
 class Document:
@@ -21,6 +27,14 @@ class Document:
     The `shape` attribute contains the shape of the document:
     self.shape: tuple[int, int]
 
+    With `columnar=True` the elements are not stored as individual `DocElement` objects but
+    in an `ElementStore` (one (N, 4) bbox array, one content type code array and one content
+    list). `elements` then returns lightweight views over the store, and `bboxes`,
+    `content_types` and `contents` expose the columns directly.
+
+    Region, point and nearest-neighbor queries go through a `SpatialIndex` built lazily over
+    the element bounding boxes.
+
     Attributes:
         img_path (str): The path to the document image file.
         ocr_output (dict): The output of an OCR engine, containing bounding box and content information.
@@ -29,6 +43,7 @@ class Document:
                 content: List[Any]
             }
         device (str): The device to use for processing (default is "cpu").
+        columnar (bool): Whether to store the elements in columnar arrays (default is False).
 
     Example:
     >>> ocr_output = {
@@ -36,10 +51,21 @@ class Document:
     ...     "content": ["Text 1", "Text 2"]
     ... }
     >>> doc = Document(img_path="/path/to/document.jpg", ocr_output=ocr_output)
+    >>> doc = Document(img_path="/path/to/document.jpg", ocr_output=ocr_output, columnar=True)
+    >>> doc.bboxes.shape
+    (2, 4)
+    >>> doc = Document.from_arrays("/path/to/document.jpg", bboxes, contents, shape=(1240, 1754))
+    >>> doc.elements_in_region(0, 0, 100, 100)
+    array([0])
     """
 
     def __init__(
-        self, img_path: str, ocr_output: dict, device="cpu", **kwargs: Any
+        self,
+        img_path: str,
+        ocr_output: dict,
+        device="cpu",
+        columnar: bool = False,
+        **kwargs: Any,
     ) -> None:
         """
         Initialize a Document instance with the provided image path and OCR output.
@@ -48,18 +74,25 @@ class Document:
             img_path (str): The path to the document image file.
             ocr_output (dict): The output of an OCR engine, containing bounding box and content information.
             device (str): The device to use for processing (default is "cpu").
+            columnar (bool): Whether to store the elements in columnar arrays (default is False).
             **kwargs: Additional keyword arguments.
+                shape (tuple[int, int], optional): The known (width, height) of the image. When given,
+                    the image file is neither checked nor opened.
 
         Raises:
             FileNotFoundError: If the specified image file path does not exist.
             AssertionError: If the lengths of bounding box and content lists in the OCR output do not match.
         """
-        # File existence check
-        if not os.path.exists(img_path):
-            raise FileNotFoundError(f"unable to locate img_folder at {img_path}")
+        shape = kwargs.get("shape")
+        if shape is None:
+            # File existence check
+            if not os.path.exists(img_path):
+                raise FileNotFoundError(f"unable to locate img_folder at {img_path}")
 
-        # Get the image shape
-        self.__shape = Image.open(img_path).size
+            # Get the image shape from the image header
+            with Image.open(img_path) as image:
+                shape = image.size
+        self.__shape = tuple(shape)
         self.__filename = os.path.basename(img_path)
         self.__img_path = img_path
         self.device = device
@@ -69,7 +102,76 @@ class Document:
             raise AssertionError(
                 "Length of 'bbox' and 'content' in OCR output are not equal."
             )
-        self.__elements: List[DocElement] = [
+        self.__store = None
+        self.__elements: List[DocElement] = ElementList()
+        self.__spatial_index: Optional[SpatialIndex] = None
+        self.__spatial_index_version = 0
+        if columnar:
+            self.__store = self._build_store(ocr_output)
+        else:
+            self.__elements = ElementList(self._build_elements(ocr_output))
+
+    @classmethod
+    def from_arrays(
+        cls,
+        img_path: str,
+        bboxes,
+        contents: Sequence[Any],
+        labels: Optional[Sequence[Any]] = None,
+        shape: Optional[tuple] = None,
+        device="cpu",
+        columnar: bool = False,
+    ) -> "Document":
+        """
+        Build a document from element arrays and a known page shape.
+
+        The elements are built in a single pass and, when the shape is given, the image file
+        is not opened. With `columnar=True` the arrays are stored as they are, without
+        creating any per-element object.
+
+        Args:
+            img_path (str): The path to the document image file.
+            bboxes (np.ndarray or List[List]): The bounding boxes of the elements in x, y, w, h format, shape (N, 4).
+            contents (Sequence[Any]): The content of each element.
+            labels (Sequence[Any], optional): The label of each element, required for classified documents.
+            shape (tuple[int, int], optional): The (width, height) of the image. Defaults to reading the image header.
+            device (str): The device to use for processing (default is "cpu").
+            columnar (bool): Whether to store the elements in columnar arrays (default is False).
+
+        Returns:
+            Document: The document, of the class `from_arrays` is called on.
+
+        Example:
+        >>> doc = DocumentEntityClassification.from_arrays(
+        ...     "/path/to/document.jpg",
+        ...     bboxes=np.array([[10, 20, 30, 40], [50, 60, 70, 80]]),
+        ...     contents=["Text 1", "Text 2"],
+        ...     labels=["question", "answer"],
+        ...     shape=(1240, 1754),
+        ... )
+        """
+        if isinstance(bboxes, np.ndarray) and not columnar:
+            # Elements hold Python numbers, as when built from an OCR output
+            bboxes = bboxes.tolist()
+        if isinstance(labels, np.ndarray):
+            labels = labels.tolist()
+        ocr_output = {"bbox": bboxes, "content": contents}
+        if labels is not None:
+            ocr_output["label"] = labels
+        kwargs = {} if shape is None else {"shape": shape}
+        return cls(img_path, ocr_output, device=device, columnar=columnar, **kwargs)
+
+    def _build_elements(self, ocr_output: dict) -> List[DocElement]:
+        """
+        Build the element objects from an OCR output.
+
+        Args:
+            ocr_output (dict): The output of an OCR engine, containing bounding box and content information.
+
+        Returns:
+            List[DocElement]: The document elements.
+        """
+        return [
             DocElement(
                 *bbox,
                 content_type=ContentType.TEXT,
@@ -80,6 +182,23 @@ class Document:
             for bbox, content in zip(ocr_output["bbox"], ocr_output["content"])
         ]
 
+    def _build_store(self, ocr_output: dict) -> ElementStore:
+        """
+        Build the columnar element store from an OCR output.
+
+        Args:
+            ocr_output (dict): The output of an OCR engine, containing bounding box and content information.
+
+        Returns:
+            ElementStore: The store holding the document elements.
+        """
+        return ElementStore(
+            ocr_output["bbox"],
+            ocr_output["content"],
+            img_path=self.__img_path,
+            device=self.device,
+        )
+
     @property
     def shape(self) -> tuple[int, int]:
         """Getter method for the shape attribute."""
@@ -113,12 +232,235 @@ class Document:
     @property
     def elements(self) -> List[List[DocElement]]:
         """Getter method for the elements attribute."""
+        if self.__store is not None:
+            return self.__store
         return self.__elements
 
     @elements.setter
     def elements(self, value: List[List[DocElement]]) -> None:
-        """Setter method for the elements attribute."""
-        self.__elements = value
+        """
+        Setter method for the elements attribute.
+
+        A list of elements is copied into an `ElementList`, which tracks its modifications.
+        """
+        if isinstance(value, ElementStore):
+            self.__store = value
+            self.__elements = ElementList()
+        else:
+            self.__store = None
+            self.__elements = (
+                value if isinstance(value, ElementList) else ElementList(value)
+            )
+        self.__spatial_index = None
+
+    @property
+    def is_columnar(self) -> bool:
+        """Whether the elements are held in an `ElementStore`."""
+        return self.__store is not None
+
+    @property
+    def store(self) -> ElementStore:
+        """
+        The columnar representation of the elements.
+
+        For object-backed documents the store is built from the current elements, so
+        modifying it does not modify the `DocElement` objects.
+        """
+        if self.__store is not None:
+            return self.__store
+        return ElementStore.from_elements(
+            self.__elements, img_path=self.__img_path, device=self.device
+        )
+
+    @property
+    def bboxes(self) -> np.ndarray:
+        """The bounding boxes of the elements as an (N, 4) array in x, y, w, h format."""
+        if self.__store is not None:
+            return self.__store.bboxes
+        if not self.__elements:
+            return np.zeros((0, 4), dtype=np.int64)
+        return np.array([[e.x, e.y, e.w, e.h] for e in self.__elements])
+
+    @property
+    def content_types(self) -> np.ndarray:
+        """The `ContentType` values of the elements as an (N,) int8 array."""
+        if self.__store is not None:
+            return self.__store.content_types
+        return np.array([e.content_type.value for e in self.__elements], dtype=np.int8)
+
+    @property
+    def contents(self) -> List[Any]:
+        """The content of each element."""
+        if self.__store is not None:
+            return self.__store.contents
+        return [e.content for e in self.__elements]
+
+    def to_columnar(self) -> None:
+        """Convert the document elements in place to columnar storage."""
+        if self.__store is None:
+            self.elements = self.store
+
+    @property
+    def spatial_index(self) -> SpatialIndex:
+        """
+        The grid index over the element bounding boxes, built on first access.
+
+        The index is dropped when `elements` is assigned, and rebuilt when the `version` of
+        the element list or store changes: after adding, removing or replacing elements, and
+        after moving or resizing columnar elements. After moving or resizing `DocElement`
+        objects, or writing into the `bboxes` array of the store, call
+        `invalidate_spatial_index`.
+        """
+        version = self.elements.version
+        if self.__spatial_index is None or self.__spatial_index_version != version:
+            self.__spatial_index = SpatialIndex(self.bboxes)
+            self.__spatial_index_version = version
+        return self.__spatial_index
+
+    def invalidate_spatial_index(self) -> None:
+        """Drop the spatial index so that the next query rebuilds it."""
+        self.__spatial_index = None
+
+    def elements_in_region(self, x: float, y: float, w: float, h: float) -> np.ndarray:
+        """
+        Find the elements whose bounding box intersects a rectangle.
+
+        Args:
+            x (float): The x-coordinate of the rectangle.
+            y (float): The y-coordinate of the rectangle.
+            w (float): The width of the rectangle.
+            h (float): The height of the rectangle.
+
+        Returns:
+            np.ndarray: The sorted indices of the intersecting elements.
+        """
+        return self.spatial_index.query_rect(x, y, w, h)
+
+    def elements_at(self, x: float, y: float) -> np.ndarray:
+        """
+        Find the elements whose bounding box contains a point.
+
+        Args:
+            x (float): The x-coordinate of the point.
+            y (float): The y-coordinate of the point.
+
+        Returns:
+            np.ndarray: The sorted indices of the elements containing the point.
+        """
+        return self.spatial_index.query_point(x, y)
+
+    def nearest_elements(self, x: float, y: float, k: int = 1) -> np.ndarray:
+        """
+        Find the k elements whose bounding box is nearest to a point.
+
+        Args:
+            x (float): The x-coordinate of the point.
+            y (float): The y-coordinate of the point.
+            k (int, optional): The number of elements to return. Defaults to 1.
+
+        Returns:
+            np.ndarray: The indices of the nearest elements, nearest first.
+        """
+        indices, _ = self.spatial_index.nearest(x, y, k)
+        return indices
+
+    def extract_regions(
+        self,
+        indices: Optional[Sequence[int]] = None,
+        is_gray: bool = True,
+        packed: bool = False,
+    ) -> dict:
+        """
+        Extract the pixel regions of the document elements in a single pass.
+
+        The page is decoded once (through the shared `PageCache`) and every region is
+        copied into one preallocated array, instead of building a tensor per element with
+        `DocElement.extract_pixels`. Region values match `DocElement.extract_pixels`:
+        pixels are scaled to [0, 1] and the parts of a box lying outside the page are zeros.
+
+        Args:
+            indices (Sequence[int], optional): The indices of the elements to extract. Defaults to all the elements.
+            is_gray (bool, optional): Flag to convert the regions to grayscale. Defaults to True.
+            packed (bool, optional): Whether to return a flat packed buffer instead of a padded tensor. Defaults to False.
+
+        Returns:
+            dict: If `packed` is False, a dictionary with the keys:
+                  - "pixels": Tensor of shape (N, C, H_max, W_max) holding the zero-padded regions.
+                  - "mask": Boolean tensor of shape (N, H_max, W_max), True inside each region.
+                  - "shapes": Tensor of shape (N, 3) holding the (C, H, W) shape of each region.
+                  If `packed` is True, a dictionary with the keys:
+                  - "pixels": 1-D tensor holding every region flattened one after the other.
+                  - "offsets": Tensor of shape (N,) holding the start of each region in "pixels".
+                  - "shapes": Tensor of shape (N, 3) holding the (C, H, W) shape of each region.
+
+        Example:
+        >>> regions = doc.extract_regions(packed=True)
+        >>> c, h, w = regions["shapes"][0].tolist()
+        >>> start = regions["offsets"][0]
+        >>> first = regions["pixels"][start : start + c * h * w].view(c, h, w)
+        """
+        bboxes = self.bboxes
+        if indices is not None:
+            bboxes = bboxes[np.asarray(indices, dtype=np.int64)]
+
+        page = np.asarray(PageCache.get_page(self.__img_path, is_gray=is_gray))
+        if page.ndim == 2:
+            page = page[:, :, None]
+        page_h, page_w, channels = page.shape
+
+        # Round the crop boxes the same way as PIL.Image.crop
+        x0 = np.round(bboxes[:, 0]).astype(np.int64)
+        y0 = np.round(bboxes[:, 1]).astype(np.int64)
+        x1 = np.maximum(np.round(bboxes[:, 0] + bboxes[:, 2]).astype(np.int64), x0)
+        y1 = np.maximum(np.round(bboxes[:, 1] + bboxes[:, 3]).astype(np.int64), y0)
+        heights, widths = y1 - y0, x1 - x0
+        shapes = np.stack(
+            [np.full(len(bboxes), channels, dtype=np.int64), heights, widths], axis=1
+        )
+
+        # Intersection of each box with the page
+        ix0, iy0 = np.clip(x0, 0, page_w), np.clip(y0, 0, page_h)
+        ix1, iy1 = np.clip(x1, 0, page_w), np.clip(y1, 0, page_h)
+
+        scale = 255.0 if page.dtype == np.uint8 else 1.0
+        if packed:
+            sizes = channels * heights * widths
+            offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+            pixels = np.zeros(int(sizes.sum()), dtype=np.float32)
+            for i in range(len(bboxes)):
+                region = pixels[offsets[i] : offsets[i] + sizes[i]].reshape(
+                    channels, heights[i], widths[i]
+                )
+                region[
+                    :,
+                    iy0[i] - y0[i] : iy1[i] - y0[i],
+                    ix0[i] - x0[i] : ix1[i] - x0[i],
+                ] = page[iy0[i] : iy1[i], ix0[i] : ix1[i]].transpose(2, 0, 1)
+            pixels /= scale
+            return {
+                "pixels": torch.from_numpy(pixels).to(self.device),
+                "offsets": torch.from_numpy(offsets),
+                "shapes": torch.from_numpy(shapes),
+            }
+
+        max_h = int(heights.max()) if len(bboxes) else 0
+        max_w = int(widths.max()) if len(bboxes) else 0
+        pixels = np.zeros((len(bboxes), channels, max_h, max_w), dtype=np.float32)
+        mask = np.zeros((len(bboxes), max_h, max_w), dtype=bool)
+        for i in range(len(bboxes)):
+            mask[i, : heights[i], : widths[i]] = True
+            pixels[
+                i,
+                :,
+                iy0[i] - y0[i] : iy1[i] - y0[i],
+                ix0[i] - x0[i] : ix1[i] - x0[i],
+            ] = page[iy0[i] : iy1[i], ix0[i] : ix1[i]].transpose(2, 0, 1)
+        pixels /= scale
+        return {
+            "pixels": torch.from_numpy(pixels).to(self.device),
+            "mask": torch.from_numpy(mask).to(self.device),
+            "shapes": torch.from_numpy(shapes),
+        }
 
     def serialize(self):
         """
@@ -135,7 +477,7 @@ class Document:
         """
         return {
             "filename": self.__filename,
-            "elements": [element.serialize() for element in self.__elements],
+            "elements": [element.serialize() for element in self.elements],
         }
 
     def to_json(self) -> dict:
@@ -149,12 +491,12 @@ class Document:
         return {
             "filename": self.__filename,
             "bbox_list": [
-                doc_element.to_json()["bbox"] for doc_element in self.__elements
+                doc_element.to_json()["bbox"] for doc_element in self.elements
             ],
             "content_type_list": [
-                doc_element.to_json()["content_type"] for doc_element in self.__elements
+                doc_element.to_json()["content_type"] for doc_element in self.elements
             ],
             "content_list": [
-                doc_element.to_json()["content"] for doc_element in self.__elements
+                doc_element.to_json()["content"] for doc_element in self.elements
             ],
         }
@@ -1,10 +1,11 @@
-from typing import Any
+from typing import Any, List
 
 from DocumentAI_std.base.doc_enum import ContentType
 
 from DocumentAI_std.base.doc_element_classification import DocElementClassification
 
 from DocumentAI_std.base.document import Document
+from DocumentAI_std.base.element_store import ElementStore
 
 
 class DocumentEntityClassification(Document):
@@ -39,23 +40,60 @@ class DocumentEntityClassification(Document):
     ...     "label": [0, 1]
     ... }
     >>> doc = DocumentEntityClassification(img_path="/path/to/document.jpg", ocr_output=ocr_output)
+    >>> doc = DocumentEntityClassification(img_path="/path/to/document.jpg", ocr_output=ocr_output, columnar=True)
+    >>> doc.store.labels
+    array([0, 1], dtype=int32)
     """
 
-    def __init__(self, img_path: str, ocr_output: dict, **kwargs: Any) -> None:
-        super().__init__(img_path, ocr_output, **kwargs)
-        self.elements = [
+    def _build_elements(self, ocr_output: dict) -> List[DocElementClassification]:
+        """
+        Build the classified element objects from an OCR output.
+
+        Args:
+            ocr_output (dict): The output of an OCR engine, containing bounding box, content, and label information.
+
+        Returns:
+            List[DocElementClassification]: The document elements.
+        """
+        return [
             DocElementClassification(
                 *bbox,
                 content_type=ContentType.TEXT,
                 content=content,
                 label=label,
-                img_path=img_path
+                img_path=self.img_path
             )
             for bbox, content, label in zip(
                 ocr_output["bbox"], ocr_output["content"], ocr_output["label"]
             )
         ]
 
+    def _build_store(self, ocr_output: dict) -> ElementStore:
+        """
+        Build the columnar element store, including the labels, from an OCR output.
+
+        Args:
+            ocr_output (dict): The output of an OCR engine, containing bounding box, content, and label information.
+
+        Returns:
+            ElementStore: The store holding the document elements.
+        """
+        return ElementStore(
+            ocr_output["bbox"],
+            ocr_output["content"],
+            labels=ocr_output["label"],
+            img_path=self.img_path,
+            device=self.device,
+        )
+
+    @property
+    def labels(self) -> List[Any]:
+        """The label of each element."""
+        if self.is_columnar:
+            store = self.store
+            return [store.label_names[code] for code in store.labels]
+        return [element.label for element in self.elements]
+
     def to_json(self):
         return {
             "filename": self.filename,
@@ -0,0 +1,71 @@
+class ElementList(list):
+    """
+    List of the `DocElement` objects of a document, counting its modifications.
+
+    Every method that adds, removes, replaces or reorders elements increments `version`,
+    so that structures derived from the elements (e.g. the spatial index of a `Document`)
+    can tell they are stale without comparing the elements themselves.
+
+    Attributes:
+        version (int): The number of modifications of the list.
+
+    Example:
+    >>> elements = ElementList([element_a])
+    >>> elements[0] = element_b
+    >>> elements.version
+    1
+    """
+
+    # A class default, since unpickling fills the list before restoring the attributes
+    version = 0
+
+    def __setitem__(self, index, value) -> None:
+        super().__setitem__(index, value)
+        self.version += 1
+
+    def __delitem__(self, index) -> None:
+        super().__delitem__(index)
+        self.version += 1
+
+    def __iadd__(self, other):
+        result = super().__iadd__(other)
+        self.version += 1
+        return result
+
+    def __imul__(self, other):
+        result = super().__imul__(other)
+        self.version += 1
+        return result
+
+    def append(self, element) -> None:
+        super().append(element)
+        self.version += 1
+
+    def extend(self, elements) -> None:
+        super().extend(elements)
+        self.version += 1
+
+    def insert(self, index, element) -> None:
+        super().insert(index, element)
+        self.version += 1
+
+    def pop(self, index=-1):
+        element = super().pop(index)
+        self.version += 1
+        return element
+
+    def remove(self, element) -> None:
+        super().remove(element)
+        self.version += 1
+
+    def clear(self) -> None:
+        super().clear()
+        self.version += 1
+
+    def sort(self, *args, **kwargs) -> None:
+        super().sort(*args, **kwargs)
+        self.version += 1
+
+    def reverse(self) -> None:
+        super().reverse()
+        self.version += 1
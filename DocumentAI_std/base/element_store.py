@@ -0,0 +1,423 @@
+from collections.abc import MutableSequence
+from typing import Any, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from DocumentAI_std.base.doc_element import DocElement
+from DocumentAI_std.base.doc_element_classification import DocElementClassification
+from DocumentAI_std.base.doc_enum import ContentType
+
+
+class ElementStore(MutableSequence):
+    """
+    Columnar storage for the elements of a document.
+
+    Instead of holding one `DocElement` object per bounding box, the store keeps every
+    attribute in a single container:
+        - bboxes: NumPy array of shape (N, 4) in x, y, w, h format.
+        - content_types: NumPy int8 array holding the `ContentType` values.
+        - contents: List holding the content of each element.
+        - labels: NumPy int32 array of codes into `label_names` (only for classified elements).
+
+    Indexing the store returns lightweight views (`DocElementView` or
+    `DocElementClassificationView`) that read and write directly into these arrays, so
+    the usual `DocElement` API keeps working while layout and text utilities can consume
+    the arrays without iterating over objects.
+
+    The store is a mutable sequence: elements can be assigned, inserted, appended, removed
+    and sorted like in a list, each operation rebuilding the columns (so it costs O(N); build
+    a new store to add many elements at once). A view refers to a row position, so after an
+    insertion or a removal, views taken before refer to the element now at their position.
+
+    Changes made through the views, the sequence methods or by assigning `bboxes` increment
+    `version`, which lets structures derived from the boxes (e.g. the spatial index of a
+    `Document`) detect that they are stale. Writes made directly into the `bboxes` array are
+    not counted.
+
+    Attributes:
+        bboxes (np.ndarray): The bounding boxes of the elements, shape (N, 4).
+        version (int): The number of modifications of the bounding boxes.
+        content_types (np.ndarray): The content type codes of the elements, shape (N,).
+        contents (List[Any]): The content of each element.
+        labels (Optional[np.ndarray]): The label codes of the elements, shape (N,), or None.
+        label_names (List[Any]): The label values indexed by the codes in `labels`.
+        img_path (str): The path to the document image file.
+        device (str): The device to use for processing (default is "cpu").
+
+    Example:
+    >>> store = ElementStore(
+    ...     bboxes=[[10, 20, 30, 40], [50, 60, 70, 80]],
+    ...     contents=["Text 1", "Text 2"],
+    ...     labels=["question", "answer"],
+    ... )
+    >>> store[1].label
+    'answer'
+    """
+
+    def __init__(
+        self,
+        bboxes,
+        contents: Sequence[Any],
+        content_types=None,
+        labels: Optional[Sequence[Any]] = None,
+        img_path: Optional[str] = None,
+        device: str = "cpu",
+    ) -> None:
+        bboxes = np.asarray(bboxes)
+        if bboxes.size == 0:
+            bboxes = np.zeros((0, 4), dtype=np.int64)
+        if bboxes.ndim != 2 or bboxes.shape[1] != 4:
+            raise AssertionError(
+                f"'bbox' must be of shape (N, 4), received {bboxes.shape}."
+            )
+        if len(bboxes) != len(contents):
+            raise AssertionError(
+                "Length of 'bbox' and 'content' in OCR output are not equal."
+            )
+
+        self.version = 0
+        self._bboxes: np.ndarray = bboxes
+        self.contents: List[Any] = list(contents)
+
+        if content_types is None:
+            self.content_types = np.full(
+                len(bboxes), ContentType.TEXT.value, dtype=np.int8
+            )
+        else:
+            self.content_types = np.asarray(
+                [
+                    c.value if isinstance(c, ContentType) else int(c)
+                    for c in content_types
+                ],
+                dtype=np.int8,
+            )
+
+        self.label_names: List[Any] = []
+        self._label_codes = {}
+        self.labels: Optional[np.ndarray] = None
+        if labels is not None:
+            if len(labels) != len(bboxes):
+                raise AssertionError(
+                    "Length of 'bbox' and 'label' in OCR output are not equal."
+                )
+            self.labels = np.asarray(
+                [self.label_code(label) for label in labels], dtype=np.int32
+            )
+
+        self.img_path = img_path
+        self.device = device
+
+    @classmethod
+    def from_elements(
+        cls, elements: Sequence[DocElement], img_path=None, device="cpu"
+    ) -> "ElementStore":
+        """
+        Build a store from a list of `DocElement` objects.
+
+        Args:
+            elements (Sequence[DocElement]): The elements to pack into columns.
+            img_path (str, optional): The path to the document image file.
+            device (str): The device to use for processing (default is "cpu").
+
+        Returns:
+            ElementStore: The columnar representation of the elements.
+        """
+        labels = None
+        if elements and all(
+            isinstance(element, DocElementClassification) for element in elements
+        ):
+            labels = [element.label for element in elements]
+        return cls(
+            bboxes=[[e.x, e.y, e.w, e.h] for e in elements],
+            contents=[e.content for e in elements],
+            content_types=[e.content_type for e in elements],
+            labels=labels,
+            img_path=img_path,
+            device=device,
+        )
+
+    @property
+    def bboxes(self) -> np.ndarray:
+        """The bounding boxes of the elements, shape (N, 4)."""
+        return self._bboxes
+
+    @bboxes.setter
+    def bboxes(self, value: np.ndarray) -> None:
+        self._bboxes = value
+        self.version += 1
+
+    def label_code(self, label) -> int:
+        """
+        Return the integer code of a label, registering the label if it is new.
+
+        Args:
+            label (Any): The label value.
+
+        Returns:
+            int: The index of the label in `label_names`.
+        """
+        code = self._label_codes.get(label)
+        if code is None:
+            code = len(self.label_names)
+            self._label_codes[label] = code
+            self.label_names.append(label)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.contents)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("element index out of range")
+        if self.labels is not None:
+            return DocElementClassificationView(self, index)
+        return DocElementView(self, index)
+
+    def __iter__(self) -> Iterator[DocElement]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def _rebuild(self, rows: Sequence[int], elements: Sequence[DocElement]) -> None:
+        """
+        Rebuild the columns from a list of rows.
+
+        Args:
+            rows (Sequence[int]): For each new row, the index of an existing row if it is at
+                least 0, or `-1 - k` to take the k-th element of `elements`.
+            elements (Sequence[DocElement]): The new elements.
+        """
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        kept = rows >= 0
+        taken = -1 - rows[~kept]
+
+        if self.labels is not None and not all(
+            isinstance(e, DocElementClassification) for e in elements
+        ):
+            raise TypeError(
+                "A labeled store only holds DocElementClassification elements."
+            )
+        new_bboxes = (
+            np.asarray([[e.x, e.y, e.w, e.h] for e in elements]).reshape(-1, 4)
+            if len(elements)
+            else np.zeros((0, 4), dtype=self._bboxes.dtype)
+        )
+        new_types = np.asarray([e.content_type.value for e in elements], dtype=np.int8)
+        if self.labels is not None:
+            new_labels = np.asarray(
+                [self.label_code(e.label) for e in elements], dtype=np.int32
+            )
+
+        bboxes = np.empty(
+            (len(rows), 4), dtype=np.result_type(self._bboxes, new_bboxes)
+        )
+        bboxes[kept] = self._bboxes[rows[kept]]
+        bboxes[~kept] = new_bboxes[taken]
+        content_types = np.empty(len(rows), dtype=np.int8)
+        content_types[kept] = self.content_types[rows[kept]]
+        content_types[~kept] = new_types[taken]
+        if self.labels is not None:
+            labels = np.empty(len(rows), dtype=np.int32)
+            labels[kept] = self.labels[rows[kept]]
+            labels[~kept] = new_labels[taken]
+            self.labels = labels
+        contents = [e.content for e in elements]
+        self.contents = [
+            self.contents[row] if row >= 0 else contents[-1 - row]
+            for row in rows.tolist()
+        ]
+        self._bboxes = bboxes
+        self.content_types = content_types
+        self.version += 1
+
+    def __setitem__(self, index, value) -> None:
+        rows = list(range(len(self)))
+        if isinstance(index, slice):
+            value = list(value)
+            rows[index] = range(-1, -1 - len(value), -1)
+        else:
+            value = [value]
+            rows[index] = -1
+        self._rebuild(rows, value)
+
+    def __delitem__(self, index) -> None:
+        rows = list(range(len(self)))
+        del rows[index]
+        self._rebuild(rows, [])
+
+    def insert(self, index: int, value: DocElement) -> None:
+        rows = list(range(len(self)))
+        rows.insert(index, -1)
+        self._rebuild(rows, [value])
+
+    def extend(self, values) -> None:
+        values = list(values)
+        self._rebuild(
+            list(range(len(self))) + list(range(-1, -1 - len(values), -1)), values
+        )
+
+    def pop(self, index: int = -1) -> DocElement:
+        """Remove an element and return it as a `DocElement` object detached from the store."""
+        view = self[index]
+        args = (view.x, view.y, view.w, view.h, view.content_type, view.content)
+        if self.labels is not None:
+            element = DocElementClassification(
+                *args, label=view.label, img_path=self.img_path, device=self.device
+            )
+        else:
+            element = DocElement(*args, img_path=self.img_path, device=self.device)
+        del self[index]
+        return element
+
+    def __iadd__(self, values) -> "ElementStore":
+        self.extend(values)
+        return self
+
+    def clear(self) -> None:
+        self._rebuild([], [])
+
+    def reverse(self) -> None:
+        self._rebuild(list(range(len(self) - 1, -1, -1)), [])
+
+    def sort(self, key=None, reverse: bool = False) -> None:
+        """Sort the elements in place, as `list.sort` does with the views of the elements."""
+        views = list(self)
+        rows = sorted(
+            range(len(self)),
+            key=(lambda i: views[i]) if key is None else (lambda i: key(views[i])),
+            reverse=reverse,
+        )
+        self._rebuild(rows, [])
+
+    def __add__(self, other) -> "ElementStore":
+        return ElementStore.from_elements(
+            list(self) + list(other), img_path=self.img_path, device=self.device
+        )
+
+    def __radd__(self, other) -> "ElementStore":
+        return ElementStore.from_elements(
+            list(other) + list(self), img_path=self.img_path, device=self.device
+        )
+
+
+class DocElementView(DocElement):
+    """
+    A `DocElement` backed by a row of an `ElementStore`.
+
+    Views do not copy any data: reading an attribute reads the store and assigning an
+    attribute writes it back into the store arrays.
+
+    Attributes:
+        store (ElementStore): The store holding the element data.
+        index (int): The row of the element in the store.
+    """
+
+    def __init__(self, store: ElementStore, index: int) -> None:
+        self._store = store
+        self._index = index
+
+    def __eq__(self, other) -> bool:
+        # Two views are the same element when they refer to the same row of the same store
+        if isinstance(other, DocElementView):
+            return self._store is other._store and self._index == other._index
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((id(self._store), self._index))
+
+    @property
+    def store(self) -> ElementStore:
+        return self._store
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def x(self):
+        return self._store.bboxes[self._index, 0].item()
+
+    @x.setter
+    def x(self, value):
+        self._store.bboxes[self._index, 0] = value
+        self._store.version += 1
+
+    @property
+    def y(self):
+        return self._store.bboxes[self._index, 1].item()
+
+    @y.setter
+    def y(self, value):
+        self._store.bboxes[self._index, 1] = value
+        self._store.version += 1
+
+    @property
+    def w(self):
+        return self._store.bboxes[self._index, 2].item()
+
+    @w.setter
+    def w(self, value):
+        self._store.bboxes[self._index, 2] = value
+        self._store.version += 1
+
+    @property
+    def h(self):
+        return self._store.bboxes[self._index, 3].item()
+
+    @h.setter
+    def h(self, value):
+        self._store.bboxes[self._index, 3] = value
+        self._store.version += 1
+
+    @property
+    def content_type(self):
+        return ContentType(self._store.content_types[self._index].item())
+
+    @content_type.setter
+    def content_type(self, value):
+        self._store.content_types[self._index] = value.value
+
+    @property
+    def content(self):
+        return self._store.contents[self._index]
+
+    @content.setter
+    def content(self, value):
+        self._store.contents[self._index] = value
+
+    @property
+    def img_path(self):
+        return self._store.img_path
+
+    @img_path.setter
+    def img_path(self, value):
+        self._store.img_path = value
+
+    @property
+    def device(self):
+        return self._store.device
+
+    @device.setter
+    def device(self, value):
+        self._store.device = value
+
+
+class DocElementClassificationView(DocElementView, DocElementClassification):
+    """
+    A `DocElementClassification` backed by a row of an `ElementStore`.
+
+    Attributes:
+        store (ElementStore): The store holding the element data.
+        index (int): The row of the element in the store.
+    """
+
+    @property
+    def label(self):
+        return self._store.label_names[self._store.labels[self._index]]
+
+    @label.setter
+    def label(self, value):
+        self._store.labels[self._index] = self._store.label_code(value)
@@ -0,0 +1,130 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+
+class PageCache:
+    """
+    Process-wide, size-bounded LRU cache of decoded page images.
+
+    Extracting the pixels of a document element only needs a crop of the page, but
+    opening the image file decodes the whole page. The cache keeps the decoded pages
+    (optionally already converted to grayscale) in memory, keyed by path, modification
+    time and mode, so that accessing many elements of the same page costs one decode.
+
+    The cache is bounded by the total number of bytes of the decoded rasters. When the
+    limit is exceeded, the least recently used pages are evicted. Pages larger than the
+    limit are returned without being cached.
+
+    Attributes:
+        max_bytes (int): The maximum total size in bytes of the cached rasters.
+        hits (int): The number of lookups served from the cache.
+        misses (int): The number of lookups that required decoding the image.
+
+    Example:
+    >>> page = PageCache.get_page("/path/to/document.jpg", is_gray=True)
+    >>> PageCache.set_max_bytes(512 * 1024 * 1024)
+    >>> PageCache.stats()
+    {'hits': 0, 'misses': 1, 'pages': 1, 'bytes': 40000, 'max_bytes': 536870912}
+    >>> PageCache.clear()
+    """
+
+    max_bytes = 256 * 1024 * 1024
+    hits = 0
+    misses = 0
+    _pages = OrderedDict()
+    _bytes = 0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _raster_size(image: Image.Image) -> int:
+        """Approximate the memory footprint of a decoded image in bytes."""
+        return image.width * image.height * len(image.getbands())
+
+    @classmethod
+    def get_page(cls, img_path: str, is_gray: bool = False) -> Image.Image:
+        """
+        Return the decoded page image, decoding it only if it is not cached.
+
+        Args:
+            img_path (str): The path to the page image file.
+            is_gray (bool, optional): Whether to return the page converted to grayscale. Defaults to False.
+
+        Returns:
+            Image.Image: The decoded page. The image is shared and must not be modified in place.
+        """
+        key = (os.path.abspath(img_path), os.stat(img_path).st_mtime_ns, is_gray)
+        with cls._lock:
+            page = cls._pages.get(key)
+            if page is not None:
+                cls._pages.move_to_end(key)
+                cls.hits += 1
+                return page
+            cls.misses += 1
+
+        with Image.open(img_path) as image:
+            image.load()
+            if is_gray and image.mode != "L":
+                page = image.convert("L")
+            else:
+                page = image.copy()
+
+        size = cls._raster_size(page)
+        if size > cls.max_bytes:
+            return page
+
+        with cls._lock:
+            if key not in cls._pages:
+                cls._pages[key] = page
+                cls._bytes += size
+            cls._evict()
+        return page
+
+    @classmethod
+    def _evict(cls) -> None:
+        """Evict the least recently used pages until the cache fits in `max_bytes`."""
+        while cls._pages and cls._bytes > cls.max_bytes:
+            _, page = cls._pages.popitem(last=False)
+            cls._bytes -= cls._raster_size(page)
+
+    @classmethod
+    def set_max_bytes(cls, max_bytes: int) -> None:
+        """
+        Set the maximum total size of the cached rasters, evicting pages if needed.
+
+        Args:
+            max_bytes (int): The maximum total size in bytes. Use 0 to disable caching.
+        """
+        if max_bytes < 0:
+            raise ValueError("max_bytes must be a non-negative integer.")
+        with cls._lock:
+            cls.max_bytes = max_bytes
+            cls._evict()
+
+    @classmethod
+    def clear(cls) -> None:
+        """Remove every cached page and reset the hit/miss counters."""
+        with cls._lock:
+            cls._pages.clear()
+            cls._bytes = 0
+            cls.hits = 0
+            cls.misses = 0
+
+    @classmethod
+    def stats(cls) -> dict:
+        """
+        Return the cache statistics.
+
+        Returns:
+            dict: A dictionary with the keys "hits", "misses", "pages", "bytes" and "max_bytes".
+        """
+        with cls._lock:
+            return {
+                "hits": cls.hits,
+                "misses": cls.misses,
+                "pages": len(cls._pages),
+                "bytes": cls._bytes,
+                "max_bytes": cls.max_bytes,
+            }
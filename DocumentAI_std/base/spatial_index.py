@@ -0,0 +1,211 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class SpatialIndex:
+    """
+    Uniform grid index over the bounding boxes of a document.
+
+    The page is divided into square cells and each box is registered in every cell it
+    covers, the cells being stored in CSR form (sorted cell keys and the boxes of each cell).
+    A query only looks at the boxes registered in the cells it touches, so finding the boxes
+    around a location costs time proportional to the local density instead of the number of
+    elements. Boxes covering many cells (e.g. page-wide regions) are kept apart and checked
+    by every query.
+
+    Boxes and query rectangles are closed: boxes that only touch a query rectangle or a point
+    on their border are returned.
+
+    Attributes:
+        bboxes (np.ndarray): The indexed boxes, shape (N, 4) in x, y, w, h format.
+        cell_size (float): The side length of the grid cells.
+
+    Example:
+    >>> index = SpatialIndex(document.bboxes)
+    >>> index.query_rect(0, 0, 100, 50)
+    array([0, 3])
+    >>> index.query_point(12, 25)
+    array([0])
+    >>> indices, distances = index.nearest(300, 400, k=2)
+    """
+
+    # Boxes covering more cells than this are checked by every query instead of being gridded
+    MAX_CELLS_PER_BOX = 64
+    # Upper bound on the number of cells along each side of the grid
+    MAX_GRID_SIDE = 4096
+
+    def __init__(self, bboxes, cell_size: Optional[float] = None) -> None:
+        """
+        Build the grid.
+
+        Args:
+            bboxes (np.ndarray or List[List]): The boxes to index, shape (N, 4) in x, y, w, h format.
+            cell_size (float, optional): The side length of the cells. Defaults to the median of
+                the largest side of the boxes.
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        self.bboxes = bboxes
+        self._x0 = bboxes[:, 0]
+        self._y0 = bboxes[:, 1]
+        self._x1 = bboxes[:, 0] + bboxes[:, 2]
+        self._y1 = bboxes[:, 1] + bboxes[:, 3]
+
+        extent = 0.0
+        if len(bboxes):
+            extent = max(
+                self._x1.max() - self._x0.min(), self._y1.max() - self._y0.min()
+            )
+        if cell_size is None:
+            sides = np.maximum(bboxes[:, 2], bboxes[:, 3])
+            cell_size = float(np.median(sides)) if len(sides) else 1.0
+        # Degenerate (e.g. zero-sized) boxes must not produce an unbounded number of cells
+        self.cell_size = max(float(cell_size), extent / self.MAX_GRID_SIDE, 1e-9)
+
+        self._origin = (
+            (float(self._x0.min()), float(self._y0.min())) if len(bboxes) else (0, 0)
+        )
+        gx0, gy0 = self._cell(self._x0, self._y0)
+        gx1, gy1 = self._cell(self._x1, self._y1)
+        self._cols = int(gx1.max()) + 1 if len(bboxes) else 1
+        self._rows = int(gy1.max()) + 1 if len(bboxes) else 1
+
+        spans_x, spans_y = gx1 - gx0 + 1, gy1 - gy0 + 1
+        counts = spans_x * spans_y
+        large = counts > self.MAX_CELLS_PER_BOX
+        self._large = np.flatnonzero(large)
+
+        # Expand every gridded box into the cells it covers, then sort the pairs by cell key
+        boxes = np.flatnonzero(~large)
+        counts = counts[boxes]
+        owners = np.repeat(boxes, counts)
+        offsets = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells_x = gx0[owners] + offsets % spans_x[owners]
+        cells_y = gy0[owners] + offsets // spans_x[owners]
+        keys = cells_y * self._cols + cells_x
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._items = owners[order]
+
+    def _cell(self, x, y) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the grid coordinates of the cells containing points."""
+        gx = np.floor((np.asarray(x) - self._origin[0]) / self.cell_size)
+        gy = np.floor((np.asarray(y) - self._origin[1]) / self.cell_size)
+        return gx.astype(np.int64), gy.astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.bboxes)
+
+    def _candidates(self, gx0: int, gy0: int, gx1: int, gy1: int) -> np.ndarray:
+        """Return the boxes registered in a range of cells, plus the large boxes."""
+        gx0, gx1 = max(gx0, 0), min(gx1, self._cols - 1)
+        gy0, gy1 = max(gy0, 0), min(gy1, self._rows - 1)
+        if gx0 > gx1 or gy0 > gy1:
+            return self._large
+        # The keys of one row of cells are contiguous, hence so are its items
+        rows = np.arange(gy0, gy1 + 1, dtype=np.int64) * self._cols
+        starts = np.searchsorted(self._keys, rows + gx0, side="left")
+        ends = np.searchsorted(self._keys, rows + gx1, side="right")
+        lengths = ends - starts
+        positions = np.arange(lengths.sum()) + np.repeat(
+            starts - np.cumsum(lengths) + lengths, lengths
+        )
+        return np.union1d(self._items[positions], self._large)
+
+    def query_rect(self, x: float, y: float, w: float, h: float) -> np.ndarray:
+        """
+        Find the boxes intersecting a rectangle.
+
+        Args:
+            x (float): The x-coordinate of the rectangle.
+            y (float): The y-coordinate of the rectangle.
+            w (float): The width of the rectangle.
+            h (float): The height of the rectangle.
+
+        Returns:
+            np.ndarray: The sorted indices of the boxes intersecting the rectangle.
+        """
+        gx0, gy0 = self._cell(x, y)
+        gx1, gy1 = self._cell(x + w, y + h)
+        candidates = self._candidates(int(gx0), int(gy0), int(gx1), int(gy1))
+        hit = (
+            (self._x0[candidates] <= x + w)
+            & (self._x1[candidates] >= x)
+            & (self._y0[candidates] <= y + h)
+            & (self._y1[candidates] >= y)
+        )
+        return candidates[hit]
+
+    def query_point(self, x: float, y: float) -> np.ndarray:
+        """
+        Find the boxes containing a point.
+
+        Args:
+            x (float): The x-coordinate of the point.
+            y (float): The y-coordinate of the point.
+
+        Returns:
+            np.ndarray: The sorted indices of the boxes containing the point.
+        """
+        return self.query_rect(x, y, 0, 0)
+
+    def distances(self, x: float, y: float, indices=None) -> np.ndarray:
+        """
+        Compute the distance from a point to boxes (0 for the boxes containing the point).
+
+        Args:
+            x (float): The x-coordinate of the point.
+            y (float): The y-coordinate of the point.
+            indices (np.ndarray, optional): The boxes to measure. Defaults to all the boxes.
+
+        Returns:
+            np.ndarray: The Euclidean distance from the point to each box.
+        """
+        if indices is None:
+            indices = slice(None)
+        dx = np.maximum(np.maximum(self._x0[indices] - x, x - self._x1[indices]), 0)
+        dy = np.maximum(np.maximum(self._y0[indices] - y, y - self._y1[indices]), 0)
+        return np.hypot(dx, dy)
+
+    def nearest(self, x: float, y: float, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k boxes nearest to a point.
+
+        The search looks at growing squares of cells around the point and stops as soon as
+        the k-th nearest box found is closer than any box lying outside the square.
+
+        Args:
+            x (float): The x-coordinate of the point.
+            y (float): The y-coordinate of the point.
+            k (int, optional): The number of boxes to return. Defaults to 1.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The indices of the (at most k) nearest boxes and their
+            distances, sorted by distance then index.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        gx, gy = (int(v) for v in self._cell(x, y))
+        radius = 0
+        while True:
+            candidates = self._candidates(
+                gx - radius, gy - radius, gx + radius, gy + radius
+            )
+            distances = self.distances(x, y, candidates)
+            covers_grid = (
+                gx - radius <= 0
+                and gy - radius <= 0
+                and gx + radius >= self._cols - 1
+                and gy + radius >= self._rows - 1
+            )
+            # Boxes outside the square are at least `radius` cells away from the point
+            if len(candidates) >= k:
+                order = np.lexsort((candidates, distances))[:k]
+                if covers_grid or distances[order[-1]] <= radius * self.cell_size:
+                    return candidates[order], distances[order]
+            elif covers_grid:
+                order = np.lexsort((candidates, distances))
+                return candidates[order], distances[order]
+            radius = max(1, radius * 2)
@@ -1,18 +1,15 @@
 import json
 import os
 from pathlib import Path
-from typing import List
+from typing import Optional, Tuple
 
-from DocumentAI_std.base.document_entity_classification import (
-    DocumentEntityClassification,
-)
+from DocumentAI_std.datasets.dataset import DocumentDataset
 
 from DocumentAI_std.utils.base_utils import BaseUtils
+from DocumentAI_std.utils.image_index import ImageIndex
 
-from DocumentAI_std.base.document import Document
 
-
-class CORD:
+class CORD(DocumentDataset):
     """
     CORD dataset from `"CORD: A Consolidated Receipt Dataset forPost-OCR Parsing"
     <https://openreview.net/pdf?id=SJl3z659UH>`_.
@@ -23,6 +20,19 @@ class CORD:
         img_folder (str): Folder containing all the images of the dataset.
         label_path (str): Path to the annotations file of the dataset.
         train (bool, optional): Whether the subset should be the training one. Defaults to True.
+        lazy (bool, optional): Whether to parse the documents on access instead of upfront. Defaults to False.
+            Documents without annotations are skipped in eager mode but returned without elements in lazy
+            mode, since telling them apart requires parsing them: the two modes can differ in length.
+        cache_size (int, optional): The number of documents kept in memory in lazy mode. Defaults to 0.
+        num_workers (int, optional): The number of processes parsing the annotations in eager mode.
+            Cannot be combined with `lazy=True`. Defaults to 0 (parse in the current process).
+        cache_dir (str, optional): Folder where the parsed annotations and the image index are cached
+            between runs. The cache is invalidated when the annotation files, the images or the package
+            version change. In lazy mode only the image index is cached. Defaults to None (no cache).
+        shard (Tuple[int, int], optional): The (index, num_shards) of the shard to load. Only the documents
+            of that shard are parsed, and every process computes the same assignment. Defaults to None.
+        balance_shards (bool, optional): Whether to balance the shards by the approximate number of elements
+            of the documents instead of their number. Defaults to False.
 
     Attributes:
         data (List[DocumentEntityClassification]): List of document entities in the dataset.
@@ -40,6 +50,13 @@ class CORD:
     ...     label_path="/path/to/cord_test/json",
     ...     train=False
     ... )
+    >>> dataset = CORD(
+    ...     img_folder="/path/to/cord_train/image",
+    ...     label_path="/path/to/cord_train/json",
+    ...     lazy=True,
+    ...     cache_size=64,
+    ... )
+    >>> document = dataset[0]
     """
 
     def __init__(
@@ -47,7 +64,14 @@ class CORD:
         img_folder: str,
         label_path: str,
         train: bool = True,
+        lazy: bool = False,
+        cache_size: int = 0,
+        num_workers: int = 0,
+        cache_dir: Optional[str] = None,
+        shard: Optional[Tuple[int, int]] = None,
+        balance_shards: bool = False,
     ) -> None:
+        DocumentDataset.check_options(lazy=lazy, num_workers=num_workers, shard=shard)
         if not os.path.exists(label_path) or not os.path.exists(img_folder):
             raise FileNotFoundError(
                 f"unable to locate {label_path if not os.path.exists(label_path) else img_folder}"
@@ -56,61 +80,79 @@ class CORD:
         tmp_root = img_folder
         self.train = train
 
-        self.data: List[Document] = []
-
-        for img_path in os.listdir(tmp_root):
-            # File existence check
-            if not os.path.exists(os.path.join(tmp_root, img_path)):
-                raise FileNotFoundError(
-                    f"unable to locate {os.path.join(tmp_root, img_path)}"
-                )
-
-            stem = Path(img_path).stem
-            _targets = []
-
-            with open(os.path.join(label_path, f"{stem}.json"), "rb") as f:
-                label = json.load(f)
-                row_id_dic = {}
-                for line in label["valid_line"]:
-                    # text_unit = ""
-
-                    for word in line["words"]:
-                        if len(word["text"]) > 0:
-                            # text_unit += word["text"] + " "
-                            # row_id_dic[word['row_id']] += word["text"] + " "
-                            if word["row_id"] in row_id_dic:
-                                row_id_dic[word["row_id"]] += word["text"].lower() + " "
-                            else:
-                                row_id_dic[word["row_id"]] = word["text"].lower() + " "
-                            x = (
-                                word["quad"]["x1"],
-                                word["quad"]["x2"],
-                                word["quad"]["x3"],
-                                word["quad"]["x4"],
-                            )
-                            y = (
-                                word["quad"]["y1"],
-                                word["quad"]["y2"],
-                                word["quad"]["y3"],
-                                word["quad"]["y4"],
-                            )
-                            # Reduce 8 coords to 4 -> xmin, ymin, xmax, ymax
-                            box = BaseUtils.X1X2_to_xywh(
-                                [min(x), min(y), max(x), max(y)]
-                            )
-                            _targets.append((box, word["text"], line["category"]))
-
-                if len(_targets) != 0:
-                    box_targets, text_targets, label_targets = zip(*_targets)
-                    ocr_output = {
-                        "bbox": box_targets,
-                        "content": text_targets,
-                        "label": label_targets,
-                    }
-
-                    self.data.append(
-                        DocumentEntityClassification(
-                            os.path.join(tmp_root, img_path), ocr_output
-                        )
-                    )
+        # One scan of the image folder gives the existence and shape of every image
+        # (only the file names in lazy mode, the shapes being read on access)
+        image_index = ImageIndex(
+            tmp_root, persist=cache_dir is not None, cache_dir=cache_dir, lazy=lazy
+        )
+
+        super().__init__(
+            records=image_index.files,
+            context=(label_path,),
+            image_root=tmp_root,
+            image_index=image_index,
+            lazy=lazy,
+            cache_size=cache_size,
+            num_workers=num_workers,
+            annotation_paths=[label_path],
+            cache_dir=cache_dir,
+            shard=shard,
+            balance_shards=balance_shards,
+        )
         self.root = tmp_root
+
+    @classmethod
+    def _record_weights(cls, context: tuple, records) -> list:
+        (label_path,) = context
+        return [
+            os.stat(os.path.join(label_path, f"{Path(record).stem}.json")).st_size
+            for record in records
+        ]
+
+    @staticmethod
+    def _parse_record(context: tuple, record: str) -> dict:
+        (label_path,) = context
+        img_path = record
+        stem = Path(img_path).stem
+        quads, text_targets, label_targets = [], [], []
+
+        with open(os.path.join(label_path, f"{stem}.json"), "rb") as f:
+            label = json.load(f)
+            row_id_dic = {}
+            for line in label["valid_line"]:
+                # text_unit = ""
+
+                for word in line["words"]:
+                    if len(word["text"]) > 0:
+                        # text_unit += word["text"] + " "
+                        # row_id_dic[word['row_id']] += word["text"] + " "
+                        if word["row_id"] in row_id_dic:
+                            row_id_dic[word["row_id"]] += word["text"].lower() + " "
+                        else:
+                            row_id_dic[word["row_id"]] = word["text"].lower() + " "
+                        quad = word["quad"]
+                        quads.append(
+                            [
+                                quad["x1"],
+                                quad["y1"],
+                                quad["x2"],
+                                quad["y2"],
+                                quad["x3"],
+                                quad["y3"],
+                                quad["x4"],
+                                quad["y4"],
+                            ]
+                        )
+                        text_targets.append(word["text"])
+                        label_targets.append(line["category"])
+
+        # Reduce the 8 coords of every quad to its enclosing box at once
+        box_targets = BaseUtils.X1X2X3X4_to_xywh_batch(quads)
+        return {
+            "img_path": img_path,
+            "ocr_output": {
+                "bbox": box_targets,
+                "content": text_targets,
+                "label": label_targets,
+            },
+        }
@@ -0,0 +1,492 @@
+import copy
+import hashlib
+import heapq
+import json
+import math
+import os
+import pickle
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from DocumentAI_std import __version__
+from DocumentAI_std.base.document_entity_classification import (
+    DocumentEntityClassification,
+)
+
+from DocumentAI_std.utils.image_index import ImageIndex
+
+# Parsing state of a worker process, set once per worker by `_init_parse_worker`
+_worker_state = {}
+
+
+def _init_parse_worker(parse_records: Callable, context: tuple) -> None:
+    """Store the parsing function and context in a worker process."""
+    _worker_state["parse_records"] = parse_records
+    _worker_state["context"] = context
+
+
+def _parse_chunk(records: Sequence[Any]) -> List[dict]:
+    """Parse a chunk of records in a worker process."""
+    return _worker_state["parse_records"](_worker_state["context"], records)
+
+
+class DocumentDataset:
+    """
+    Base class of the dataset loaders.
+
+    A dataset is described by a list of lightweight records (an image file name, a byte
+    offset in an annotation file, ...), one per document, and a parsing context shared by
+    all the records (the annotation paths). Each loader implements `_parse_record`, which
+    turns one record into the relative image path and the OCR output of the document.
+
+    In eager mode (the default) every record is parsed and every document is built when
+    the dataset is constructed, and the documents are kept in `data`. In lazy mode only the
+    records and the image file names are collected; a document is parsed and built, and
+    the header of its image read, when it is accessed, and an optional bounded LRU cache
+    keeps the most recently materialized documents.
+
+    Note:
+        In eager mode, documents without any annotation are skipped. In lazy mode the
+        records are not parsed up front, so such documents are returned without elements,
+        and `len(dataset)` counts them: the same annotations can give a longer lazy dataset
+        than eager one, and the same index can refer to different documents.
+
+        A dataset can be restricted to one shard of its records with `shard=(index,
+        num_shards)`, in which case only the records of that shard are parsed. The
+        assignment only depends on the records, so every process computes the same shards.
+
+        `to_lazy` returns a lazy view of the dataset, which only holds the records and the
+        parsing context and is therefore cheap to pickle (e.g. to send it to `DataLoader`
+        worker processes). The view rebuilds each document from the annotations on access,
+        so changes made to the documents of an eager dataset are not carried over.
+
+    Attributes:
+        train (bool): Indicates whether the dataset is for training or not.
+        lazy (bool): Whether the documents are parsed on access.
+        cache_size (int): The maximum number of materialized documents kept in lazy mode.
+    """
+
+    def __init__(
+        self,
+        records: Sequence[Any],
+        context: tuple,
+        image_root: str,
+        image_index: ImageIndex,
+        lazy: bool = False,
+        cache_size: int = 0,
+        num_workers: int = 0,
+        annotation_paths: Sequence[str] = (),
+        cache_dir: Optional[str] = None,
+        shard: Optional[Tuple[int, int]] = None,
+        balance_shards: bool = False,
+    ) -> None:
+        """
+        Collect the records of the dataset and, in eager mode, build every document.
+
+        Args:
+            records (Sequence[Any]): One record per document, understood by `_parse_record`.
+            context (tuple): The parsing context shared by all the records.
+            image_root (str): The folder the image paths returned by `_parse_record` are relative to.
+            image_index (ImageIndex): The index of the images in `image_root`.
+            lazy (bool, optional): Whether to parse the documents on access. Defaults to False.
+            cache_size (int, optional): The number of documents cached in lazy mode. Defaults to 0.
+            num_workers (int, optional): The number of processes parsing the records in eager mode.
+                Cannot be combined with `lazy=True`. Defaults to 0 (parse in the current process).
+            annotation_paths (Sequence[str], optional): The annotation files or folders of the dataset,
+                used to fingerprint the parsed-dataset cache.
+            cache_dir (str, optional): The folder of the parsed-dataset cache, used in eager mode only
+                (a lazy dataset only caches its image index). Defaults to None (no cache).
+            shard (Tuple[int, int], optional): The (index, num_shards) of the shard to keep. Defaults to None
+                (keep every record).
+            balance_shards (bool, optional): Whether to balance the shards by the approximate number of
+                elements of the records instead of assigning them by hash. Defaults to False.
+
+        Raises:
+            ValueError: If the options are inconsistent (see `check_options`).
+        """
+        DocumentDataset.check_options(lazy=lazy, num_workers=num_workers, shard=shard)
+        self._records = list(records)
+        self._context = context
+        self.shard = shard
+        self.balance_shards = balance_shards
+        if shard is not None:
+            weights = None
+            if balance_shards:
+                weights = self._record_weights(context, self._records)
+            positions = DocumentDataset.shard_records(
+                self._records, *shard, weights=weights
+            )
+            self._records = [self._records[position] for position in positions]
+        self._image_root = image_root
+        self._image_index = image_index
+        self.lazy = lazy
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._documents: Optional[List[DocumentEntityClassification]] = None
+        self._kept: Optional[List[int]] = None
+
+        if not lazy:
+            parsed_documents = None
+            if cache_dir is not None:
+                cache_path, fingerprint = self._cache_key(cache_dir, annotation_paths)
+                parsed_documents = self._read_parsed_cache(cache_path, fingerprint)
+            if parsed_documents is None:
+                parsed_documents = self._parse_all(num_workers)
+                if cache_dir is not None:
+                    self._write_parsed_cache(cache_path, fingerprint, parsed_documents)
+
+            # Positions of the kept records, so that a lazy view can rebuild the same documents
+            self._kept = [
+                index
+                for index, parsed in enumerate(parsed_documents)
+                if len(parsed["ocr_output"]["bbox"])
+            ]
+            self._documents = [
+                self._materialize(parsed_documents[index]) for index in self._kept
+            ]
+
+    @staticmethod
+    def check_options(
+        lazy: bool = False,
+        num_workers: int = 0,
+        shard: Optional[Tuple[int, int]] = None,
+    ) -> None:
+        """
+        Validate the loading options of a dataset.
+
+        Loaders call it before touching the image folder, so that a rejected call has no
+        side effect (no scan of the images, no sidecar file written).
+
+        Args:
+            lazy (bool, optional): Whether the documents are parsed on access. Defaults to False.
+            num_workers (int, optional): The number of processes parsing the records in eager mode.
+                Defaults to 0.
+            shard (Tuple[int, int], optional): The (index, num_shards) of the shard to keep. Defaults to None.
+
+        Raises:
+            ValueError: If `num_workers` is given in lazy mode, where the documents are not parsed
+                upfront, or if the shard index is not in [0, num_shards).
+        """
+        if lazy and num_workers > 0:
+            raise ValueError(
+                "num_workers parses the documents in eager mode and cannot be combined with lazy=True."
+            )
+        if shard is not None and not 0 <= shard[0] < shard[1]:
+            raise ValueError(
+                f"shard index must be in [0, {shard[1]}), received {shard[0]}."
+            )
+
+    @staticmethod
+    def _parse_record(context: tuple, record: Any) -> dict:
+        """
+        Parse the annotations of one document.
+
+        Args:
+            context (tuple): The parsing context shared by all the records.
+            record (Any): The record of the document.
+
+        Returns:
+            dict: A dictionary with the keys:
+                  - "img_path": The path of the image, relative to the image root.
+                  - "ocr_output": The bounding boxes, contents and labels of the document.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def _parse_records(cls, context: tuple, records: Sequence[Any]) -> List[dict]:
+        """
+        Parse the annotations of several documents.
+
+        Loaders whose records share a file can override this method to open it only once.
+
+        Args:
+            context (tuple): The parsing context shared by all the records.
+            records (Sequence[Any]): The records of the documents.
+
+        Returns:
+            List[dict]: The parsed documents, in the order of the records.
+        """
+        return [cls._parse_record(context, record) for record in records]
+
+    @classmethod
+    def _record_weights(cls, context: tuple, records: Sequence[Any]) -> List[int]:
+        """
+        Estimate the number of elements of each record without parsing it.
+
+        The estimate only needs to be proportional to the parsing cost; loaders use the size
+        in bytes of the annotations of each record.
+
+        Args:
+            context (tuple): The parsing context shared by all the records.
+            records (Sequence[Any]): The records of the documents.
+
+        Returns:
+            List[int]: The weight of each record.
+        """
+        return [1] * len(records)
+
+    @staticmethod
+    def shard_records(
+        records: Sequence[Any],
+        index: int,
+        num_shards: int,
+        weights: Optional[Sequence[int]] = None,
+    ) -> List[int]:
+        """
+        Select the records of one shard.
+
+        Without weights, a record belongs to shard `crc32(str(record)) % num_shards`, so its
+        shard does not depend on the other records. With weights, the records are assigned
+        greedily, heaviest first, to the lightest shard, which balances the total weight of
+        the shards; ties are broken by the record hash, so the result is deterministic.
+
+        Args:
+            records (Sequence[Any]): The records of the dataset.
+            index (int): The index of the shard to select.
+            num_shards (int): The number of shards.
+            weights (Sequence[int], optional): The weight of each record. Defaults to None.
+
+        Returns:
+            List[int]: The positions of the records of the shard, in increasing order.
+
+        Raises:
+            ValueError: If the shard index is not in [0, num_shards).
+        """
+        if not 0 <= index < num_shards:
+            raise ValueError(
+                f"shard index must be in [0, {num_shards}), received {index}."
+            )
+        keys = [zlib.crc32(str(record).encode("utf-8")) for record in records]
+        if weights is None:
+            return [
+                position
+                for position, key in enumerate(keys)
+                if key % num_shards == index
+            ]
+
+        order = sorted(
+            range(len(records)),
+            key=lambda position: (-weights[position], keys[position], position),
+        )
+        loads = [(0, shard) for shard in range(num_shards)]
+        selected = []
+        for position in order:
+            load, shard = heapq.heappop(loads)
+            if shard == index:
+                selected.append(position)
+            heapq.heappush(loads, (load + weights[position], shard))
+        return sorted(selected)
+
+    def _parse_all(self, num_workers: int = 0) -> List[dict]:
+        """
+        Parse every record, in order, optionally with a pool of worker processes.
+
+        Args:
+            num_workers (int, optional): The number of worker processes. Defaults to 0 (serial).
+
+        Returns:
+            List[dict]: The parsed documents, in the order of the records.
+        """
+        if num_workers <= 1 or len(self._records) <= 1:
+            return self._parse_records(self._context, self._records)
+
+        # A few chunks per worker balance the load while keeping the pickling overhead low
+        chunk_size = math.ceil(len(self._records) / (num_workers * 4))
+        chunks = [
+            self._records[i : i + chunk_size]
+            for i in range(0, len(self._records), chunk_size)
+        ]
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_parse_worker,
+            initargs=(self._parse_records, self._context),
+        ) as executor:
+            return [
+                parsed
+                for chunk in executor.map(_parse_chunk, chunks)
+                for parsed in chunk
+            ]
+
+    def _cache_key(self, cache_dir: str, annotation_paths: Sequence[str]) -> tuple:
+        """
+        Compute the cache file path and the fingerprint of the dataset inputs.
+
+        The cache file is named after the loader and its input paths, so that each dataset
+        has a single cache file. The fingerprint covers the size and modification time of
+        every annotation file, the image index entries and the package version.
+
+        Args:
+            cache_dir (str): The folder of the parsed-dataset cache.
+            annotation_paths (Sequence[str]): The annotation files or folders of the dataset.
+
+        Returns:
+            tuple: The path of the cache file and the fingerprint of the inputs.
+        """
+        sources = []
+        for path in annotation_paths:
+            if os.path.isdir(path):
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            sources.append([entry.path, stat.st_size, stat.st_mtime_ns])
+            else:
+                stat = os.stat(path)
+                sources.append([path, stat.st_size, stat.st_mtime_ns])
+
+        identity = [
+            type(self).__name__,
+            os.path.abspath(self._image_root),
+            sorted(os.path.abspath(path) for path in annotation_paths),
+        ]
+        if self.shard is not None:
+            identity += [list(self.shard), self.balance_shards]
+        name = hashlib.sha256(json.dumps(identity).encode()).hexdigest()[:16]
+        cache_path = os.path.join(cache_dir, f"{type(self).__name__}-{name}.pkl")
+
+        fingerprint = hashlib.sha256(
+            json.dumps(
+                [
+                    __version__,
+                    sorted(sources),
+                    sorted(self._image_index.entries.items()),
+                ]
+            ).encode()
+        ).hexdigest()
+        return cache_path, fingerprint
+
+    @staticmethod
+    def _read_parsed_cache(cache_path: str, fingerprint: str) -> Optional[List[dict]]:
+        """Return the cached parsed documents, or None if the cache is missing or stale."""
+        try:
+            with open(cache_path, "rb") as f:
+                cached = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        if not isinstance(cached, dict) or cached.get("fingerprint") != fingerprint:
+            return None
+        return cached["documents"]
+
+    @staticmethod
+    def _write_parsed_cache(
+        cache_path: str, fingerprint: str, parsed_documents: List[dict]
+    ) -> None:
+        """Store the parsed documents in the cache, replacing a stale cache file."""
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {"fingerprint": fingerprint, "documents": parsed_documents},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_path, cache_path)
+
+    def _materialize(self, parsed: dict) -> DocumentEntityClassification:
+        """Build the document of a parsed record, using the image index for its shape."""
+        img_path = parsed["img_path"]
+        return DocumentEntityClassification.from_arrays(
+            os.path.join(self._image_root, img_path),
+            parsed["ocr_output"]["bbox"],
+            parsed["ocr_output"]["content"],
+            labels=parsed["ocr_output"]["label"],
+            shape=self._image_index.shape(img_path),
+        )
+
+    def _load(self, index: int) -> DocumentEntityClassification:
+        """Parse and build a document in lazy mode, going through the cache."""
+        document = self._cache.get(index)
+        if document is not None:
+            self._cache.move_to_end(index)
+            return document
+
+        document = self._materialize(
+            self._parse_records(self._context, [self._records[index]])[0]
+        )
+        if self.cache_size > 0:
+            self._cache[index] = document
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return document
+
+    @property
+    def data(self) -> List[DocumentEntityClassification]:
+        """
+        The list of document entities in the dataset.
+
+        In lazy mode the list is built on each access, which parses every document.
+        """
+        if self._documents is not None:
+            return self._documents
+        return list(self)
+
+    @data.setter
+    def data(self, documents: List[DocumentEntityClassification]) -> None:
+        """
+        Replace the documents of the dataset, e.g. `dataset.data = dataset.data[:100]`.
+
+        The dataset then holds the given documents in memory, in eager mode, and no longer
+        maps them to its records.
+        """
+        self._documents = list(documents)
+        self._kept = None
+        self.lazy = False
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        if self._documents is not None:
+            return len(self._documents)
+        return len(self._records)
+
+    def __getitem__(self, index: int) -> DocumentEntityClassification:
+        if self._documents is not None:
+            return self._documents[index]
+        if index < 0:
+            index += len(self._records)
+        if not 0 <= index < len(self._records):
+            raise IndexError("dataset index out of range")
+        return self._load(index)
+
+    def __iter__(self) -> Iterator[DocumentEntityClassification]:
+        if self._documents is not None:
+            yield from self._documents
+            return
+        for index in range(len(self._records)):
+            yield self._load(index)
+
+    def to_lazy(self) -> "DocumentDataset":
+        """
+        Return a lazy view of the dataset, holding its records but none of its documents.
+
+        The view has the same length and indices as the dataset: it keeps the records of the
+        documents of an eager dataset, and builds each document on access. It shares the
+        parsing context and the image index of the dataset, and starts with an empty cache.
+
+        Returns:
+            DocumentDataset: The lazy view.
+
+        Raises:
+            ValueError: If the documents were replaced through `data`, so that they no longer
+                map to records.
+        """
+        if self.lazy:
+            records = self._records
+        elif self._kept is None:
+            raise ValueError(
+                "The documents of the dataset were replaced and cannot be rebuilt from its records."
+            )
+        else:
+            records = [self._records[index] for index in self._kept]
+        view = copy.copy(self)
+        view._records = records
+        view._documents = None
+        view._kept = None
+        view._cache = OrderedDict()
+        view.lazy = True
+        return view
+
+    def clear_cache(self) -> None:
+        """Drop the documents cached in lazy mode."""
+        self._cache.clear()
@@ -1,18 +1,15 @@
 import json
 import os
 from pathlib import Path
-from typing import List
+from typing import Optional, Tuple
 
-from DocumentAI_std.base.document_entity_classification import (
-    DocumentEntityClassification,
-)
+from DocumentAI_std.datasets.dataset import DocumentDataset
 
 from DocumentAI_std.utils.base_utils import BaseUtils
+from DocumentAI_std.utils.image_index import ImageIndex
 
-from DocumentAI_std.base.document import Document
 
-
-class FUNSD:
+class FUNSD(DocumentDataset):
     """
     CORD dataset from `"CORD: A Consolidated Receipt Dataset forPost-OCR Parsing"
     <https://openreview.net/pdf?id=SJl3z659UH>`_.
@@ -23,6 +20,19 @@ class FUNSD:
         img_folder (str): Folder containing all the images of the dataset.
         label_path (str): Path to the annotations file of the dataset.
         train (bool, optional): Whether the subset should be the training one. Defaults to True.
+        lazy (bool, optional): Whether to parse the documents on access instead of upfront. Defaults to False.
+            Documents without annotations are skipped in eager mode but returned without elements in lazy
+            mode, since telling them apart requires parsing them: the two modes can differ in length.
+        cache_size (int, optional): The number of documents kept in memory in lazy mode. Defaults to 0.
+        num_workers (int, optional): The number of processes parsing the annotations in eager mode.
+            Cannot be combined with `lazy=True`. Defaults to 0 (parse in the current process).
+        cache_dir (str, optional): Folder where the parsed annotations and the image index are cached
+            between runs. The cache is invalidated when the annotation files, the images or the package
+            version change. In lazy mode only the image index is cached. Defaults to None (no cache).
+        shard (Tuple[int, int], optional): The (index, num_shards) of the shard to load. Only the documents
+            of that shard are parsed, and every process computes the same assignment. Defaults to None.
+        balance_shards (bool, optional): Whether to balance the shards by the approximate number of elements
+            of the documents instead of their number. Defaults to False.
 
     Attributes:
         data (List[DocumentEntityClassification]): List of document entities in the dataset.
@@ -34,13 +44,22 @@ class FUNSD:
     ...     data_folder="/path/to/funsd/"
     ...     train=True
     ... )
+    >>> dataset = FUNSD(data_folder="/path/to/funsd/", lazy=True)
+    >>> document = dataset[0]
     """
 
     def __init__(
         self,
         data_folder: str,
         train: bool = True,
+        lazy: bool = False,
+        cache_size: int = 0,
+        num_workers: int = 0,
+        cache_dir: Optional[str] = None,
+        shard: Optional[Tuple[int, int]] = None,
+        balance_shards: bool = False,
     ) -> None:
+        DocumentDataset.check_options(lazy=lazy, num_workers=num_workers, shard=shard)
         self.train = train
         self.root = data_folder
         # Use the subset
@@ -50,34 +69,55 @@ class FUNSD:
 
         # # List images
         tmp_root = os.path.join(self.root, sub_folder, "images")
-        self.data: List[Document] = []
-
-        for img_path in os.listdir(tmp_root):
-            # File existence check
-            if not os.path.exists(os.path.join(tmp_root, img_path)):
-                raise FileNotFoundError(
-                    f"unable to locate {os.path.join(tmp_root, img_path)}"
-                )
-
-            stem = Path(img_path).stem
-            with open(
-                os.path.join(self.root, sub_folder, "annotations", f"{stem}.json"), "rb"
-            ) as f:
-                data = json.load(f)
-            _targets = [
-                (BaseUtils.X1X2_to_xywh(block["box"]), block["text"], block["label"])
-                for block in data["form"]
-            ]
-
-            if _targets:
-                box_targets, text_targets, label_targets = zip(*_targets)
-                ocr_output = {
-                    "bbox": box_targets,
-                    "content": text_targets,
-                    "label": label_targets,
-                }
-                self.data.append(
-                    DocumentEntityClassification(
-                        os.path.join(tmp_root, img_path), ocr_output
-                    )
-                )
+
+        annotations_folder = os.path.join(self.root, sub_folder, "annotations")
+
+        # One scan of the image folder gives the existence and shape of every image
+        # (only the file names in lazy mode, the shapes being read on access)
+        image_index = ImageIndex(
+            tmp_root, persist=cache_dir is not None, cache_dir=cache_dir, lazy=lazy
+        )
+
+        super().__init__(
+            records=image_index.files,
+            context=(annotations_folder,),
+            image_root=tmp_root,
+            image_index=image_index,
+            lazy=lazy,
+            cache_size=cache_size,
+            num_workers=num_workers,
+            annotation_paths=[annotations_folder],
+            cache_dir=cache_dir,
+            shard=shard,
+            balance_shards=balance_shards,
+        )
+
+    @classmethod
+    def _record_weights(cls, context: tuple, records) -> list:
+        (annotations_folder,) = context
+        return [
+            os.stat(
+                os.path.join(annotations_folder, f"{Path(record).stem}.json")
+            ).st_size
+            for record in records
+        ]
+
+    @staticmethod
+    def _parse_record(context: tuple, record: str) -> dict:
+        (annotations_folder,) = context
+        img_path = record
+        stem = Path(img_path).stem
+        with open(os.path.join(annotations_folder, f"{stem}.json"), "rb") as f:
+            data = json.load(f)
+        form = data["form"]
+        box_targets = BaseUtils.X1X2_to_xywh_batch([block["box"] for block in form])
+        text_targets = [block["text"] for block in form]
+        label_targets = [block["label"] for block in form]
+        return {
+            "img_path": img_path,
+            "ocr_output": {
+                "bbox": box_targets,
+                "content": text_targets,
+                "label": label_targets,
+            },
+        }
@@ -0,0 +1,212 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset, get_worker_info
+
+from DocumentAI_std.base.document_entity_classification import (
+    DocumentEntityClassification,
+)
+from DocumentAI_std.datasets.dataset import DocumentDataset
+
+
+class TorchDocumentDataset(Dataset):
+    """
+    `torch.utils.data.Dataset` adapter for the dataset loaders.
+
+    The adapter can be given directly to a `DataLoader`. By default, the worker processes
+    of the loader load the documents from the lazy view of the wrapped dataset (see
+    `DocumentDataset.to_lazy`): the adapter is pickled with the view, which only holds the
+    records and the parsing context, and each worker parses and builds the documents it is
+    asked for. The workers therefore never receive the list of documents, whatever the size
+    of the dataset, while the main process keeps using the wrapped dataset.
+
+    Args:
+        dataset (DocumentDataset): The dataset to wrap (`CORD`, `FUNSD`, `XFUND`, `Wildreceipt`).
+        transform (Callable, optional): A function applied to each document before it is returned.
+        compact (bool, optional): Whether the worker processes load the documents from the lazy view
+            of the dataset. Set it to False if the documents of the dataset were modified or replaced,
+            so that the workers receive them. Defaults to True.
+
+    Example:
+    >>> dataset = TorchDocumentDataset(FUNSD(data_folder="/path/to/funsd/"))
+    >>> loader = DataLoader(
+    ...     dataset,
+    ...     batch_size=8,
+    ...     num_workers=4,
+    ...     collate_fn=DocumentCollator(label_map={"question": 0, "answer": 1}),
+    ... )
+    >>> batch = next(iter(loader))
+    >>> batch["bboxes"].shape
+    torch.Size([8, 112, 4])
+    """
+
+    def __init__(
+        self,
+        dataset: DocumentDataset,
+        transform: Optional[Callable] = None,
+        compact: bool = True,
+    ) -> None:
+        self.dataset = dataset
+        self.transform = transform
+        self.compact = compact
+        self._worker_dataset = dataset.to_lazy() if compact else dataset
+
+    def __len__(self) -> int:
+        return len(self.dataset)
+
+    def __getitem__(self, index: int) -> Any:
+        # Forked workers inherit the wrapped dataset but only read the lazy view
+        if get_worker_info() is not None:
+            document = self._worker_dataset[index]
+        else:
+            document = self.dataset[index]
+        if self.transform is not None:
+            return self.transform(document)
+        return document
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["dataset"] = self._worker_dataset
+        return state
+
+
+class DocumentCollator:
+    """
+    Collate function packing a list of documents into padded tensors.
+
+    Documents have different numbers of elements, so the element tensors are padded to the
+    largest document of the batch and a mask marks the real elements. The collator is a
+    plain class, so it can be pickled to the `DataLoader` worker processes.
+
+    Args:
+        label_map (Dict[Any, int], optional): The class index of each label. If given, the batch
+            holds a "labels" tensor. Defaults to None.
+        with_regions (bool, optional): Whether to extract the pixel region of every element.
+            Defaults to False.
+        is_gray (bool, optional): Flag to convert the regions to grayscale. Otherwise the regions
+            are converted to RGB, whatever the mode of each page. Defaults to True.
+
+    Example:
+    >>> collate = DocumentCollator(label_map={"question": 0, "answer": 1}, with_regions=True)
+    >>> batch = collate([document_1, document_2])
+    >>> batch["regions"].shape
+    torch.Size([2, 35, 1, 48, 310])
+    """
+
+    def __init__(
+        self,
+        label_map: Optional[Dict[Any, int]] = None,
+        with_regions: bool = False,
+        is_gray: bool = True,
+    ) -> None:
+        self.label_map = label_map
+        self.with_regions = with_regions
+        self.is_gray = is_gray
+
+    def __call__(self, documents: Sequence[DocumentEntityClassification]) -> dict:
+        """
+        Collate a batch of documents.
+
+        Args:
+            documents (Sequence[DocumentEntityClassification]): The documents of the batch.
+
+        Returns:
+            dict: A dictionary with the keys:
+                  - "bboxes": Float tensor of shape (B, N_max, 4) in x, y, w, h format.
+                  - "mask": Boolean tensor of shape (B, N_max), True for the real elements.
+                  - "shapes": Tensor of shape (B, 2) holding the (width, height) of each page.
+                  - "contents": The list of element contents of each document.
+                  - "img_paths": The image path of each document.
+                  - "labels": Long tensor of shape (B, N_max), -1 on padding (only with `label_map`).
+                  - "regions": Tensor of shape (B, N_max, C, H_max, W_max) holding the zero-padded
+                    element regions (only with `with_regions`).
+                  - "region_mask": Boolean tensor of shape (B, N_max, H_max, W_max), True inside each
+                    region (only with `with_regions`).
+        """
+        batch_size = len(documents)
+        counts = [len(document.elements) for document in documents]
+        max_count = max(counts, default=0)
+
+        bboxes = torch.zeros((batch_size, max_count, 4), dtype=torch.float32)
+        mask = torch.zeros((batch_size, max_count), dtype=torch.bool)
+        for i, (document, count) in enumerate(zip(documents, counts)):
+            if count:
+                bboxes[i, :count] = torch.from_numpy(
+                    np.asarray(document.bboxes, dtype=np.float32)
+                )
+                mask[i, :count] = True
+
+        batch = {
+            "bboxes": bboxes,
+            "mask": mask,
+            "shapes": torch.tensor(
+                [list(document.shape) for document in documents], dtype=torch.int64
+            ).reshape(batch_size, 2),
+            "contents": [list(document.contents) for document in documents],
+            "img_paths": [document.img_path for document in documents],
+        }
+
+        if self.label_map is not None:
+            labels = torch.full((batch_size, max_count), -1, dtype=torch.int64)
+            for i, document in enumerate(documents):
+                if counts[i]:
+                    labels[i, : counts[i]] = torch.tensor(
+                        [self.label_map[label] for label in document.labels]
+                    )
+            batch["labels"] = labels
+
+        if self.with_regions:
+            batch.update(self._collate_regions(documents, counts, max_count))
+        return batch
+
+    def _collate_regions(
+        self,
+        documents: Sequence[DocumentEntityClassification],
+        counts: List[int],
+        max_count: int,
+    ) -> dict:
+        """Extract the regions of every document and pad them to a common shape."""
+        regions = [
+            document.extract_regions(is_gray=self.is_gray) if count else None
+            for document, count in zip(documents, counts)
+        ]
+        extracted = [region for region in regions if region is not None]
+        channels = 1 if self.is_gray else 3
+        max_h = max((r["pixels"].shape[2] for r in extracted), default=0)
+        max_w = max((r["pixels"].shape[3] for r in extracted), default=0)
+
+        pixels = torch.zeros(
+            (len(documents), max_count, channels, max_h, max_w), dtype=torch.float32
+        )
+        region_mask = torch.zeros(
+            (len(documents), max_count, max_h, max_w), dtype=torch.bool
+        )
+        for i, region in enumerate(regions):
+            if region is None:
+                continue
+            count, _, h, w = region["pixels"].shape
+            pixels[i, :count, :, :h, :w] = DocumentCollator._to_channels(
+                region["pixels"].cpu(), channels
+            )
+            region_mask[i, :count, :h, :w] = region["mask"].cpu()
+        return {"regions": pixels, "region_mask": region_mask}
+
+    @staticmethod
+    def _to_channels(pixels: torch.Tensor, channels: int) -> torch.Tensor:
+        """
+        Convert (N, C, H, W) regions to 1 or 3 channels, whatever the mode of their page.
+
+        Gray levels (L, LA) are repeated to give RGB, the alpha channel (LA, RGBA) is dropped,
+        and RGB is converted to gray with the ITU-R 601-2 luma weights, as PIL does.
+        """
+        if pixels.shape[1] == channels:
+            return pixels
+        if pixels.shape[1] < 3:
+            gray = pixels[:, :1]
+            return gray if channels == 1 else gray.expand(-1, 3, -1, -1)
+        rgb = pixels[:, :3]
+        if channels == 3:
+            return rgb
+        weights = torch.tensor([0.299, 0.587, 0.114], dtype=pixels.dtype)
+        return (rgb * weights.view(1, 3, 1, 1)).sum(dim=1, keepdim=True)
@@ -1,17 +1,17 @@
 import json
 import os
-from typing import List
+from typing import Iterator, Optional, Tuple
 
 from DocumentAI_std.base.document_entity_classification import (
     DocumentEntityClassification,
 )
+from DocumentAI_std.datasets.dataset import DocumentDataset
 
 from DocumentAI_std.utils.base_utils import BaseUtils
+from DocumentAI_std.utils.image_index import ImageIndex
 
-from DocumentAI_std.base.document import Document
 
-
-class Wildreceipt:
+class Wildreceipt(DocumentDataset):
     """
     WildReceipt dataset from "Spatial Dual-Modality Graph Reasoning for Key Information Extraction"
     (https://arxiv.org/abs/2103.14470v1) and available at the following repository:
@@ -22,6 +22,19 @@ class Wildreceipt:
         img_folder (str): Folder containing all the images of the dataset.
         label_path (str): Path to the annotations file of the dataset.
         train (bool, optional): Whether the subset should be the training one. Defaults to True.
+        lazy (bool, optional): Whether to parse the documents on access instead of upfront. Defaults to False.
+            Documents without annotations are skipped in eager mode but returned without elements in lazy
+            mode, since telling them apart requires parsing them: the two modes can differ in length.
+        cache_size (int, optional): The number of documents kept in memory in lazy mode. Defaults to 0.
+        num_workers (int, optional): The number of processes parsing the annotations in eager mode.
+            Cannot be combined with `lazy=True`. Defaults to 0 (parse in the current process).
+        cache_dir (str, optional): Folder where the parsed annotations and the image index are cached
+            between runs. The cache is invalidated when the annotation files, the images or the package
+            version change. In lazy mode only the image index is cached. Defaults to None (no cache).
+        shard (Tuple[int, int], optional): The (index, num_shards) of the shard to load. Only the documents
+            of that shard are parsed, and every process computes the same assignment. Defaults to None.
+        balance_shards (bool, optional): Whether to balance the shards by the approximate number of elements
+            of the documents instead of their number. Defaults to False.
 
     Attributes:
         data (List[DocumentEntityClassification]): List of document entities in the dataset.
@@ -34,6 +47,17 @@ class Wildreceipt:
     ...     label_path="/path/to/annotations.json",
     ...     train=True
     ... )
+    >>> dataset = Wildreceipt(
+    ...     img_folder="/path/to/images",
+    ...     label_path="/path/to/annotations.json",
+    ...     lazy=True,
+    ... )
+    >>> document = dataset[0]
+    >>> for document in Wildreceipt.iter_documents(
+    ...     img_folder="/path/to/images",
+    ...     label_path="/path/to/annotations.json",
+    ... ):
+    ...     process(document)
     """
 
     def __init__(
@@ -41,7 +65,14 @@ class Wildreceipt:
         img_folder: str,
         label_path: str,
         train: bool = True,
+        lazy: bool = False,
+        cache_size: int = 0,
+        num_workers: int = 0,
+        cache_dir: Optional[str] = None,
+        shard: Optional[Tuple[int, int]] = None,
+        balance_shards: bool = False,
     ) -> None:
+        DocumentDataset.check_options(lazy=lazy, num_workers=num_workers, shard=shard)
         # File existence check
         if not os.path.exists(label_path) or not os.path.exists(img_folder):
             raise FileNotFoundError(
@@ -50,37 +81,144 @@ class Wildreceipt:
 
         tmp_root = img_folder
         self.train = train
-        self.data: List[Document] = []
-
-        with open(label_path, "r") as file:
-            data = file.read()
-        # Split the text file into separate JSON strings
-        json_strings = data.strip().split("\n")
-        for json_string in json_strings:
-            json_data = json.loads(json_string)
-            img_path = json_data["file_name"]
-            annotations = json_data["annotations"]
-
-            box_targets, text_targets, label_targets = zip(
-                *[
-                    (
-                        BaseUtils.X1X2X3X4_to_xywh(annotation["box"]),
-                        annotation["text"],
-                        annotation["label"],
-                    )
-                    for annotation in annotations
-                ]
+
+        # One recursive scan of the image folder gives the existence and shape of every image
+        # (only the file names in lazy mode, the shapes being read on access)
+        image_index = ImageIndex(
+            tmp_root,
+            recursive=True,
+            persist=cache_dir is not None,
+            cache_dir=cache_dir,
+            lazy=lazy,
+        )
+
+        # Each document is a JSON line of the annotation file, indexed by its byte offset
+        offsets = [offset for offset, _ in Wildreceipt._iter_lines(label_path)]
+
+        super().__init__(
+            records=offsets,
+            context=(label_path,),
+            image_root=tmp_root,
+            image_index=image_index,
+            lazy=lazy,
+            cache_size=cache_size,
+            num_workers=num_workers,
+            annotation_paths=[label_path],
+            cache_dir=cache_dir,
+            shard=shard,
+            balance_shards=balance_shards,
+        )
+        self.root = tmp_root
+
+    @staticmethod
+    def _iter_lines(label_path: str, offset: int = 0) -> Iterator[Tuple[int, bytes]]:
+        """
+        Read the annotation file line by line, skipping blank lines.
+
+        Args:
+            label_path (str): Path to the annotations file of the dataset.
+            offset (int, optional): The byte offset to start from. An offset falling inside a
+                line starts at the next line. Defaults to 0.
+
+        Yields:
+            Tuple[int, bytes]: The byte offset of each non-blank line and the line itself.
+        """
+        with open(label_path, "rb") as file:
+            if offset > 0:
+                # Move to the first line starting at or after the offset
+                file.seek(offset - 1)
+                offset += len(file.readline()) - 1
+            for line in file:
+                if line.strip():
+                    yield offset, line
+                offset += len(line)
+
+    @classmethod
+    def iter_documents(
+        cls,
+        img_folder: str,
+        label_path: str,
+        offset: int = 0,
+        with_offsets: bool = False,
+    ) -> Iterator[DocumentEntityClassification]:
+        """
+        Stream the documents of the annotation file, one JSON line at a time.
+
+        Only the current line and document are held in memory, so annotation files larger
+        than the available memory can be processed. Documents without annotations are skipped,
+        as in the eager loader.
+
+        Args:
+            img_folder (str): Folder containing all the images of the dataset.
+            label_path (str): Path to the annotations file of the dataset.
+            offset (int, optional): The byte offset to start reading from. An offset falling
+                inside a line starts at the next line. Defaults to 0.
+            with_offsets (bool, optional): Whether to yield (offset, document) pairs, so that
+                processing can be resumed from the offset of a line. Defaults to False.
+
+        Yields:
+            DocumentEntityClassification: The documents of the annotation file, in file order.
+
+        Example:
+        >>> for offset, document in Wildreceipt.iter_documents(
+        ...     img_folder="/path/to/images",
+        ...     label_path="/path/to/annotations.json",
+        ...     with_offsets=True,
+        ... ):
+        ...     process(document)
+        """
+        if not os.path.exists(label_path) or not os.path.exists(img_folder):
+            raise FileNotFoundError(
+                f"unable to locate {label_path if not os.path.exists(label_path) else img_folder}"
+            )
+
+        image_index = ImageIndex(img_folder, recursive=True, lazy=True)
+        for line_offset, line in cls._iter_lines(label_path, offset):
+            parsed = cls._parse_line(line)
+            if not len(parsed["ocr_output"]["bbox"]):
+                continue
+            document = DocumentEntityClassification.from_arrays(
+                os.path.join(img_folder, parsed["img_path"]),
+                parsed["ocr_output"]["bbox"],
+                parsed["ocr_output"]["content"],
+                labels=parsed["ocr_output"]["label"],
+                shape=image_index.shape(parsed["img_path"]),
             )
+            yield (line_offset, document) if with_offsets else document
+
+    @staticmethod
+    def _parse_line(json_string) -> dict:
+        json_data = json.loads(json_string)
+        img_path = json_data["file_name"]
+        annotations = json_data["annotations"]
 
-            ocr_output = {
+        box_targets = BaseUtils.X1X2X3X4_to_xywh_batch(
+            [annotation["box"] for annotation in annotations]
+        )
+        text_targets = [annotation["text"] for annotation in annotations]
+        label_targets = [annotation["label"] for annotation in annotations]
+        return {
+            "img_path": img_path,
+            "ocr_output": {
                 "bbox": box_targets,
                 "content": text_targets,
                 "label": label_targets,
-            }
+            },
+        }
 
-            self.data.append(
-                DocumentEntityClassification(
-                    os.path.join(tmp_root, img_path), ocr_output
-                )
-            )
-        self.root = tmp_root
+    @classmethod
+    def _record_weights(cls, context: tuple, records) -> list:
+        (label_path,) = context
+        # A line spans from its offset to the next one (blank lines are negligible)
+        ends = list(records[1:]) + [os.stat(label_path).st_size]
+        return [end - start for start, end in zip(records, ends)]
+
+    @classmethod
+    def _parse_records(cls, context: tuple, records) -> list:
+        (label_path,) = context
+        parsed = []
+        with open(label_path, "rb") as file:
+            for offset in records:
+                file.seek(offset)
+                parsed.append(cls._parse_line(file.readline()))
+        return parsed
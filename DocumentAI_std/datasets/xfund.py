@@ -1,17 +1,17 @@
 import json
 import os
-from typing import List
+from typing import Iterator, Optional, Tuple
 
 from DocumentAI_std.base.document_entity_classification import (
     DocumentEntityClassification,
 )
+from DocumentAI_std.datasets.dataset import DocumentDataset
 
 from DocumentAI_std.utils.base_utils import BaseUtils
+from DocumentAI_std.utils.image_index import ImageIndex
 
-from DocumentAI_std.base.document import Document
 
-
-class XFUND:
+class XFUND(DocumentDataset):
     """
     CORD dataset from `"CORD: A Consolidated Receipt Dataset forPost-OCR Parsing"
     <https://openreview.net/pdf?id=SJl3z659UH>`_.
@@ -22,6 +22,21 @@ class XFUND:
         img_folder (str): Folder containing all the images of the dataset.
         label_path (str): Path to the annotations file of the dataset.
         train (bool, optional): Whether the subset should be the training one. Defaults to True.
+        lazy (bool, optional): Whether to build the documents on access instead of upfront. Defaults to False.
+            The brackets and strings of the annotation file are still scanned once to find the byte span
+            of each document, but the documents are only decoded on access.
+            Documents without annotations are skipped in eager mode but returned without elements in lazy
+            mode, since telling them apart requires parsing them: the two modes can differ in length.
+        cache_size (int, optional): The number of documents kept in memory in lazy mode. Defaults to 0.
+        num_workers (int, optional): The number of processes parsing the annotations in eager mode.
+            Cannot be combined with `lazy=True`. Defaults to 0 (parse in the current process).
+        cache_dir (str, optional): Folder where the parsed annotations and the image index are cached
+            between runs. The cache is invalidated when the annotation files, the images or the package
+            version change. In lazy mode only the image index is cached. Defaults to None (no cache).
+        shard (Tuple[int, int], optional): The (index, num_shards) of the shard to load. Only the documents
+            of that shard are parsed, and every process computes the same assignment. Defaults to None.
+        balance_shards (bool, optional): Whether to balance the shards by the approximate number of elements
+            of the documents instead of their number. Defaults to False.
 
     Attributes:
         data (List[DocumentEntityClassification]): List of document entities in the dataset.
@@ -33,47 +48,131 @@ class XFUND:
     ...     data_folder="/path/to/xfund/"
     ...     train=True
     ... )
+    >>> dataset = XFUND(data_folder="/path/to/xfund/", lazy=True)
+    >>> document = dataset[0]
+    >>> for document in XFUND.iter_documents(data_folder="/path/to/xfund/"):
+    ...     process(document)
     """
 
-    def __init__(self, data_folder: str, train: bool = True, lang: str = "fr") -> None:
+    def __init__(
+        self,
+        data_folder: str,
+        train: bool = True,
+        lang: str = "fr",
+        lazy: bool = False,
+        cache_size: int = 0,
+        num_workers: int = 0,
+        cache_dir: Optional[str] = None,
+        shard: Optional[Tuple[int, int]] = None,
+        balance_shards: bool = False,
+    ) -> None:
+        DocumentDataset.check_options(lazy=lazy, num_workers=num_workers, shard=shard)
         # File existence check
         if not os.path.exists(data_folder):
             raise FileNotFoundError(f"unable to locate {data_folder}")
 
         self.train = train
-        self.data: List[Document] = []
+        img_path, label_path = XFUND._paths(data_folder, train, lang)
+
+        # One scan of the image folder gives the existence and shape of every image
+        # (only the file names in lazy mode, the shapes being read on access)
+        image_index = ImageIndex(
+            img_path, persist=cache_dir is not None, cache_dir=cache_dir, lazy=lazy
+        )
+
+        # Each document is indexed by its byte span, found without decoding the documents
+        spans = list(BaseUtils.iter_json_array_spans(label_path, "documents"))
+
+        super().__init__(
+            records=spans,
+            context=(label_path,),
+            image_root=img_path,
+            image_index=image_index,
+            lazy=lazy,
+            cache_size=cache_size,
+            num_workers=num_workers,
+            annotation_paths=[label_path],
+            cache_dir=cache_dir,
+            shard=shard,
+            balance_shards=balance_shards,
+        )
+        self.root = label_path
+
+    @staticmethod
+    def _paths(data_folder: str, train: bool, lang: str) -> tuple:
+        """Return the image folder and the annotation file of a subset."""
         img_path = os.path.join(
             data_folder, f"{lang}.train" if train else f"{lang}.val"
         )
         label_path = os.path.join(
             data_folder, f"{lang}.train.json" if train else f"{lang}.val.json"
         )
-        with open(label_path, "r") as file:
-            data = file.read()
-        # Split the text file into separate JSON strings
-        _targets = []
-        json_data = json.loads(data)
-        for document in json_data["documents"]:
-            file_name = document["img"]["fname"]
-            annotations = document["document"]
-            _targets = [
-                (
-                    BaseUtils.X1X2_to_xywh(annotation["box"]),
-                    annotation["text"],
-                    annotation["label"],
-                )
-                for annotation in annotations
-            ]
-            if _targets:
-                box_targets, text_targets, label_targets = zip(*_targets)
-                ocr_output = {
-                    "bbox": box_targets,
-                    "content": text_targets,
-                    "label": label_targets,
-                }
-                self.data.append(
-                    DocumentEntityClassification(
-                        os.path.join(img_path, file_name), ocr_output
-                    )
-                )
-        self.root = label_path
+        return img_path, label_path
+
+    @classmethod
+    def iter_documents(
+        cls, data_folder: str, train: bool = True, lang: str = "fr"
+    ) -> Iterator[DocumentEntityClassification]:
+        """
+        Stream the documents of a subset while its annotation file is being parsed.
+
+        The "documents" array of the annotation file is parsed incrementally: each document is
+        yielded as soon as its entry is complete, and only one entry is held in memory at a
+        time. Documents without annotations are skipped, as in the eager loader.
+
+        Args:
+            data_folder (str): Folder containing the XFUND images and annotation files.
+            train (bool, optional): Whether to read the training subset. Defaults to True.
+            lang (str, optional): The language of the subset. Defaults to "fr".
+
+        Yields:
+            DocumentEntityClassification: The documents of the subset, in file order.
+        """
+        if not os.path.exists(data_folder):
+            raise FileNotFoundError(f"unable to locate {data_folder}")
+
+        img_path, label_path = cls._paths(data_folder, train, lang)
+        image_index = ImageIndex(img_path, lazy=True)
+        for document in BaseUtils.iter_json_array(label_path, "documents"):
+            parsed = cls._parse_document(document)
+            if not len(parsed["ocr_output"]["bbox"]):
+                continue
+            yield DocumentEntityClassification.from_arrays(
+                os.path.join(img_path, parsed["img_path"]),
+                parsed["ocr_output"]["bbox"],
+                parsed["ocr_output"]["content"],
+                labels=parsed["ocr_output"]["label"],
+                shape=image_index.shape(parsed["img_path"]),
+            )
+
+    @staticmethod
+    def _parse_document(document: dict) -> dict:
+        file_name = document["img"]["fname"]
+        annotations = document["document"]
+        box_targets = BaseUtils.X1X2_to_xywh_batch(
+            [annotation["box"] for annotation in annotations]
+        )
+        text_targets = [annotation["text"] for annotation in annotations]
+        label_targets = [annotation["label"] for annotation in annotations]
+        return {
+            "img_path": file_name,
+            "ocr_output": {
+                "bbox": box_targets,
+                "content": text_targets,
+                "label": label_targets,
+            },
+        }
+
+    @classmethod
+    def _record_weights(cls, context: tuple, records) -> list:
+        return [end - start for start, end in records]
+
+    @classmethod
+    def _parse_records(cls, context: tuple, records) -> list:
+        (label_path,) = context
+        parsed = []
+        with open(label_path, "rb") as file:
+            for start, end in records:
+                file.seek(start)
+                parsed.append(cls._parse_document(json.loads(file.read(end - start))))
+        return parsed
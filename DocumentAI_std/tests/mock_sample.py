@@ -358,6 +358,25 @@ def mock_document_entity_classification():
     return document
 
 
+@pytest.fixture
+def mock_columnar_document_entity_classification():
+    # Dummy data for ocr_output
+    ocr_output = {
+        "bbox": [[10, 20, 30, 40], [50, 60, 70, 80], [90, 100, 110, 120]],
+        "content": ["Text 1", "Text 2", "Text 3"],
+        "label": ["question", "answer", "question"],
+    }
+
+    img_dir = os.path.join("dummy_data", "test")
+    os.makedirs(img_dir, exist_ok=True)
+    img_path = os.path.join(img_dir, "test.jpg")
+    create_dummy_image(img_path)  # Create dummy image at the specified path
+
+    document = DocumentEntityClassification(img_path, ocr_output, columnar=True)
+
+    return document
+
+
 @pytest.fixture
 def mock_paddle():
     mock_invoice()
@@ -2,6 +2,37 @@ from DocumentAI_std.datasets.wildreceipt import Wildreceipt
 from DocumentAI_std.datasets.cord import CORD
 from DocumentAI_std.datasets.funsd import FUNSD
 from DocumentAI_std.datasets.xfund import XFUND
+from DocumentAI_std.datasets.torch_dataset import (
+    DocumentCollator,
+    TorchDocumentDataset,
+)
+import json
+import pickle
+
+import pytest
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader
+
+from DocumentAI_std.base.document_entity_classification import (
+    DocumentEntityClassification,
+)
+
+
+@pytest.fixture
+def wildreceipt_files(tmp_path):
+    img_folder = tmp_path / "images"
+    img_folder.mkdir()
+    lines = []
+    for index in range(3):
+        Image.new("RGB", (20, 10)).save(img_folder / f"{index}.png")
+        annotation = {"box": [0, 0, 4, 0, 4, 3, 0, 3], "text": "a", "label": 1}
+        lines.append(
+            json.dumps({"file_name": f"{index}.png", "annotations": [annotation]})
+        )
+    label_path = tmp_path / "train.txt"
+    label_path.write_text("\n".join(lines))
+    return dict(img_folder=str(img_folder), label_path=str(label_path))
 
 
 class TestDataset:
@@ -54,3 +85,194 @@ class TestDataset:
         )
         assert len(train_set.data) == 149
         assert len(test_set.data) == 50
+
+    def test_lazy_cord_dataset(self):
+        train_set = CORD(
+            train=True,
+            img_folder="/home/bobmarley/.cache/doctr/datasets/cord_train/image",
+            label_path="/home/bobmarley/.cache/doctr/datasets/cord_train/json",
+        )
+        lazy_set = CORD(
+            train=True,
+            img_folder="/home/bobmarley/.cache/doctr/datasets/cord_train/image",
+            label_path="/home/bobmarley/.cache/doctr/datasets/cord_train/json",
+            lazy=True,
+            cache_size=8,
+        )
+        assert len(lazy_set) == 800
+        assert lazy_set[0] is lazy_set[0]
+        assert [document.to_json() for document in lazy_set] == [
+            document.to_json() for document in train_set
+        ]
+
+    def test_replace_dataset_data(self, wildreceipt_files):
+        for lazy in (False, True):
+            dataset = Wildreceipt(**wildreceipt_files, lazy=lazy)
+            dataset.data = dataset.data[:2]
+            assert len(dataset) == 2 and not dataset.lazy
+            assert [document.filename for document in dataset] == ["0.png", "1.png"]
+
+    def test_torch_dataset_pickling(self, wildreceipt_files):
+        dataset = Wildreceipt(**wildreceipt_files)
+        dataset[0].elements[0].content = "b"
+        # Pickling a dataset keeps its documents
+        copy = pickle.loads(pickle.dumps(dataset))
+        assert not copy.lazy and copy[0].contents == ["b"]
+
+        # The adapter ships the lazy view, rebuilt from the annotations
+        torch_dataset = pickle.loads(pickle.dumps(TorchDocumentDataset(dataset)))
+        assert torch_dataset.dataset.lazy and len(torch_dataset) == 3
+        assert torch_dataset[0].contents == ["a"]
+        loader = DataLoader(
+            TorchDocumentDataset(dataset),
+            batch_size=3,
+            num_workers=2,
+            collate_fn=DocumentCollator(),
+        )
+        assert next(iter(loader))["contents"] == [["a"], ["a"], ["a"]]
+
+        dataset.data = dataset.data[:2]
+        with pytest.raises(ValueError):
+            TorchDocumentDataset(dataset)
+        torch_dataset = pickle.loads(
+            pickle.dumps(TorchDocumentDataset(dataset, compact=False))
+        )
+        assert len(torch_dataset) == 2 and torch_dataset[0].contents == ["b"]
+
+    def test_parallel_funsd_dataset(self):
+        train_set = FUNSD(
+            train=True, data_folder="/home/bobmarley/.cache/doctr/datasets/funsd"
+        )
+        parallel_set = FUNSD(
+            train=True,
+            data_folder="/home/bobmarley/.cache/doctr/datasets/funsd",
+            num_workers=4,
+        )
+        assert [document.to_json() for document in parallel_set] == [
+            document.to_json() for document in train_set
+        ]
+
+    def test_cached_wildreceipt_dataset(self, tmp_path):
+        kwargs = dict(
+            train=True,
+            img_folder="/home/bobmarley/PycharmProjects/DocumentAI-std/data/wildreceipt/",
+            label_path="/home/bobmarley/PycharmProjects/DocumentAI-std/data/wildreceipt/train.txt",
+            cache_dir=str(tmp_path),
+        )
+        train_set = Wildreceipt(**kwargs)
+        assert len(list(tmp_path.glob("*.pkl"))) == 1
+
+        cached_set = Wildreceipt(**kwargs)
+        assert len(cached_set.data) == 1267
+        assert [document.to_json() for document in cached_set] == [
+            document.to_json() for document in train_set
+        ]
+        # A lazy dataset only reuses the image index
+        lazy_set = Wildreceipt(lazy=True, **kwargs)
+        assert not lazy_set._image_index.entries
+        document = lazy_set[0]
+        with Image.open(document.img_path) as image:
+            assert document.shape == image.size
+        assert len(list(tmp_path.glob("*.pkl"))) == 1
+
+    def test_rejected_options_have_no_side_effects(self, tmp_path):
+        img_folder = tmp_path / "images"
+        img_folder.mkdir()
+        Image.new("RGB", (20, 10)).save(img_folder / "receipt.png")
+        label_path = tmp_path / "train.txt"
+        label_path.write_text("")
+        cache_dir = tmp_path / "cache"
+
+        for options in (dict(lazy=True, num_workers=2), dict(shard=(4, 4))):
+            with pytest.raises(ValueError):
+                Wildreceipt(
+                    img_folder=str(img_folder),
+                    label_path=str(label_path),
+                    cache_dir=str(cache_dir),
+                    **options,
+                )
+        assert not cache_dir.exists()
+
+    def test_stream_wildreceipt_dataset(self):
+        img_folder = "/home/bobmarley/PycharmProjects/DocumentAI-std/data/wildreceipt/"
+        label_path = (
+            "/home/bobmarley/PycharmProjects/DocumentAI-std/data/wildreceipt/train.txt"
+        )
+        train_set = Wildreceipt(
+            train=True, img_folder=img_folder, label_path=label_path
+        )
+        streamed = list(
+            Wildreceipt.iter_documents(img_folder, label_path, with_offsets=True)
+        )
+        assert [document.to_json() for _, document in streamed] == [
+            document.to_json() for document in train_set
+        ]
+
+        offset = streamed[10][0]
+        resumed = Wildreceipt.iter_documents(img_folder, label_path, offset=offset)
+        assert next(resumed).to_json() == streamed[10][1].to_json()
+
+    def test_stream_xfund_dataset(self):
+        data_folder = "/home/bobmarley/PycharmProjects/direct-neighbor-vrd/data"
+        train_set = XFUND(train=True, data_folder=data_folder)
+        streamed = XFUND.iter_documents(data_folder, train=True)
+        assert [document.to_json() for document in streamed] == [
+            document.to_json() for document in train_set
+        ]
+
+    def test_torch_funsd_dataset(self):
+        train_set = FUNSD(
+            train=True, data_folder="/home/bobmarley/.cache/doctr/datasets/funsd"
+        )
+        label_map = {"other": 0, "header": 1, "question": 2, "answer": 3}
+        loader = DataLoader(
+            TorchDocumentDataset(train_set),
+            batch_size=4,
+            num_workers=2,
+            collate_fn=DocumentCollator(label_map=label_map, with_regions=True),
+        )
+        batch = next(iter(loader))
+        counts = [len(document.elements) for document in train_set.data[:4]]
+        assert batch["bboxes"].shape == (4, max(counts), 4)
+        assert batch["mask"].sum(dim=1).tolist() == counts
+        assert (batch["labels"][~batch["mask"]] == -1).all()
+        assert batch["regions"].shape[:2] == (4, max(counts))
+
+    def test_sharded_wildreceipt_dataset(self):
+        kwargs = dict(
+            train=True,
+            img_folder="/home/bobmarley/PycharmProjects/DocumentAI-std/data/wildreceipt/",
+            label_path="/home/bobmarley/PycharmProjects/DocumentAI-std/data/wildreceipt/train.txt",
+        )
+        for balance_shards in (False, True):
+            shards = [
+                Wildreceipt(shard=(index, 4), balance_shards=balance_shards, **kwargs)
+                for index in range(4)
+            ]
+            assert sum(len(shard) for shard in shards) == 1267
+            filenames = [document.filename for shard in shards for document in shard]
+            assert len(set(filenames)) == len(filenames)
+
+    def test_collate_mixed_channels(self, tmp_path):
+        documents = []
+        for mode, color in (("L", 128), ("RGB", (255, 0, 0)), ("RGBA", (0, 0, 255, 9))):
+            img_path = str(tmp_path / f"{mode}.png")
+            Image.new(mode, (20, 10), color).save(img_path)
+            documents.append(
+                DocumentEntityClassification.from_arrays(
+                    img_path,
+                    [[0, 0, 4, 3], [2, 2, 8, 5]],
+                    ["a", "b"],
+                    labels=["x", "y"],
+                )
+            )
+
+        batch = DocumentCollator(with_regions=True, is_gray=False)(documents)
+        assert batch["regions"].shape == (3, 2, 3, 5, 8)
+        gray, red, blue = batch["regions"][:, 0, :, 0, 0]
+        assert torch.allclose(gray, torch.full((3,), 128 / 255))
+        assert red.tolist() == [1.0, 0.0, 0.0]
+        assert blue.tolist() == [0.0, 0.0, 1.0]
+
+        batch = DocumentCollator(with_regions=True, is_gray=True)(documents)
+        assert batch["regions"].shape == (3, 2, 1, 5, 8)
@@ -1,8 +1,20 @@
+import json
+
+import pandas as pd
+import torch
+
 from DocumentAI_std.base.doc_enum import ContentRelativePosition
+from DocumentAI_std.base.page_cache import PageCache
 from DocumentAI_std.tests.mock_sample import *
 from DocumentAI_std.utils.OCR_adapter import OCRAdapter
+from DocumentAI_std.utils.base_utils import BaseUtils
+from DocumentAI_std.utils.graph_utils import GraphUtils
+from DocumentAI_std.utils.image_index import ImageIndex
 from DocumentAI_std.utils.image_utils import ImageUtils
+from DocumentAI_std.utils.label_matcher import LabelMatcher
 from DocumentAI_std.utils.layout_utils import LayoutUtils
+from DocumentAI_std.utils.line_utils import LineUtils
+from DocumentAI_std.utils.segmentation_utils import SegmentationUtils
 from DocumentAI_std.utils.text_utils import TextUtils
 
 
@@ -93,6 +105,132 @@ class TestDocument:
             e.serialize() for e in mock_document.elements
         ]
 
+    def test_columnar_document(self, mock_columnar_document_entity_classification):
+        document = mock_columnar_document_entity_classification
+        doc_element_class = document.elements[1]
+
+        assert document.is_columnar
+        assert document.bboxes.shape == (3, 4)
+        assert document.bboxes.tolist()[2] == [90, 100, 110, 120]
+        assert document.store.labels.tolist() == [0, 1, 0]
+        assert document.labels == ["question", "answer", "question"]
+        assert isinstance(doc_element_class, DocElementClassification)
+        assert doc_element_class.to_json()["bbox"] == [50, 60, 70, 80]
+        assert doc_element_class.content_type == ContentType.TEXT
+        assert doc_element_class.content == "Text 2"
+        assert doc_element_class.label == "answer"
+
+        # Views write through to the underlying arrays
+        doc_element_class.x = 55
+        doc_element_class.label = "header"
+        assert document.bboxes[1, 0] == 55
+        assert document.labels == ["question", "header", "question"]
+
+    def test_columnar_list_api(self, mock_columnar_document_entity_classification):
+        document = mock_columnar_document_entity_classification
+        elements = document.elements
+        version = elements.version
+
+        elements.append(
+            DocElementClassification(1, 2, 3, 4, ContentType.TEXT, "Text 4", "header")
+        )
+        elements.insert(0, elements[3])
+        del elements[1]
+        elements.remove(elements[-1])
+        assert document.contents == ["Text 4", "Text 2", "Text 3"]
+        assert document.labels == ["header", "answer", "question"]
+        assert document.bboxes.tolist()[0] == [1, 2, 3, 4]
+
+        elements.sort(key=lambda element: -element.x)
+        assert document.contents == ["Text 3", "Text 2", "Text 4"]
+        popped = elements.pop()
+        assert (popped.content, popped.label) == ("Text 4", "header")
+        assert len(elements + [popped]) == 3 and len(elements) == 2
+        assert elements.version > version
+        with pytest.raises(TypeError):
+            elements.append(DocElement(1, 2, 3, 4, ContentType.TEXT, "Text 5"))
+
+    def test_to_columnar(self, mock_document):
+        expected = mock_document.to_json()
+        mock_document.to_columnar()
+
+        assert mock_document.is_columnar
+        assert mock_document.to_json() == expected
+
+    def test_from_arrays(self, mock_document_entity_classification):
+        expected = mock_document_entity_classification
+        bboxes = np.array([[e.x, e.y, e.w, e.h] for e in expected.elements])
+        contents = [e.content for e in expected.elements]
+        labels = [e.label for e in expected.elements]
+
+        document = DocumentEntityClassification.from_arrays(
+            "missing.jpg", bboxes, contents, labels=labels, shape=expected.shape
+        )
+        assert document.shape == expected.shape
+        assert isinstance(document.elements[0], DocElementClassification)
+        assert document.to_json()["bbox_list"] == expected.to_json()["bbox_list"]
+        assert document.to_json()["label"] == expected.to_json()["label"]
+
+        columnar = DocumentEntityClassification.from_arrays(
+            "missing.jpg",
+            bboxes,
+            contents,
+            labels=labels,
+            shape=(200, 200),
+            columnar=True,
+        )
+        assert columnar.store.bboxes is bboxes
+        assert columnar.labels == labels
+
+    def test_extract_regions(self, mock_document):
+        padded = mock_document.extract_regions()
+        packed = mock_document.extract_regions(indices=[2, 0], packed=True)
+
+        assert padded["pixels"].shape == (3, 1, 120, 110)
+        assert padded["mask"].shape == (3, 120, 110)
+        for i, element in enumerate(mock_document.elements):
+            expected = element.extract_pixels()
+            _, h, w = expected.shape
+            assert torch.equal(padded["pixels"][i, :, :h, :w], expected)
+            assert padded["mask"][i].sum() == h * w
+
+        assert packed["shapes"].tolist() == [[1, 120, 110], [1, 40, 30]]
+        assert packed["offsets"].tolist() == [0, 120 * 110]
+        start = packed["offsets"][1]
+        assert torch.equal(
+            packed["pixels"][start : start + 40 * 30].view(1, 40, 30),
+            mock_document.elements[0].extract_pixels(),
+        )
+
+    def test_spatial_index(self, mock_document):
+        assert mock_document.elements_in_region(0, 0, 45, 45).tolist() == [0]
+        assert mock_document.elements_in_region(40, 60, 60, 40).tolist() == [0, 1, 2]
+        assert mock_document.elements_at(100, 110).tolist() == [1, 2]
+        assert mock_document.elements_at(0, 0).tolist() == []
+        assert mock_document.nearest_elements(0, 0, k=2).tolist() == [0, 1]
+        indices, distances = mock_document.spatial_index.nearest(300, 300, k=5)
+        assert indices.tolist() == [2, 1, 0]
+        assert distances[0] == np.hypot(100, 80)
+
+        # The index follows the elements
+        mock_document.elements = mock_document.elements[1:]
+        assert mock_document.elements_at(100, 110).tolist() == [0, 1]
+        mock_document.elements[0].x = 500
+        mock_document.invalidate_spatial_index()
+        assert mock_document.elements_at(100, 110).tolist() == [1]
+        mock_document.elements[1] = DocElement(0, 0, 5, 5, ContentType.TEXT, "")
+        assert mock_document.elements_at(100, 110).tolist() == []
+
+        columnar = Document.from_arrays(
+            mock_document.img_path,
+            [[10, 20, 30, 40], [50, 60, 70, 80]],
+            ["a", "b"],
+            columnar=True,
+        )
+        assert columnar.elements_at(60, 70).tolist() == [1]
+        columnar.elements[1].x = 500
+        assert columnar.elements_at(60, 70).tolist() == []
+
     def test_paddle_adapter(self, mock_paddle):
         output_json = OCRAdapter.from_paddle_ocr(mock_paddle)
 
@@ -180,6 +318,163 @@ class TestUtils:
         assert manhattan_dist == expected_manhattan, f"Manhattan distance is incorrect"
         assert chebyshev_dist == expected_chebyshev, f"Chebyshev distance is incorrect"
 
+    def test_distance_matrix(self, mock_document):
+        elements = mock_document.elements
+        for metric, scalar in [
+            ("euclidean", LayoutUtils.euclidean_distance),
+            ("manhattan", LayoutUtils.manhattan_distance),
+            ("chebyshev", LayoutUtils.chebyshev_distance),
+        ]:
+            matrix = LayoutUtils.distance_matrix(mock_document, metric=metric)
+            expected = [[scalar(a, b) for b in elements] for a in elements]
+            assert matrix.tolist() == expected
+            blocked = LayoutUtils.distance_matrix(
+                mock_document, metric=metric, block_size=2, as_tensor=True
+            )
+            assert torch.equal(blocked, torch.from_numpy(matrix))
+
+        center = LayoutUtils.distance_matrix(elements, "manhattan", "center")
+        assert center[0, 1] == abs(25 - 85) + abs(40 - 100)
+        edge = LayoutUtils.distance_matrix(elements, "euclidean", "edge")
+        assert edge[0, 1] == np.hypot(10, 0)
+        assert edge[1, 2] == 0
+        blocks = list(LayoutUtils.iter_distance_blocks(elements, block_size=2))
+        assert [start for start, _ in blocks] == [0, 2]
+        assert np.array_equal(
+            np.concatenate([block for _, block in blocks]),
+            LayoutUtils.distance_matrix(elements),
+        )
+        with pytest.raises(ValueError):
+            LayoutUtils.distance_matrix(elements, metric="cosine")
+
+    def test_knn_graph(self, mock_document):
+        bboxes = np.random.default_rng(0).uniform(0, 500, size=(300, 4))
+        neighbors, distances = GraphUtils.knn(GraphUtils.centers(bboxes), k=5)
+        matrix = LayoutUtils.distance_matrix(bboxes, reference="center")
+        np.fill_diagonal(matrix, np.inf)
+        expected = np.argsort(matrix, axis=1, kind="stable")[:, :5]
+        assert np.array_equal(neighbors, expected)
+        assert np.array_equal(distances, np.take_along_axis(matrix, expected, axis=1))
+
+        graph = GraphUtils.knn_graph(mock_document, k=5)
+        assert graph["edge_index"].tolist() == [[1, 2, 0, 2, 1, 0], [0, 0, 1, 1, 2, 2]]
+        elements = mock_document.elements
+        for (neighbor, element), attr in zip(
+            graph["edge_index"].T.tolist(), graph["edge_attr"]
+        ):
+            expected_angle = LayoutUtils.angle_inter_element(
+                elements[element], elements[neighbor]
+            )
+            assert attr[1].item() == pytest.approx(expected_angle, abs=1e-6)
+
+        batch = GraphUtils.knn_graph_batch([mock_document, mock_document], k=1)
+        assert batch["edge_index"].tolist() == [[1, 0, 1, 4, 3, 4], [0, 1, 2, 3, 4, 5]]
+        assert batch["batch"].tolist() == [0, 0, 0, 1, 1, 1]
+        assert batch["ptr"].tolist() == [0, 3, 6]
+
+    def test_directional_neighbors(self, mock_document):
+        neighbors, gaps = GraphUtils.directional_neighbors(mock_document)
+        assert neighbors["right"].tolist() == [-1, 2, -1]
+        assert neighbors["left"].tolist() == [-1, -1, 1]
+        assert neighbors["below"].tolist() == [-1, 2, -1]
+        assert neighbors["above"].tolist() == [-1, -1, 1]
+        assert gaps["right"].tolist() == [np.inf, 0, np.inf]
+
+        # Compare with a brute force search on random boxes
+        bboxes = np.random.default_rng(0).integers(0, 200, size=(200, 4)).astype(float)
+        neighbors, gaps = GraphUtils.directional_neighbors(bboxes, max_gap=40)
+        x0, y0 = bboxes[:, 0], bboxes[:, 1]
+        x1, y1 = x0 + bboxes[:, 2], y0 + bboxes[:, 3]
+        for i in range(len(bboxes)):
+            rows = np.minimum(y1, y1[i]) > np.maximum(y0, y0[i])
+            columns = np.minimum(x1, x1[i]) > np.maximum(x0, x0[i])
+            for direction, candidates, key, gap in [
+                ("right", rows & (x0 > x0[i]), x0, x0 - x1[i]),
+                ("left", rows & (x0 < x0[i]), -x1, x0[i] - x1),
+                ("below", columns & (y0 > y0[i]), y0, y0 - y1[i]),
+                ("above", columns & (y0 < y0[i]), -y1, y0[i] - y1),
+            ]:
+                expected = -1
+                indices = np.flatnonzero(candidates)
+                if len(indices):
+                    expected = indices[np.lexsort((indices, key[indices]))[0]]
+                    if max(gap[expected], 0) > 40:
+                        expected = -1
+                assert neighbors[direction][i] == expected
+
+    def test_pair_features(self, mock_document):
+        elements = mock_document.elements
+        width, height = mock_document.shape
+        features = GraphUtils.pair_features(mock_document, dtype=torch.float64)
+        assert features.shape == (3, 3, len(GraphUtils.PAIR_FEATURES))
+        assert features[0, 1, 0].item() == pytest.approx(
+            LayoutUtils.angle_inter_element(elements[0], elements[1])
+        )
+        assert features[0, 1, 1:].tolist() == [60, 60, 60 / width, 60 / height]
+
+        graph = GraphUtils.knn_graph(mock_document, k=2)
+        edges = GraphUtils.pair_features(
+            mock_document, graph["edge_index"], dtype=torch.float16
+        )
+        assert edges.dtype == torch.float16
+        neighbors, nodes = graph["edge_index"]
+        assert torch.equal(edges, features[nodes, neighbors].half())
+        assert torch.allclose(edges[:, 0].float(), graph["edge_attr"][:, 1], atol=1e-3)
+        with pytest.raises(ValueError):
+            GraphUtils.pair_features(mock_document.bboxes)
+
+        bboxes = torch.zeros((2, 3, 4))
+        bboxes[0] = torch.from_numpy(mock_document.bboxes)
+        bboxes[1, :2] = bboxes[0, :2]
+        mask = torch.tensor([[True, True, True], [True, True, False]])
+        shapes = torch.tensor([mock_document.shape, mock_document.shape])
+        batch = GraphUtils.pair_features_batch(bboxes, shapes, mask)
+        assert torch.allclose(batch[0], features.float())
+        assert torch.allclose(batch[1, :2, :2], features[:2, :2].float())
+        assert not batch[1, 2].any() and not batch[1, :, 2].any()
+
+    def test_reading_order(self):
+        # Two lines of words, the second slightly skewed, given out of order
+        bboxes = [
+            [60, 52, 30, 12],
+            [10, 10, 40, 12],
+            [55, 12, 20, 11],
+            [10, 50, 45, 12],
+            [80, 9, 30, 12],
+        ]
+        contents = ["d", "a", "b", "c", "e"]
+        labels = ["total", "header", "header", "total", "question"]
+        document = DocumentEntityClassification.from_arrays(
+            "missing.jpg", bboxes, contents, labels=labels, shape=(200, 200)
+        )
+
+        lines, order = LineUtils.reading_order(document)
+        assert lines.tolist() == [1, 0, 0, 1, 0]
+        assert [contents[i] for i in order] == ["a", "b", "e", "c", "d"]
+
+        merged = LineUtils.merge_lines(document)
+        assert merged.contents == ["a b e", "c d"]
+        assert merged.bboxes.tolist() == [[10, 9, 100, 14], [10, 50, 80, 14]]
+        assert merged.labels == ["header", "total"]
+
+    def test_xy_cut(self):
+        # A header above two columns of three lines, the lines of both columns interleaved
+        bboxes = [[10, 10, 180, 10]]
+        for y in (40, 60, 80):
+            bboxes += [[10, y, 80, 10], [110, y, 80, 10]]
+
+        tree = SegmentationUtils.xy_cut(bboxes, min_gap_y=15)
+        assert tree["bbox"] == [10, 10, 180, 80]
+        assert tree["axis"] == "y"
+        assert [child["axis"] for child in tree["children"]] == [None, "x"]
+        leaves = SegmentationUtils.leaves(tree)
+        assert [leaf.tolist() for leaf in leaves] == [[0], [1, 3, 5], [2, 4, 6]]
+
+        # With the default gaps, the rows are cut before the columns
+        leaves = SegmentationUtils.leaves(SegmentationUtils.xy_cut(bboxes))
+        assert [leaf.tolist() for leaf in leaves] == [[0], [1], [2], [3], [4], [5], [6]]
+        assert SegmentationUtils.xy_cut(bboxes, max_depth=0)["children"] == []
+
     @pytest.mark.parametrize("a, b, expected_overlap", mock_overlap())
     def test_overlap_calculation(self, a, b, expected_overlap):
         # Compute overlap
@@ -188,6 +483,84 @@ class TestUtils:
         # Check if the computed overlap matches the expected overlap
         assert overlap == expected_overlap
 
+    def test_overlap_pairs(self):
+        bboxes = np.random.default_rng(0).integers(0, 100, size=(150, 4))
+        elements = [DocElement(*bbox, ContentType.TEXT, "") for bbox in bboxes.tolist()]
+        pairs = LayoutUtils.overlap_pairs(elements, with_iou=True)
+        expected = {
+            (i, j): LayoutUtils.calculate_overlap(elements[i], elements[j])
+            for i in range(len(elements))
+            for j in range(i + 1, len(elements))
+        }
+        expected = {pair: value for pair, value in expected.items() if value > 0}
+        found = zip(pairs["row"].tolist(), pairs["col"].tolist(), pairs["overlap"])
+        assert {(i, j): value for i, j, value in found} == expected
+        assert np.all((pairs["iou"] > 0) & (pairs["iou"] <= pairs["overlap"]))
+
+        matrix = LayoutUtils.overlap_matrix(elements, min_overlap=0.5).to_dense()
+        assert torch.equal(matrix, matrix.T)
+        assert (matrix > 0).sum() == 2 * sum(v >= 0.5 for v in expected.values())
+
+    def test_alignment_codes(self, mock_document):
+        codes = LayoutUtils.relative_position_codes(mock_document)
+        assert codes.dtype == np.int8
+        assert codes.tolist() == [
+            LayoutUtils.relative_position(e, mock_document).value
+            for e in mock_document.elements
+        ]
+
+        # Small integer boxes so that equal and adjacent edges occur
+        bboxes = np.random.default_rng(0).integers(0, 6, size=(60, 4))
+        elements = [DocElement(*bbox, ContentType.TEXT, "") for bbox in bboxes.tolist()]
+        horizontal = LayoutUtils.horizontal_alignment_codes(elements)
+        vertical = LayoutUtils.vertical_alignment_codes(bboxes)
+        for i, a in enumerate(elements):
+            for j, b in enumerate(elements):
+                assert (
+                    horizontal[i, j]
+                    == LayoutUtils.calculate_horizontal_alignment(a, b).value
+                )
+                assert (
+                    vertical[i, j]
+                    == LayoutUtils.calculate_vertical_alignment(a, b).value
+                )
+
+    def test_deduplicate(self):
+        # A suppressed box does not suppress the boxes it overlaps
+        keep, suppressed_by = LayoutUtils.nms(
+            [[0, 0, 10, 10], [3, 0, 10, 10], [6, 0, 10, 10]], threshold=0.5
+        )
+        assert keep.tolist() == [0, 2]
+        assert suppressed_by.tolist() == [-1, 0, -1]
+
+        bboxes = [
+            [0, 0, 10, 10],
+            [1, 0, 10, 10],
+            [50, 50, 10, 10],
+            [52, 50, 12, 10],
+            [100, 100, 5, 5],
+        ]
+        contents = ["Hello", "Hello", "12", "12.5", "x"]
+        labels = ["question", "answer", "other", "answer", "other"]
+        document = DocumentEntityClassification.from_arrays(
+            "missing.jpg", bboxes, contents, labels=labels, shape=(200, 200)
+        )
+
+        clean = LayoutUtils.deduplicate(document)
+        assert clean.contents == ["Hello", "12 12.5", "x"]
+        assert clean.bboxes.tolist() == [bboxes[0], bboxes[3], bboxes[4]]
+        assert clean.labels == ["question", "answer", "other"]
+        assert LayoutUtils.deduplicate(document, merge="longest").contents == [
+            "Hello",
+            "12.5",
+            "x",
+        ]
+        merged = LayoutUtils.deduplicate(document, merge="keep", merge_boxes=True)
+        assert merged.bboxes.tolist()[:2] == [[0, 0, 11, 10], [50, 50, 14, 10]]
+        assert LayoutUtils.deduplicate(document, threshold=0.9).contents == contents
+        with pytest.raises(ValueError):
+            LayoutUtils.deduplicate(document, merge="vote")
+
     @pytest.mark.parametrize("a, b, expected_alignment", mock_horizontal_alignment())
     def test_horizontal_alignment(self, a, b, expected_alignment):
         # Compute horizontal alignment
@@ -212,6 +585,171 @@ class TestUtils:
         # Check if the calculated entropy matches the expected value
         assert pytest.approx(entropy, abs=1e-6) == expected_entropy
 
+    def test_page_cache(self, mock_document):
+        PageCache.clear()
+        for element in mock_document.elements:
+            element.extract_pixels()
+        stats = PageCache.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == len(mock_document.elements) - 1
+        assert stats["bytes"] == 200 * 200
+
+        PageCache.set_max_bytes(0)
+        assert PageCache.stats()["pages"] == 0
+        PageCache.set_max_bytes(256 * 1024 * 1024)
+        PageCache.clear()
+        assert PageCache.stats()["hits"] == 0
+
+    def test_image_index(self, mock_document, tmp_path):
+        img_dir = os.path.join("dummy_data", "test")
+        listing = sorted(os.listdir(img_dir))
+        index = ImageIndex(img_dir, cache_dir=str(tmp_path))
+
+        assert "test.jpg" in index
+        assert index.shape("test.jpg") == (200, 200)
+        # Writing the sidecar is opt-in, and never goes into the image folder
+        assert not os.path.exists(index.sidecar_path)
+        index = ImageIndex(img_dir, persist=True, cache_dir=str(tmp_path))
+        assert os.path.exists(index.sidecar_path)
+        assert os.path.dirname(index.sidecar_path) == str(tmp_path)
+        assert sorted(os.listdir(img_dir)) == listing
+
+        # A known shape skips opening the image
+        document = Document(
+            os.path.join(img_dir, "test.jpg"),
+            {"bbox": [], "content": []},
+            shape=index.shape("test.jpg"),
+        )
+        assert document.shape == (200, 200)
+
+        reloaded = ImageIndex(img_dir, cache_dir=str(tmp_path))
+        assert reloaded.entries == index.entries
+        with pytest.raises(FileNotFoundError):
+            reloaded.shape("missing.jpg")
+
+        # A lazy index lists the files and reads the headers on access
+        lazy_dir = str(tmp_path / "lazy")
+        lazy_index = ImageIndex(img_dir, persist=True, cache_dir=lazy_dir, lazy=True)
+        assert lazy_index.files == index.files and not lazy_index.entries
+        assert lazy_index.shape("test.jpg") == (200, 200)
+        lazy_index.save()
+        reloaded = ImageIndex(img_dir, cache_dir=lazy_dir, lazy=True)
+        assert reloaded.shape("test.jpg") == (200, 200)
+        assert reloaded.entries["test.jpg"] == index.entries["test.jpg"]
+        with pytest.raises(FileNotFoundError):
+            reloaded.shape("missing.jpg")
+
+    def test_batch_coordinate_conversions(self):
+        quads = np.random.default_rng(0).integers(0, 500, size=(50, 8))
+        assert BaseUtils.X1X2X3X4_to_xywh_batch(quads).tolist() == [
+            BaseUtils.X1X2X3X4_to_xywh(quad) for quad in quads.tolist()
+        ]
+        assert BaseUtils.X1X2_to_xywh_batch(quads[:, :4]).tolist() == [
+            BaseUtils.X1X2_to_xywh(box) for box in quads[:, :4].tolist()
+        ]
+        assert BaseUtils.X1X2_to_xywh_batch([]).shape == (0, 4)
+        assert (
+            BaseUtils.X1X2X3X4_to_xywh_batch(quads.reshape(-1, 4, 2)).tolist()
+            == BaseUtils.X1X2X3X4_to_xywh_batch(quads).tolist()
+        )
+        with pytest.raises(ValueError):
+            BaseUtils.X1X2_to_xywh_batch(quads)
+        with pytest.raises(ValueError):
+            BaseUtils.X1X2X3X4_to_xywh_batch(quads[:, :4])
+
+        # Classic PaddleOCR output: one (quadrilateral, (text, score)) pair per line
+        quad = [[10, 20], [40, 22], [41, 60], [9, 58]]
+        output = OCRAdapter.from_paddle_ocr([[(quad, ("TOTAL", 0.9))]])
+        assert output == {"bbox": [[9, 20, 32, 40]], "content": ["TOTAL"]}
+
+    def test_read_bbox_and_words_folder(self, tmp_path):
+        (tmp_path / "a.txt").write_text(
+            "1,2,3,4,5,6,7,8,TOTAL\n\n10,20,30,20,30,40,10,40,12,50 RM\n"
+        )
+        (tmp_path / "b.txt").write_text("5,5,9,5,9,9,5,9,ABC, SDN BHD\n")
+
+        words = BaseUtils.read_bbox_and_words_folder(tmp_path, num_workers=2)
+        assert words["filename"].tolist() == ["a", "a", "b"]
+        assert words["line"].tolist() == ["TOTAL", "12,50 RM", "ABC, SDN BHD"]
+        assert words[["x0", "y0", "x2", "y2"]].values.tolist()[1] == [10, 20, 30, 40]
+        assert (
+            words[words["filename"] == "a"]
+            .reset_index(drop=True)
+            .equals(BaseUtils.read_bbox_and_words(tmp_path / "a.txt"))
+        )
+
+    def test_label_matcher(self):
+        entities = pd.DataFrame(
+            [
+                {
+                    "company": "KEDAI MAKANAN SDN BHD",
+                    "date": "01/02/2018",
+                    "address": "NO 3, JALAN TAMAN MELATI",
+                    "total": "12.50",
+                }
+            ]
+        )
+        words = pd.DataFrame(
+            {
+                "filename": "X001",
+                "x0": [0, 0, 0, 0, 0],
+                "y0": [0, 10, 20, 30, 40],
+                "x2": [90, 90, 60, 40, 80],
+                "y2": [8, 18, 28, 38, 48],
+                "line": [
+                    "KEDAI MAKANAN SDN. BHD.",
+                    "NO 3 JALAN TAMAN",
+                    "DATE: 01/02/2018",
+                    "TOTAL 12.50",
+                    "12.50",
+                ],
+            }
+        )
+        matcher = LabelMatcher(entities)
+        assert matcher.line_label("TOTAL 12.50") == "TOTAL"
+        assert matcher.line_label("THANK YOU") == "O"
+
+        expected = ["COMPANY", "ADDRESS", "DATE", "O", "TOTAL"]
+        assert matcher.assign_labels(words.copy())["label"].tolist() == expected
+        labeled = LabelMatcher.assign_labels_by_file(
+            words, {"X001": entities}, num_workers=2
+        )
+        assert labeled["label"].tolist() == expected
+
+        # Files interleaved under a non-unique index keep their row order
+        both = pd.concat([words, words.assign(filename="X002")]).iloc[
+            [0, 5, 1, 6, 2, 7, 3, 8, 4, 9]
+        ]
+        labeled = LabelMatcher.assign_labels_by_file(
+            both, {"X001": entities, "X002": entities}
+        )
+        assert labeled.index.tolist() == both.index.tolist()
+        assert labeled["filename"].tolist() == both["filename"].tolist()
+        assert labeled["label"].tolist() == [label for label in expected for _ in "ab"]
+
+    def test_iter_json_array(self, tmp_path):
+        documents = [{"id": i, "text": 'é"}]' * i, "box": [i, 2.5e3]} for i in range(5)]
+        path = tmp_path / "documents.json"
+        path.write_text(
+            json.dumps({"lang": "fr", "documents": documents}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+
+        spans = list(
+            BaseUtils.iter_json_array(path, "documents", with_spans=True, chunk_size=7)
+        )
+        assert [document for _, document in spans] == documents
+        raw = path.read_bytes()
+        for (start, end), document in spans:
+            assert json.loads(raw[start:end]) == document
+        assert list(
+            BaseUtils.iter_json_array_spans(path, "documents", chunk_size=7)
+        ) == [span for span, _ in spans]
+        with pytest.raises(KeyError):
+            list(BaseUtils.iter_json_array(path, "missing"))
+        with pytest.raises(KeyError):
+            list(BaseUtils.iter_json_array_spans(path, "missing"))
+
     @pytest.mark.parametrize("ocr_method, lang_list, source", mock_ocr())
     def test_ocr(self, ocr_method, lang_list, source):
         ocr = OCRAdapter(ocr_method, lang_list)
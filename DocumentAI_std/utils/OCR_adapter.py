@@ -184,30 +184,31 @@ class OCRAdapter:
         Returns:
             dict: Dictionary containing standardized OCR output with 'bbox' and 'content' keys.
         """
-        bbox_content_pairs = []
+        bbox, content = [], []
 
         for output in paddle_ocr_output:
             if isinstance(output, dict):
                 # Handle mock dictionary with 'rec_boxes' and 'rec_res'
                 rec_boxes = output.get("rec_boxes", [])
                 rec_res = output.get("rec_res", [["", 0.0]] * len(rec_boxes))
-                for box, res in zip(rec_boxes, rec_res):
-                    bbox_content_pairs.append((BaseUtils.X1X2_to_xywh(box), res[0]))
+                pairs = list(zip(rec_boxes, rec_res))
+                # Convert the x1,y1,x2,y2 boxes of the page at once
+                bbox.extend(
+                    BaseUtils.X1X2_to_xywh_batch([box for box, _ in pairs]).tolist()
+                )
             elif isinstance(output, list):
-                # Handle real PaddleOCR output (list of tuples)
-                for box, res in output:
-                    bbox_content_pairs.append((BaseUtils.X1X2_to_xywh(box), res[0]))
+                # Handle real PaddleOCR output (list of (quadrilateral, (text, score)) pairs)
+                pairs = [(box, res) for box, res in output]
+                bbox.extend(
+                    BaseUtils.X1X2X3X4_to_xywh_batch([box for box, _ in pairs]).tolist()
+                )
             else:
                 raise TypeError(
                     f"Unsupported paddle_ocr_output element: {type(output)}"
                 )
+            content.extend(res[0] for _, res in pairs)
 
-        if bbox_content_pairs:
-            bbox, content = zip(*bbox_content_pairs)
-        else:
-            bbox, content = [], []
-
-        return {"bbox": list(bbox), "content": list(content)}
+        return {"bbox": bbox, "content": content}
 
     @staticmethod
     def from_easy_ocr(easy_ocr_output):
@@ -220,17 +221,18 @@ class OCRAdapter:
         Returns:
             dict: Dictionary containing standardized OCR output with 'bbox' and 'content' keys.
         """
-        bbox_content_pairs = [
-            (
-                list(map(int, BaseUtils.X1X2X3X4_to_xywh(sum(text_box[0], [])))),
-                text_box[1],
-            )
-            for text_box in easy_ocr_output
-        ]
+        content = [text_box[1] for text_box in easy_ocr_output]
 
-        bbox, content = zip(*bbox_content_pairs)
+        # Convert the quadrilaterals of the whole page at once
+        bbox = (
+            BaseUtils.X1X2X3X4_to_xywh_batch(
+                [text_box[0] for text_box in easy_ocr_output]
+            )
+            .astype(np.int64)
+            .tolist()
+        )
 
-        return {"bbox": list(bbox), "content": list(content)}
+        return {"bbox": bbox, "content": content}
 
     @staticmethod
     def from_tesseract_ocr(tesseract_ocr_output):
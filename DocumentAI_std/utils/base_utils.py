@@ -1,10 +1,184 @@
 import json
-from difflib import SequenceMatcher
+import math
+import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+from DocumentAI_std.utils.label_matcher import LabelMatcher
+
+_JSON_DECODER = json.JSONDecoder()
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_JSON_WHITESPACE_BYTES = b" \t\n\r"
+_JSON_SIGNIFICANT = re.compile(rb"[^ \t\n\r]")
+# The bytes scanned to find the entries of an array, and their effect on the nesting depth
+_JSON_SYNTAX = np.zeros(256, dtype=bool)
+_JSON_SYNTAX[list(b'"\\,[]{}')] = True
+_JSON_DEPTH = np.zeros(256, dtype=np.int64)
+_JSON_DEPTH[list(b"[{")] = 1
+_JSON_DEPTH[list(b"]}")] = -1
+
+
+class _JSONReader:
+    """
+    Sequential reader of the JSON values of a text file, holding only a bounded buffer.
+
+    Values are decoded with the C decoder of the `json` module; when a value is truncated
+    by the end of the buffer, the buffer grows until the value is complete. The byte offset
+    of the reading position is tracked so that the span of each value can be reported.
+    """
+
+    def __init__(self, file, chunk_size: int) -> None:
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.offset = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """Drop the consumed part of the buffer and read more data, returning False at EOF."""
+        self.buffer = self.buffer[self.pos :]
+        self.pos = 0
+        # Reading at least the buffer size doubles it, so large values are decoded few times
+        chunk = self.file.read(max(self.chunk_size, len(self.buffer)))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    def _advance(self, pos: int) -> None:
+        self.offset += len(self.buffer[self.pos : pos].encode("utf-8"))
+        self.pos = pos
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character, or "" at the end of the file."""
+        while True:
+            self._advance(_JSON_WHITESPACE.match(self.buffer, self.pos).end())
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        """Consume the next character, which must be one of `chars`."""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(
+                f"Expected one of {chars!r} at byte {self.offset}, found {char!r}."
+            )
+        self._advance(self.pos + 1)
+        return char
+
+    def decode(self):
+        """Decode the next value, returning it with its start and end byte offsets."""
+        self.peek()
+        while True:
+            try:
+                value, end = _JSON_DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number cut by the end of the buffer decodes as a shorter number
+            if (
+                not self.eof
+                and isinstance(value, (int, float))
+                and self.buffer[end : end + 1] in ("", ".", "e", "E", "+", "-")
+                and self._fill()
+            ):
+                continue
+            start = self.offset
+            self._advance(end)
+            return value, start, self.offset
+
+
+def _iter_array_spans(file, chunk_size: int):
+    """
+    Yield the (start, end) byte spans of the entries of a JSON array without decoding them.
+
+    The binary file must be positioned at the first entry of the array. Each chunk is scanned
+    with NumPy: the quotes that are not escaped by an odd run of backslashes delimit the
+    strings, the brackets outside the strings give the nesting depth, and the entries end at
+    the commas of depth 0 and at the closing bracket of the array. The entries themselves
+    are neither decoded nor validated.
+    """
+    base = file.tell()
+    depth = 0
+    in_string = False
+    escaped = False  # Whether the first byte of the next chunk is escaped
+    start = end = None  # Bounds of the current entry, once known
+    while True:
+        data = file.read(chunk_size)
+        if not data:
+            raise ValueError(f"Unterminated array at byte {base}.")
+        chunk = np.frombuffer(data, dtype=np.uint8)
+        positions = np.flatnonzero(_JSON_SYNTAX[chunk])
+        codes = chunk[positions]
+
+        # A byte is escaped when it follows an odd run of backslashes
+        escapes = np.zeros(0, dtype=np.int64)
+        backslashes = positions[codes == 92]
+        if len(backslashes):
+            run_starts = np.flatnonzero(np.diff(backslashes, prepend=-2) != 1)
+            run_lengths = np.diff(run_starts, append=len(backslashes))
+            escaping = run_lengths % 2 == 1
+            if escaped and backslashes[0] == 0:
+                # The first run starts with an escaped backslash
+                escaping[0] = not escaping[0]
+            escapes = (backslashes[run_starts] + run_lengths)[escaping]
+        if escaped and chunk[0] != 92:
+            escapes = np.r_[0, escapes]
+        escaped = bool(len(escapes)) and bool(escapes[-1] == len(chunk))
+
+        quotes = codes == 34
+        if len(escapes):
+            quotes &= ~np.isin(positions, escapes)
+        outside = (np.cumsum(quotes) + in_string) % 2 == 0
+        if len(outside):
+            in_string = not outside[-1]
+        depths = depth + np.cumsum(np.where(outside, _JSON_DEPTH[codes], 0))
+        if len(depths):
+            depth = int(depths[-1])
+
+        # Commas between the entries and the closing bracket of the array
+        separators = positions[
+            outside & (((codes == 44) & (depths == 0)) | (depths == -1))
+        ]
+        previous = -1
+        for separator in separators.tolist():
+            if start is None:
+                found = _JSON_SIGNIFICANT.search(data, previous + 1, separator)
+                if found is None:
+                    raise ValueError(f"Expected a value at byte {base + separator}.")
+                start = base + found.start()
+            stop = separator
+            while stop > previous + 1 and data[stop - 1] in _JSON_WHITESPACE_BYTES:
+                stop -= 1
+            if stop > previous + 1:
+                end = base + stop
+            yield start, end
+            if data[separator] == 93:
+                return
+            start = end = None
+            previous = separator
+
+        # The current entry goes on in the next chunk
+        if start is None:
+            found = _JSON_SIGNIFICANT.search(data, previous + 1)
+            if found is not None:
+                start = base + found.start()
+        if start is not None:
+            stop = len(data)
+            while stop > previous + 1 and data[stop - 1] in _JSON_WHITESPACE_BYTES:
+                stop -= 1
+            if stop > previous + 1:
+                end = base + stop
+        base += len(data)
+
 
 class BaseUtils:
     @staticmethod
@@ -34,40 +208,260 @@ class BaseUtils:
         return [min_x, min_y, w, h]
 
     @staticmethod
-    def read_bbox_and_words(path: Path):
-        bbox_and_words_list = []
+    def X1X2_to_xywh_batch(bboxes) -> np.ndarray:
+        """
+        Convert bounding boxes from x1,y1,x2,y2 format to x,y,w,h format in one operation.
+
+        Args:
+            bboxes (np.ndarray or List[List]): The boxes, of shape (N, 4).
 
+        Returns:
+            np.ndarray: The converted boxes, of shape (N, 4), with the dtype of the input.
+
+        Raises:
+            ValueError: If the boxes are not of shape (N, 4).
+
+        Example:
+        >>> BaseUtils.X1X2_to_xywh_batch([[10, 20, 40, 60], [0, 0, 5, 5]])
+        array([[10, 20, 30, 40],
+               [ 0,  0,  5,  5]])
+        """
+        boxes = np.asarray(bboxes)
+        if boxes.size == 0:
+            return np.zeros((0, 4), dtype=np.int64)
+        if boxes.ndim != 2 or boxes.shape[1] != 4:
+            raise ValueError(f"Expected boxes of shape (N, 4), received {boxes.shape}.")
+        return np.concatenate([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]], axis=1)
+
+    @staticmethod
+    def X1X2X3X4_to_xywh_batch(bboxes) -> np.ndarray:
+        """
+        Convert quadrilaterals from x1,y1,x2,y2,x3,y3,x4,y4 format to their enclosing x,y,w,h boxes
+        in one operation.
+
+        Args:
+            bboxes (np.ndarray or List[List]): The quadrilaterals, of shape (N, 8) or (N, 4, 2).
+
+        Returns:
+            np.ndarray: The enclosing boxes, of shape (N, 4), with the dtype of the input.
+
+        Raises:
+            ValueError: If the quadrilaterals are not of shape (N, 8) or (N, 4, 2).
+
+        Example:
+        >>> BaseUtils.X1X2X3X4_to_xywh_batch([[10, 20, 40, 22, 41, 60, 9, 58]])
+        array([[ 9, 20, 32, 40]])
+        """
+        points = np.asarray(bboxes)
+        if points.size == 0:
+            return np.zeros((0, 4), dtype=np.int64)
+        if points.ndim == 2 and points.shape[1] == 8:
+            points = points.reshape(-1, 4, 2)
+        elif points.ndim != 3 or points.shape[1:] != (4, 2):
+            raise ValueError(
+                f"Expected quadrilaterals of shape (N, 8) or (N, 4, 2), received {points.shape}."
+            )
+        mins = points.min(axis=1)
+        return np.concatenate([mins, points.max(axis=1) - mins], axis=1)
+
+    @staticmethod
+    def iter_json_array(path, key: str, with_spans: bool = False, chunk_size=65536):
+        """
+        Incrementally iterate over the array stored under a key of a JSON object file.
+
+        The file is read in chunks and each entry of the array is decoded and yielded as soon
+        as it is complete, so memory stays proportional to the largest entry instead of the
+        whole file. The other keys of the object are decoded and discarded.
+
+        Args:
+            path (str or Path): The path to a UTF-8 JSON file holding an object at the top level.
+            key (str): The top-level key of the array.
+            with_spans (bool, optional): Whether to also yield the (start, end) byte span of each
+                entry in the file. Defaults to False.
+            chunk_size (int, optional): The number of characters read at a time. Defaults to 65536.
+
+        Yields:
+            The entries of the array, or ((start, end), entry) pairs if `with_spans` is True.
+
+        Raises:
+            KeyError: If the object has no such key.
+            ValueError: If the file is not a JSON object or the value of the key is not an array.
+
+        Example:
+        >>> for document in BaseUtils.iter_json_array("fr.train.json", "documents"):
+        ...     print(document["id"])
+        """
+        for span, value in BaseUtils._iter_json_array(path, key, True, chunk_size):
+            yield (span, value) if with_spans else value
+
+    @staticmethod
+    def iter_json_array_spans(path, key: str, chunk_size=65536):
+        """
+        Incrementally find the byte span of each entry of the array stored under a key of a JSON
+        object file, without decoding the entries.
+
+        The array is scanned chunk by chunk with NumPy for its strings, brackets and commas, which
+        is much cheaper than decoding it; an entry can later be decoded alone with `json.loads(data[start:end])`. The entries are
+        not validated by the scan.
+
+        Args:
+            path (str or Path): The path to a UTF-8 JSON file holding an object at the top level.
+            key (str): The top-level key of the array.
+            chunk_size (int, optional): The number of bytes scanned at a time. Defaults to 65536.
+
+        Yields:
+            Tuple[int, int]: The (start, end) byte span of each entry in the file.
+
+        Raises:
+            KeyError: If the object has no such key.
+            ValueError: If the file is not a JSON object or the value of the key is not an array.
+
+        Example:
+        >>> spans = list(BaseUtils.iter_json_array_spans("fr.train.json", "documents"))
+        """
+        for span, _ in BaseUtils._iter_json_array(path, key, False, chunk_size):
+            yield span
+
+    @staticmethod
+    def _iter_json_array(path, key: str, decode: bool, chunk_size: int):
+        """Yield the ((start, end), entry) pairs of an array, the entries being None unless decoded."""
+        # newline="" keeps the characters identical to the bytes, so that spans are exact
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            reader = _JSONReader(file, chunk_size)
+            reader.expect("{")
+            if reader.peek() != "}":
+                while True:
+                    name = reader.decode()[0]
+                    reader.expect(":")
+                    if name == key:
+                        reader.expect("[")
+                        if reader.peek() == "]":
+                            return
+                        if not decode:
+                            with open(path, "rb") as raw:
+                                raw.seek(reader.offset)
+                                for span in _iter_array_spans(raw, chunk_size):
+                                    yield span, None
+                            return
+                        while True:
+                            value, start, end = reader.decode()
+                            yield (start, end), value
+                            if reader.expect(",]") == "]":
+                                return
+                    reader.decode()
+                    if reader.expect(",}") == "}":
+                        break
+        raise KeyError(key)
+
+    @staticmethod
+    def _parse_bbox_and_words(path: Path) -> tuple:
+        """
+        Parse a file of `x1,y1,x2,y2,x3,y3,x4,y4,text` lines.
+
+        Args:
+            path (Path): The path to the file.
+
+        Returns:
+            tuple: The file stem, the (N, 8) int32 array of the coordinates and the N text lines.
+
+        Raises:
+            ValueError: If a line has less than 8 coordinates.
+        """
+        coords, texts = [], []
         with open(path, "r", errors="ignore") as f:
             for line in f.read().splitlines():
                 if len(line) == 0:
                     continue
 
-                split_lines = line.split(",")
-
-                bbox = np.array(split_lines[0:8], dtype=np.int32)
-                text = ",".join(split_lines[8:])
-
-                # From the splited line we save (filename, [bounding box points], text line).
-                # The filename will be useful in the future
-                bbox_and_words_list.append([path.stem, *bbox, text])
-        dataframe = pd.DataFrame(
-            bbox_and_words_list,
-            columns=[
-                "filename",
-                "x0",
-                "y0",
-                "x1",
-                "y1",
-                "x2",
-                "y2",
-                "x3",
-                "y3",
-                "line",
-            ],
+                # The text is everything after the 8th comma, commas included
+                fields = line.split(",", 8)
+                if len(fields) < 8:
+                    raise ValueError(f"Expected 8 coordinates in {path}, got {line!r}.")
+                coords.extend(fields[:8])
+                texts.append(fields[8] if len(fields) > 8 else "")
+
+        # One conversion for the whole file
+        coords = np.array(coords, dtype=np.int32).reshape(-1, 8)
+        return Path(path).stem, coords, texts
+
+    @staticmethod
+    def _bbox_and_words_frame(filenames, coords: np.ndarray, texts) -> pd.DataFrame:
+        """Build the words frame, keeping the top-left and bottom-right points only."""
+        return pd.DataFrame(
+            {
+                "filename": filenames,
+                "x0": coords[:, 0],
+                "y0": coords[:, 1],
+                "x2": coords[:, 4],
+                "y2": coords[:, 5],
+                "line": texts,
+            }
         )
-        dataframe = dataframe.drop(columns=["x1", "y1", "x3", "y3"])
 
-        return dataframe
+    @staticmethod
+    def read_bbox_and_words(path: Path):
+        # From each line we save (filename, [bounding box points], text line).
+        # The filename will be useful in the future
+        stem, coords, texts = BaseUtils._parse_bbox_and_words(path)
+        return BaseUtils._bbox_and_words_frame([stem] * len(texts), coords, texts)
+
+    @staticmethod
+    def read_bbox_and_words_folder(
+        folder: Path, pattern: str = "*.txt", num_workers: int = 0
+    ) -> pd.DataFrame:
+        """
+        Read every box/text file of a folder into a single words frame.
+
+        Each file is parsed with one array conversion for all its coordinates, and the files
+        can be parsed in parallel. The frame has the columns of `read_bbox_and_words`, the
+        files following each other in file name order, so the rows of one file are given by
+        its "filename" value (e.g. `frame.groupby("filename", sort=False)`).
+
+        Args:
+            folder (Path): The folder containing the files.
+            pattern (str, optional): The glob pattern of the files to read. Defaults to "*.txt".
+            num_workers (int, optional): The number of processes parsing the files. Defaults to 0
+                (parse in the current process).
+
+        Returns:
+            pd.DataFrame: The words of every file, with the columns "filename", "x0", "y0", "x2",
+            "y2" and "line".
+
+        Raises:
+            FileNotFoundError: If the folder does not exist.
+
+        Example:
+        >>> words = BaseUtils.read_bbox_and_words_folder("/path/to/sroie/box", num_workers=4)
+        >>> for filename, file_words in words.groupby("filename", sort=False):
+        ...     labeled = BaseUtils.assign_labels(file_words, entities[filename])
+        """
+        folder = Path(folder)
+        if not folder.is_dir():
+            raise FileNotFoundError(f"unable to locate {folder}")
+
+        paths = sorted(folder.glob(pattern))
+        if num_workers > 1 and len(paths) > 1:
+            # A few chunks per worker balance the load while keeping the pickling overhead low
+            chunk_size = math.ceil(len(paths) / (num_workers * 4))
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                parsed = list(
+                    executor.map(
+                        BaseUtils._parse_bbox_and_words, paths, chunksize=chunk_size
+                    )
+                )
+        else:
+            parsed = [BaseUtils._parse_bbox_and_words(path) for path in paths]
+
+        filenames = np.repeat(
+            [stem for stem, _, _ in parsed], [len(texts) for _, _, texts in parsed]
+        )
+        coords = (
+            np.concatenate([coords for _, coords, _ in parsed])
+            if parsed
+            else np.zeros((0, 8), dtype=np.int32)
+        )
+        texts = [text for _, _, file_texts in parsed for text in file_texts]
+        return BaseUtils._bbox_and_words_frame(filenames, coords, texts)
 
     @staticmethod
     def read_entities(path: Path):
@@ -80,68 +474,9 @@ class BaseUtils:
     # Assign a label to the line by checking the similarity of the line and all the entities
     @staticmethod
     def assign_line_label(line: str, entities: pd.DataFrame):
-        line_set = line.replace(",", "").strip().split()
-        for i, column in enumerate(entities):
-            entity_values = entities.iloc[0, i].replace(",", "").strip()
-            entity_set = entity_values.split()
-
-            matches_count = 0
-            for line in line_set:
-                if any(SequenceMatcher(a=line, b=b).ratio() > 0.8 for b in entity_set):
-                    matches_count += 1
-
-                if (
-                    (
-                        column.upper() == "ADDRESS"
-                        and (matches_count / len(line_set)) >= 0.5
-                    )
-                    or (
-                        column.upper() != "ADDRESS" and (matches_count == len(line_set))
-                    )
-                    or matches_count == len(entity_set)
-                ):
-                    return column.upper()
-
-        return "O"
+        return LabelMatcher(entities).line_label(line)
 
     @staticmethod
     def assign_labels(words: pd.DataFrame, entities: pd.DataFrame):
-        max_area = {"TOTAL": (0, -1), "DATE": (0, -1)}  # Value, index
-        already_labeled = {
-            "TOTAL": False,
-            "DATE": False,
-            "ADDRESS": False,
-            "COMPANY": False,
-            "O": False,
-        }
-
-        # Go through every line in $words and assign it a label
-        labels = []
-        for i, line in enumerate(words["line"]):
-            label = BaseUtils.assign_line_label(line, entities)
-
-            already_labeled[label] = True
-            if (label == "ADDRESS" and already_labeled["TOTAL"]) or (
-                label == "COMPANY"
-                and (already_labeled["DATE"] or already_labeled["TOTAL"])
-            ):
-                label = "O"
-
-            # Assign to the largest bounding box
-            if label in ["TOTAL", "DATE"]:
-                x0_loc = words.columns.get_loc("x0")
-                bbox = words.iloc[i, x0_loc : x0_loc + 4].to_list()
-                area = (bbox[2] - bbox[0]) + (bbox[3] - bbox[1])
-
-                if max_area[label][0] < area:
-                    max_area[label] = (area, i)
-
-                label = "O"
-
-            labels.append(label)
-
-        labels[max_area["DATE"][1]] = "DATE"
-        labels[max_area["TOTAL"][1]] = "TOTAL"
-
-        words["label"] = labels
-        return words
+        # The matcher indexes the entity tokens once for all the lines of the document
+        return LabelMatcher(entities).assign_labels(words)
@@ -0,0 +1,461 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from DocumentAI_std.base.document import Document
+from DocumentAI_std.utils.layout_utils import LayoutUtils
+
+
+class GraphUtils:
+    # Columns of the edge feature tensors
+    EDGE_FEATURES = ("distance", "angle", "dx", "dy")
+
+    # Upper bound on the number of cells along each side of the k-nearest-neighbor grid
+    MAX_GRID_SIDE = 4096
+
+    DIRECTIONS = ("left", "right", "above", "below")
+
+    # Columns of the pair feature tensors, the "_norm" offsets being divided by the page size
+    PAIR_FEATURES = ("angle", "dx", "dy", "dx_norm", "dy_norm")
+
+    @staticmethod
+    def centers(elements) -> np.ndarray:
+        """
+        Compute the centers of the element bounding boxes.
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The elements.
+
+        Returns:
+            np.ndarray: The centers, shape (N, 2).
+        """
+        bboxes = LayoutUtils.bbox_array(elements)
+        return bboxes[:, :2] + bboxes[:, 2:] / 2
+
+    @staticmethod
+    def knn(points, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest other points of every point.
+
+        The points are bucketed in a uniform grid holding about k points per cell. All the
+        queries are answered together: each round gathers the candidates of the square of
+        cells around every pending point, keeps the k closest, and settles the points whose
+        k-th distance is smaller than the distance to any cell outside the square. The
+        remaining points are retried with a square twice as large.
+
+        Args:
+            points (np.ndarray): The points, shape (N, 2).
+            k (int): The number of neighbors of each point.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The (N, k) neighbor indices, sorted by distance then
+            index, and their (N, k) Euclidean distances. When there are fewer than k other
+            points, the missing entries are -1 and inf.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        n = len(points)
+        neighbors = np.full((n, k), -1, dtype=np.int64)
+        distances = np.full((n, k), np.inf)
+        k_eff = min(k, n - 1)
+        if k_eff <= 0:
+            return neighbors, distances
+
+        origin = points.min(axis=0)
+        extent = points.max(axis=0) - origin
+        if extent.min() > 0:
+            cell = math.sqrt(extent[0] * extent[1] * k_eff / n)
+        else:
+            cell = extent.max() * k_eff / n
+        cell = max(cell, extent.max() / GraphUtils.MAX_GRID_SIDE, 1e-9)
+
+        grid = np.floor((points - origin) / cell).astype(np.int64)
+        cols, rows = (int(v) + 1 for v in grid.max(axis=0))
+        keys = grid[:, 1] * cols + grid[:, 0]
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+
+        pending = np.arange(n)
+        radius = 1
+        while len(pending):
+            gx, gy = grid[pending, 0], grid[pending, 1]
+            x0, x1 = np.maximum(gx - radius, 0), np.minimum(gx + radius, cols - 1)
+            y0, y1 = np.maximum(gy - radius, 0), np.minimum(gy + radius, rows - 1)
+
+            # One (query, row of cells) pair per row of each square
+            nrows = y1 - y0 + 1
+            query = np.repeat(np.arange(len(pending)), nrows)
+            row = (
+                y0[query]
+                + np.arange(len(query))
+                - np.repeat(np.cumsum(nrows) - nrows, nrows)
+            )
+            starts = np.searchsorted(sorted_keys, row * cols + x0[query], side="left")
+            ends = np.searchsorted(sorted_keys, row * cols + x1[query], side="right")
+
+            # Expand the rows into (query, candidate) pairs
+            lengths = ends - starts
+            query = np.repeat(query, lengths)
+            candidates = order[
+                np.arange(lengths.sum())
+                + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            ]
+            keep = candidates != pending[query]
+            query, candidates = query[keep], candidates[keep]
+            delta = points[candidates] - points[pending[query]]
+            dist = np.sqrt(delta[:, 0] ** 2 + delta[:, 1] ** 2)
+
+            # Rank the candidates of each query by distance then index
+            sort = np.lexsort((candidates, dist, query))
+            query, candidates, dist = query[sort], candidates[sort], dist[sort]
+            counts = np.bincount(query, minlength=len(pending))
+            group_starts = np.cumsum(counts) - counts
+            rank = np.arange(len(query)) - group_starts[query]
+
+            kth = np.full(len(pending), np.inf)
+            enough = counts >= k_eff
+            kth[enough] = dist[group_starts[enough] + k_eff - 1]
+            covers_grid = (
+                (gx - radius <= 0)
+                & (gy - radius <= 0)
+                & (gx + radius >= cols - 1)
+                & (gy + radius >= rows - 1)
+            )
+            # Points outside the square are at least `radius` cells away
+            done = covers_grid | (kth < radius * cell)
+
+            settled = done[query] & (rank < k_eff)
+            neighbors[pending[query[settled]], rank[settled]] = candidates[settled]
+            distances[pending[query[settled]], rank[settled]] = dist[settled]
+            pending = pending[~done]
+            radius *= 2
+
+        return neighbors, distances
+
+    @staticmethod
+    def knn_graph(elements, k: int = 8) -> dict:
+        """
+        Build the k-nearest-neighbor graph of document elements.
+
+        The neighbors are found between the centers of the bounding boxes, in O(N log N) for
+        evenly spread elements, without comparing every pair.
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The elements.
+            k (int, optional): The number of neighbors of each element. Defaults to 8.
+
+        Returns:
+            dict: A dictionary with the keys:
+                  - "edge_index": Long tensor of shape (2, E). Row 0 holds the neighbors and row 1
+                    the elements they are neighbors of, as `torch_geometric` expects for messages
+                    flowing from the neighbors to each element.
+                  - "edge_attr": Float tensor of shape (E, 4) holding, from each element to its
+                    neighbor, the distance, the angle (as `LayoutUtils.angle_inter_element`)
+                    and the center offsets dx and dy (see `EDGE_FEATURES`).
+
+        Example:
+        >>> graph = GraphUtils.knn_graph(document, k=4)
+        >>> neighbors, elements = graph["edge_index"]
+        """
+        centers = GraphUtils.centers(elements)
+        neighbors, distances = GraphUtils.knn(centers, k)
+        valid = neighbors >= 0
+        target = np.nonzero(valid)[0]
+        source = neighbors[valid]
+
+        dx = centers[source, 0] - centers[target, 0]
+        dy = centers[source, 1] - centers[target, 1]
+        edge_attr = np.stack([distances[valid], np.arctan2(dy, dx), dx, dy], axis=1)
+        return {
+            "edge_index": torch.from_numpy(np.stack([source, target])),
+            "edge_attr": torch.from_numpy(edge_attr.astype(np.float32)),
+        }
+
+    @staticmethod
+    def knn_graph_batch(documents: Sequence, k: int = 8) -> dict:
+        """
+        Build the k-nearest-neighbor graphs of several documents as one disconnected graph.
+
+        Args:
+            documents (Sequence): The documents (or element lists, or bbox arrays).
+            k (int, optional): The number of neighbors of each element. Defaults to 8.
+
+        Returns:
+            dict: The "edge_index" and "edge_attr" of `knn_graph`, with the node indices of
+                  each document shifted after those of the previous documents, plus:
+                  - "batch": Long tensor of shape (N_total,) holding the document of each node.
+                  - "ptr": Long tensor of shape (D + 1,) holding the first node of each document.
+        """
+        edge_indices: List[torch.Tensor] = []
+        edge_attrs: List[torch.Tensor] = []
+        sizes = []
+        offset = 0
+        for document in documents:
+            bboxes = LayoutUtils.bbox_array(document)
+            graph = GraphUtils.knn_graph(bboxes, k)
+            edge_indices.append(graph["edge_index"] + offset)
+            edge_attrs.append(graph["edge_attr"])
+            sizes.append(len(bboxes))
+            offset += len(bboxes)
+
+        sizes = torch.tensor(sizes, dtype=torch.long)
+        return {
+            "edge_index": (
+                torch.cat(edge_indices, dim=1)
+                if edge_indices
+                else torch.zeros((2, 0), dtype=torch.long)
+            ),
+            "edge_attr": (
+                torch.cat(edge_attrs)
+                if edge_attrs
+                else torch.zeros((0, len(GraphUtils.EDGE_FEATURES)))
+            ),
+            "batch": torch.repeat_interleave(torch.arange(len(sizes)), sizes),
+            "ptr": torch.cat([torch.zeros(1, dtype=torch.long), sizes.cumsum(0)]),
+        }
+
+    @staticmethod
+    def _directional_sweep(
+        coord: np.ndarray,
+        reverse: bool,
+        keys: np.ndarray,
+        lo: np.ndarray,
+        hi: np.ndarray,
+    ) -> np.ndarray:
+        """
+        For every box, find the box of smallest key among the boxes strictly after it along
+        the sweep axis whose (lo, hi) span overlaps its own.
+
+        The boxes are swept in `coord` order (descending if `reverse`). A segment tree over
+        the span coordinates holds the boxes already swept: each box is stored at the nodes
+        covering its span (`tag`), and every node keeps the smallest key stored in its
+        subtree (`agg`). A box is queried before the boxes sharing its coordinate are
+        inserted, so the order is strict.
+        """
+        n = len(coord)
+        result = np.full(n, -1, dtype=np.int64)
+        coords = np.unique(np.concatenate([lo, hi]))
+        leaf_lo = np.searchsorted(coords, lo).tolist()
+        leaf_hi = np.searchsorted(coords, hi).tolist()
+        size = 1
+        while size < len(coords):
+            size *= 2
+        empty = (math.inf, -1)
+        tag = [empty] * (2 * size)
+        agg = [empty] * (2 * size)
+
+        def insert(l: int, r: int, item: tuple) -> None:
+            if l >= r:
+                return
+            left, right = l + size, r - 1 + size
+            l, r = l + size, r + size
+            while l < r:
+                if l & 1:
+                    tag[l] = min(tag[l], item)
+                    agg[l] = min(agg[l], item)
+                    l += 1
+                if r & 1:
+                    r -= 1
+                    tag[r] = min(tag[r], item)
+                    agg[r] = min(agg[r], item)
+                l >>= 1
+                r >>= 1
+            # The ancestors of the covering nodes lie on the paths of the span ends
+            for node in (left, right):
+                node >>= 1
+                while node:
+                    agg[node] = min(agg[node], item)
+                    node >>= 1
+
+        def query(l: int, r: int) -> int:
+            if l >= r:
+                return -1
+            best = empty
+            # Boxes stored above the covering nodes of the span contain one of its ends
+            for node in (l + size, r - 1 + size):
+                while node:
+                    best = min(best, tag[node])
+                    node >>= 1
+            l, r = l + size, r + size
+            while l < r:
+                if l & 1:
+                    best = min(best, agg[l])
+                    l += 1
+                if r & 1:
+                    r -= 1
+                    best = min(best, agg[r])
+                l >>= 1
+                r >>= 1
+            return best[1]
+
+        sequence = np.argsort(-coord if reverse else coord, kind="stable").tolist()
+        coord, keys = coord.tolist(), keys.tolist()
+        start = 0
+        while start < n:
+            end = start + 1
+            while end < n and coord[sequence[end]] == coord[sequence[start]]:
+                end += 1
+            group = sequence[start:end]
+            for i in group:
+                result[i] = query(leaf_lo[i], leaf_hi[i])
+            for j in group:
+                insert(leaf_lo[j], leaf_hi[j], (keys[j], j))
+            start = end
+        return result
+
+    @staticmethod
+    def directional_neighbors(
+        elements, max_gap: Optional[float] = None
+    ) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        Find the direct neighbor of every element to its left, right, above and below.
+
+        As in `LayoutUtils.calculate_horizontal_alignment`, an element is to the right of
+        another when its left edge is further right (and to the left when it is further left),
+        and likewise with the top edges for above and below. The neighbor must also overlap
+        the element on the other axis (a positive-length overlap of their vertical spans for
+        left and right, of their horizontal spans for above and below). Among the candidates,
+        the neighbor is the nearest one: the one with the leftmost left edge for right, the
+        rightmost right edge for left (and likewise for below and above), ties going to the
+        lowest index. Each direction is a sort-and-sweep in O(N log N).
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The elements.
+            max_gap (float, optional): The largest gap between an element and its neighbor.
+                Defaults to no limit.
+
+        Returns:
+            Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]: For each of "left", "right",
+            "above" and "below", the (N,) index of the neighbor of each element (-1 if none),
+            and the (N,) gap between them (0 when they overlap, inf if there is no neighbor).
+
+        Example:
+        >>> neighbors, gaps = GraphUtils.directional_neighbors(document, max_gap=50)
+        >>> neighbors["right"][0]
+        """
+        bboxes = LayoutUtils.bbox_array(elements)
+        x0, y0 = bboxes[:, 0], bboxes[:, 1]
+        x1, y1 = x0 + bboxes[:, 2], y0 + bboxes[:, 3]
+
+        sweep = GraphUtils._directional_sweep
+        neighbors = {
+            # Smallest left edge, among the boxes whose left edge is further right
+            "right": sweep(x0, True, x0, y0, y1),
+            # Largest right edge, among the boxes whose left edge is further left
+            "left": sweep(x0, False, -x1, y0, y1),
+            "below": sweep(y0, True, y0, x0, x1),
+            "above": sweep(y0, False, -y1, x0, x1),
+        }
+
+        gaps = {}
+        for direction, found in neighbors.items():
+            j = np.maximum(found, 0)
+            gap = {
+                "right": x0[j] - x1,
+                "left": x0 - x1[j],
+                "below": y0[j] - y1,
+                "above": y0 - y1[j],
+            }[direction]
+            gap = np.where(found >= 0, np.maximum(gap, 0), np.inf)
+            if max_gap is not None:
+                found[gap > max_gap] = -1
+                gap[gap > max_gap] = np.inf
+            gaps[direction] = gap
+        return neighbors, gaps
+
+    @staticmethod
+    def _offset_features(
+        delta: torch.Tensor, size: torch.Tensor, dtype: torch.dtype
+    ) -> torch.Tensor:
+        """Stack the `PAIR_FEATURES` of center offsets of shape (..., 2)."""
+        dx, dy = delta[..., 0], delta[..., 1]
+        features = torch.stack(
+            [torch.atan2(dy, dx), dx, dy, dx / size[..., 0], dy / size[..., 1]], dim=-1
+        )
+        return features.to(dtype)
+
+    @staticmethod
+    def pair_features(
+        elements,
+        edge_index: Optional[torch.Tensor] = None,
+        shape: Optional[Tuple[int, int]] = None,
+        dtype: torch.dtype = torch.float32,
+    ) -> torch.Tensor:
+        """
+        Compute the angle and center offsets between elements, for every pair or along edges.
+
+        The centers are computed once, and the features of all the pairs in one tensor
+        operation. The angle is the one of `LayoutUtils.angle_inter_element`; the offsets are
+        given in pixels and divided by the page width and height (see `PAIR_FEATURES`).
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The elements.
+            edge_index (torch.Tensor, optional): A (2, E) edge index as returned by `knn_graph`.
+                Defaults to every pair of elements.
+            shape (Tuple[int, int], optional): The (width, height) of the page. Defaults to the
+                shape of the document.
+            dtype (torch.dtype, optional): The dtype of the features. Defaults to torch.float32.
+
+        Returns:
+            torch.Tensor: The (N, N, 5) features from element i to element j, or the (E, 5)
+            features from the element of each edge (row 1) to its neighbor (row 0).
+
+        Raises:
+            ValueError: If the shape is not given and `elements` is not a Document.
+
+        Example:
+        >>> graph = GraphUtils.knn_graph(document, k=8)
+        >>> features = GraphUtils.pair_features(document, graph["edge_index"], dtype=torch.float16)
+        """
+        if shape is None:
+            if not isinstance(elements, Document):
+                raise ValueError(
+                    "The page shape is required when elements is not a Document."
+                )
+            shape = elements.shape
+        centers = torch.from_numpy(GraphUtils.centers(elements))
+        if edge_index is None:
+            delta = centers[None, :, :] - centers[:, None, :]
+        else:
+            delta = centers[edge_index[0]] - centers[edge_index[1]]
+        size = torch.tensor(shape, dtype=torch.float64)
+        return GraphUtils._offset_features(delta, size, dtype)
+
+    @staticmethod
+    def pair_features_batch(
+        bboxes,
+        shapes,
+        mask: Optional[torch.Tensor] = None,
+        dtype: torch.dtype = torch.float32,
+    ) -> torch.Tensor:
+        """
+        Compute the pair features of a padded batch of documents.
+
+        The inputs are those produced by `DocumentCollator`: the padded boxes of each document,
+        the page shapes and the mask of the real elements.
+
+        Args:
+            bboxes (torch.Tensor or np.ndarray): The boxes, shape (B, N_max, 4) in x, y, w, h format.
+            shapes (torch.Tensor or np.ndarray): The (width, height) of each page, shape (B, 2).
+            mask (torch.Tensor, optional): Boolean tensor of shape (B, N_max), True for the real
+                elements. Defaults to every element being real.
+            dtype (torch.dtype, optional): The dtype of the features. Defaults to torch.float32.
+
+        Returns:
+            torch.Tensor: The (B, N_max, N_max, 5) features from element i to element j of each
+            document, zero for the pairs involving padding.
+
+        Example:
+        >>> batch = collator(documents)
+        >>> features = GraphUtils.pair_features_batch(batch["bboxes"], batch["shapes"], batch["mask"])
+        """
+        bboxes = torch.as_tensor(bboxes, dtype=torch.float64)
+        centers = bboxes[..., :2] + bboxes[..., 2:] / 2
+        delta = centers[:, None, :, :] - centers[:, :, None, :]
+        size = torch.as_tensor(shapes, dtype=torch.float64)[:, None, None, :]
+        features = GraphUtils._offset_features(delta, size, dtype)
+        if mask is not None:
+            pairs = mask[:, :, None] & mask[:, None, :]
+            features = features.masked_fill(~pairs[..., None], 0)
+        return features
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+
+class ImageIndex:
+    """
+    Index of the image files of a folder with their sizes, modification times and dimensions.
+
+    The index is gathered in one `os.scandir` pass and the image dimensions are read from
+    the file headers only (the pixel data is never decoded). With `persist=True` it is saved
+    as a JSON sidecar file, so later loads only probe the files whose size or modification
+    time changed. The sidecar is kept outside the indexed folder, which may be read-only or
+    shared: in `cache_dir` when given, in the user cache folder otherwise.
+
+    The sidecar maps each path (relative to the folder) to `[size, mtime_ns, width, height]`.
+    Files that cannot be identified as images are kept with `null` dimensions so that they
+    are not probed again.
+
+    With `lazy=True` the scan only lists the file names: the entry of a file is built (from
+    the sidecar if the file did not change, from its header otherwise) the first time its
+    shape is requested. A persisted lazy index saves the new entries, merged with the ones
+    already in the sidecar, every time a sixteenth of the files has been probed, and on
+    `save()`.
+
+    Attributes:
+        folder (str): The indexed folder.
+        recursive (bool): Whether sub-folders are indexed.
+        lazy (bool): Whether the entries are built on access.
+        sidecar_path (str): The path of the JSON sidecar file.
+        entries (Dict[str, list]): The `[size, mtime_ns, width, height]` entry of each file (of each
+            accessed file in lazy mode).
+
+    Example:
+    >>> index = ImageIndex("/path/to/images")
+    >>> "receipt_0.jpeg" in index
+    True
+    >>> index.shape("receipt_0.jpeg")
+    (1024, 768)
+    >>> index = ImageIndex("/path/to/images", persist=True, cache_dir="/path/to/cache")
+    >>> index = ImageIndex("/path/to/images", lazy=True)
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        recursive: bool = False,
+        sidecar_path: Optional[str] = None,
+        persist: bool = False,
+        cache_dir: Optional[str] = None,
+        lazy: bool = False,
+    ) -> None:
+        """
+        Build the index, reusing the entries of the sidecar file for unchanged files.
+
+        Args:
+            folder (str): The folder containing the images.
+            recursive (bool, optional): Whether to index sub-folders. Defaults to False.
+            sidecar_path (str, optional): Where to persist the index. Defaults to a file of `cache_dir`
+                named after the absolute path of `folder`.
+            persist (bool, optional): Whether to write the sidecar file. Defaults to False.
+            cache_dir (str, optional): The folder of the sidecar file. Defaults to the user cache folder
+                (`$XDG_CACHE_HOME/documentai_std` or `~/.cache/documentai_std`).
+            lazy (bool, optional): Whether to only list the files and build their entries on access.
+                Defaults to False.
+
+        Raises:
+            FileNotFoundError: If the folder does not exist.
+        """
+        if not os.path.isdir(folder):
+            raise FileNotFoundError(f"unable to locate {folder}")
+
+        self.folder = folder
+        self.recursive = recursive
+        self.lazy = lazy
+        self.persist = persist
+        self.sidecar_path = sidecar_path or ImageIndex.default_sidecar_path(
+            folder, recursive, cache_dir
+        )
+
+        self._previous = self._read_sidecar()
+        self.entries: Dict[str, list] = {}
+        self._files: Optional[Dict[str, None]] = None
+        self._unsaved = 0
+        if lazy:
+            self._files = dict.fromkeys(rel_path for rel_path, _ in self._scan())
+            return
+
+        for rel_path, dir_entry in self._scan():
+            self.entries[rel_path] = self._build_entry(rel_path, dir_entry.stat())
+        if persist and (self._unsaved or len(self._previous) != len(self.entries)):
+            self._write_sidecar(self.entries)
+        self._previous = {}
+        self._unsaved = 0
+
+    @staticmethod
+    def default_sidecar_path(
+        folder: str, recursive: bool = False, cache_dir: Optional[str] = None
+    ) -> str:
+        """
+        Return the sidecar path of a folder, keyed by its absolute path.
+
+        Args:
+            folder (str): The indexed folder.
+            recursive (bool, optional): Whether sub-folders are indexed. Defaults to False.
+            cache_dir (str, optional): The folder of the sidecar file. Defaults to the user cache folder.
+
+        Returns:
+            str: The path of the JSON sidecar file.
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(
+                os.environ.get("XDG_CACHE_HOME")
+                or os.path.join(os.path.expanduser("~"), ".cache"),
+                "documentai_std",
+            )
+        key = json.dumps([os.path.abspath(folder), recursive])
+        name = hashlib.sha256(key.encode()).hexdigest()[:16]
+        return os.path.join(cache_dir, f"image_index-{name}.json")
+
+    @staticmethod
+    def probe_size(img_path: str) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Read the dimensions of an image from its header without decoding it.
+
+        Args:
+            img_path (str): The path to the image file.
+
+        Returns:
+            Tuple[Optional[int], Optional[int]]: The (width, height) of the image, or (None, None)
+            if the file is not a readable image.
+        """
+        try:
+            with Image.open(img_path) as image:
+                return image.size
+        except (OSError, SyntaxError, ValueError):
+            return None, None
+
+    def _build_entry(self, rel_path: str, stat: os.stat_result) -> list:
+        """Return the sidecar entry of a file if it did not change, probe its header otherwise."""
+        entry = self._previous.get(rel_path)
+        if entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns:
+            width, height = ImageIndex.probe_size(os.path.join(self.folder, rel_path))
+            entry = [stat.st_size, stat.st_mtime_ns, width, height]
+            self._unsaved += 1
+        return entry
+
+    def _scan(self):
+        """Yield the (relative path, `os.DirEntry`) pair of every file in the folder."""
+        # A sidecar explicitly placed inside the folder is not an indexed file
+        sidecar = os.path.relpath(
+            os.path.abspath(self.sidecar_path), os.path.abspath(self.folder)
+        )
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            with os.scandir(os.path.join(self.folder, rel_dir)) as it:
+                for entry in it:
+                    rel_path = (
+                        os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                    )
+                    if entry.is_dir():
+                        if self.recursive:
+                            stack.append(rel_path)
+                    elif entry.is_file() and rel_path != sidecar:
+                        yield rel_path, entry
+
+    def _read_sidecar(self) -> Dict[str, list]:
+        """Read the persisted entries, ignoring a missing or corrupted sidecar file."""
+        try:
+            with open(self.sidecar_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _write_sidecar(self, entries: Dict[str, list]) -> None:
+        """Persist the entries, ignoring folders that are not writable."""
+        tmp_path = f"{self.sidecar_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(
+                os.path.dirname(os.path.abspath(self.sidecar_path)), exist_ok=True
+            )
+            with open(tmp_path, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.sidecar_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def save(self) -> None:
+        """
+        Persist the entries built in lazy mode, merged with the entries already in the sidecar.
+
+        Entries of files that are no longer in the folder are dropped. An eager index is saved
+        when it is built, so this only writes the sidecar of a lazy index with new entries.
+        """
+        if not self.lazy or not self._unsaved:
+            return
+        entries = {
+            rel_path: entry
+            for rel_path, entry in self._read_sidecar().items()
+            if rel_path in self._files
+        }
+        entries.update(self.entries)
+        self._write_sidecar(entries)
+        self._unsaved = 0
+
+    @property
+    def files(self) -> List[str]:
+        """The relative paths of the indexed files, in directory listing order."""
+        return list(self._files if self.lazy else self.entries)
+
+    def __contains__(self, rel_path: str) -> bool:
+        return os.path.normpath(rel_path) in (
+            self._files if self.lazy else self.entries
+        )
+
+    def __len__(self) -> int:
+        return len(self._files if self.lazy else self.entries)
+
+    def shape(self, rel_path: str) -> Optional[Tuple[int, int]]:
+        """
+        Return the (width, height) of an indexed image.
+
+        Args:
+            rel_path (str): The path of the image relative to the indexed folder.
+
+        Returns:
+            Optional[Tuple[int, int]]: The dimensions of the image, or None if the file is not an image.
+
+        Raises:
+            FileNotFoundError: If the file is not in the index.
+        """
+        key = os.path.normpath(rel_path)
+        entry = self.entries.get(key)
+        if entry is None and self.lazy and key in self._files:
+            entry = self._build_entry(key, os.stat(os.path.join(self.folder, key)))
+            self.entries[key] = entry
+            if self.persist and self._unsaved >= max(1, len(self._files) // 16):
+                self.save()
+        if entry is None:
+            raise FileNotFoundError(
+                f"unable to locate {os.path.join(self.folder, rel_path)}"
+            )
+        if entry[2] is None:
+            return None
+        return entry[2], entry[3]
@@ -0,0 +1,226 @@
+import math
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def _label_file(args: Tuple[pd.DataFrame, pd.DataFrame]) -> pd.DataFrame:
+    """Label the words of one file in a worker process."""
+    words, entities = args
+    return LabelMatcher(entities).assign_labels(words)
+
+
+class LabelMatcher:
+    """
+    Indexed fuzzy matching of text lines against the entities of a document.
+
+    `BaseUtils.assign_line_label` compares every token of a line with every token of every
+    entity using `SequenceMatcher.ratio()`. The matcher gives the same labels while avoiding
+    most of these comparisons:
+        - The entity tokens of each column are indexed by length. Two strings whose lengths
+          are too different cannot reach the ratio threshold, so only the length buckets
+          that can match are visited.
+        - The remaining candidates are filtered with the character multiset bound used by
+          `SequenceMatcher.quick_ratio()` before the exact ratio is computed.
+        - Tokens equal to an entity token match without computing any ratio, and the result
+          of each (column, token) pair is memoized, so repeated tokens and lines are free.
+        - The tokens of a line stop being compared as soon as the label of a column is decided.
+
+    Args:
+        entities (pd.DataFrame): A one-row frame holding the value of each entity column.
+        threshold (float, optional): The ratio a pair of tokens must exceed to match. Defaults to 0.8.
+
+    Example:
+    >>> matcher = LabelMatcher(BaseUtils.read_entities(Path("/path/to/entities/X001.txt")))
+    >>> matcher.line_label("TOTAL 12.50")
+    'TOTAL'
+    >>> words = matcher.assign_labels(BaseUtils.read_bbox_and_words(Path("/path/to/box/X001.txt")))
+    """
+
+    def __init__(self, entities: pd.DataFrame, threshold: float = 0.8) -> None:
+        self.threshold = threshold
+        self._columns = []
+        for i, column in enumerate(entities):
+            entity_values = entities.iloc[0, i].replace(",", "").strip()
+            entity_set = entity_values.split()
+            by_length: Dict[int, List[Tuple[str, Counter]]] = {}
+            for token in entity_set:
+                by_length.setdefault(len(token), []).append((token, Counter(token)))
+            self._columns.append(
+                {
+                    "label": column.upper(),
+                    "size": len(entity_set),
+                    "tokens": set(entity_set),
+                    "by_length": by_length,
+                    "memo": {},
+                }
+            )
+        self._line_memo: Dict[str, str] = {}
+
+    def _token_matches(self, column: dict, token: str) -> bool:
+        """Whether a line token matches any token of an entity column."""
+        memo = column["memo"]
+        matched = memo.get(token)
+        if matched is not None:
+            return matched
+
+        matched = token in column["tokens"]
+        if not matched:
+            la = len(token)
+            counts = None
+            for lb, candidates in column["by_length"].items():
+                # Upper bound of the ratio given the lengths (SequenceMatcher.real_quick_ratio)
+                if 2.0 * min(la, lb) / (la + lb) <= self.threshold:
+                    continue
+                if counts is None:
+                    counts = Counter(token)
+                for candidate, candidate_counts in candidates:
+                    # Upper bound given the shared characters (SequenceMatcher.quick_ratio)
+                    shared = sum((counts & candidate_counts).values())
+                    if 2.0 * shared / (la + lb) <= self.threshold:
+                        continue
+                    if SequenceMatcher(a=token, b=candidate).ratio() > self.threshold:
+                        matched = True
+                        break
+                if matched:
+                    break
+        memo[token] = matched
+        return matched
+
+    def line_label(self, line: str) -> str:
+        """
+        Assign a label to a line, as `BaseUtils.assign_line_label` does.
+
+        A column labels the line once enough line tokens match its tokens: half of them for
+        the address, all of them for the other columns, or as many as the column has tokens.
+        The first column that labels the line wins, and "O" is returned if none does.
+
+        Args:
+            line (str): The text of the line.
+
+        Returns:
+            str: The upper-case name of the matching entity column, or "O".
+        """
+        label = self._line_memo.get(line)
+        if label is not None:
+            return label
+
+        label = "O"
+        line_set = line.replace(",", "").strip().split()
+        for column in self._columns:
+            if self._column_labels(column, line_set):
+                label = column["label"]
+                break
+        self._line_memo[line] = label
+        return label
+
+    def _column_labels(self, column: dict, line_set: List[str]) -> bool:
+        """Whether an entity column labels a line, stopping at the first decisive token."""
+        is_address = column["label"] == "ADDRESS"
+        matches_count = 0
+        for token in line_set:
+            if self._token_matches(column, token):
+                matches_count += 1
+            if (
+                (is_address and (matches_count / len(line_set)) >= 0.5)
+                or (not is_address and (matches_count == len(line_set)))
+                or matches_count == column["size"]
+            ):
+                return True
+        return False
+
+    def assign_labels(self, words: pd.DataFrame) -> pd.DataFrame:
+        """
+        Label every line of a words frame, as `BaseUtils.assign_labels` does.
+
+        The labels of the distinct lines are computed once, and the areas used to keep only the
+        largest "TOTAL" and "DATE" boxes are computed for the whole frame at once.
+
+        Args:
+            words (pd.DataFrame): The words of a document, with a "line" column and the four box
+                coordinate columns starting at "x0".
+
+        Returns:
+            pd.DataFrame: The same frame, with a "label" column added.
+        """
+        line_labels = [self.line_label(line) for line in words["line"]]
+
+        x0_loc = words.columns.get_loc("x0")
+        boxes = words.iloc[:, x0_loc : x0_loc + 4].to_numpy()
+        areas = (boxes[:, 2] - boxes[:, 0]) + (boxes[:, 3] - boxes[:, 1])
+
+        max_area = {"TOTAL": (0, -1), "DATE": (0, -1)}  # Value, index
+        already_labeled = {
+            "TOTAL": False,
+            "DATE": False,
+            "ADDRESS": False,
+            "COMPANY": False,
+            "O": False,
+        }
+        labels = []
+        for i, label in enumerate(line_labels):
+            already_labeled[label] = True
+            if (label == "ADDRESS" and already_labeled["TOTAL"]) or (
+                label == "COMPANY"
+                and (already_labeled["DATE"] or already_labeled["TOTAL"])
+            ):
+                label = "O"
+
+            # Assign to the largest bounding box
+            if label in ["TOTAL", "DATE"]:
+                if max_area[label][0] < areas[i]:
+                    max_area[label] = (areas[i], i)
+                label = "O"
+
+            labels.append(label)
+
+        labels[max_area["DATE"][1]] = "DATE"
+        labels[max_area["TOTAL"][1]] = "TOTAL"
+
+        words["label"] = labels
+        return words
+
+    @staticmethod
+    def assign_labels_by_file(
+        words: pd.DataFrame,
+        entities: Dict[str, pd.DataFrame],
+        num_workers: int = 0,
+    ) -> pd.DataFrame:
+        """
+        Label the words of many files, optionally with a pool of worker processes.
+
+        Args:
+            words (pd.DataFrame): The words of every file, with a "filename" column, as returned by
+                `BaseUtils.read_bbox_and_words_folder`.
+            entities (Dict[str, pd.DataFrame]): The entities frame of each file name.
+            num_workers (int, optional): The number of worker processes. Defaults to 0 (label in
+                the current process).
+
+        Returns:
+            pd.DataFrame: The words of every file, in the input order, with a "label" column.
+
+        Raises:
+            KeyError: If the entities of a file are missing.
+        """
+        # Rows are tracked by position, so that the index does not need to be unique
+        groups = words.groupby("filename", sort=False).indices
+        tasks = [
+            (words.iloc[positions].copy(), entities[filename])
+            for filename, positions in groups.items()
+        ]
+        if num_workers > 1 and len(tasks) > 1:
+            # A few chunks per worker balance the load while keeping the pickling overhead low
+            chunk_size = math.ceil(len(tasks) / (num_workers * 4))
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                labeled = list(executor.map(_label_file, tasks, chunksize=chunk_size))
+        else:
+            labeled = [_label_file(task) for task in tasks]
+
+        if not labeled:
+            return words.assign(label=pd.Series(dtype=object))
+        positions = np.concatenate(list(groups.values()))
+        return pd.concat(labeled).iloc[np.argsort(positions, kind="stable")]
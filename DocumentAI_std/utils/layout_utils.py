@@ -1,7 +1,13 @@
 import math
-from typing import Tuple
+from typing import Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
 
 from DocumentAI_std.base.document import Document
+from DocumentAI_std.base.document_entity_classification import (
+    DocumentEntityClassification,
+)
 
 from DocumentAI_std.base.doc_element import DocElement
 from DocumentAI_std.base.doc_enum import (
@@ -9,9 +15,165 @@ from DocumentAI_std.base.doc_enum import (
     HorizontalAlignment,
     VerticalAlignment,
 )
+from DocumentAI_std.base.element_store import ElementStore
 
 
 class LayoutUtils:
+    DISTANCE_METRICS = ("euclidean", "manhattan", "chebyshev")
+    # "edge" measures the gap between the boxes instead of between two points
+    REFERENCE_POINTS = ("top_left", "center", "edge")
+
+    # How `deduplicate` combines the contents of a box and of the boxes it suppresses
+    MERGE_POLICIES = ("keep", "longest", "concat")
+
+    @staticmethod
+    def bbox_array(elements) -> np.ndarray:
+        """
+        Return the bounding boxes of elements as an (N, 4) float64 array in x, y, w, h format.
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): A document, its
+                elements, or the boxes themselves.
+
+        Returns:
+            np.ndarray: The boxes, shape (N, 4).
+        """
+        if isinstance(elements, (Document, ElementStore)):
+            bboxes = elements.bboxes
+        elif len(elements) and isinstance(elements[0], DocElement):
+            bboxes = [[e.x, e.y, e.w, e.h] for e in elements]
+        else:
+            bboxes = elements
+        return np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+
+    @staticmethod
+    def _pairwise_distances(
+        a: np.ndarray, b: np.ndarray, metric: str, reference: str
+    ) -> np.ndarray:
+        """Compute the (M, N) distances between two box arrays."""
+        if reference == "edge":
+            # Gap between the boxes along each axis, 0 when their projections overlap
+            dx = np.maximum(
+                np.maximum(
+                    a[:, None, 0] - (b[None, :, 0] + b[None, :, 2]),
+                    b[None, :, 0] - (a[:, None, 0] + a[:, None, 2]),
+                ),
+                0,
+            )
+            dy = np.maximum(
+                np.maximum(
+                    a[:, None, 1] - (b[None, :, 1] + b[None, :, 3]),
+                    b[None, :, 1] - (a[:, None, 1] + a[:, None, 3]),
+                ),
+                0,
+            )
+        else:
+            if reference == "center":
+                a = a[:, :2] + a[:, 2:] / 2
+                b = b[:, :2] + b[:, 2:] / 2
+            dx = np.abs(a[:, None, 0] - b[None, :, 0])
+            dy = np.abs(a[:, None, 1] - b[None, :, 1])
+
+        if metric == "euclidean":
+            return np.sqrt(dx**2 + dy**2)
+        if metric == "manhattan":
+            return dx + dy
+        return np.maximum(dx, dy)
+
+    @staticmethod
+    def _check_distance_args(metric: str, reference: str) -> None:
+        """Raise a ValueError for an unknown metric or reference point."""
+        if metric not in LayoutUtils.DISTANCE_METRICS:
+            raise ValueError(
+                f"Unknown metric '{metric}', expected one of {LayoutUtils.DISTANCE_METRICS}."
+            )
+        if reference not in LayoutUtils.REFERENCE_POINTS:
+            raise ValueError(
+                f"Unknown reference '{reference}', expected one of {LayoutUtils.REFERENCE_POINTS}."
+            )
+
+    @staticmethod
+    def distance_matrix(
+        elements,
+        metric: str = "euclidean",
+        reference: str = "top_left",
+        block_size: Optional[int] = None,
+        as_tensor: bool = False,
+        dtype=np.float64,
+    ):
+        """
+        Compute the distances between every pair of elements in one vectorized operation.
+
+        With `reference="top_left"` the entries match `euclidean_distance`, `manhattan_distance`
+        and `chebyshev_distance`. With `block_size`, the rows are computed `block_size` at a time,
+        so the temporaries hold `block_size * N` values instead of `N * N`.
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The elements.
+            metric (str, optional): "euclidean", "manhattan" or "chebyshev". Defaults to "euclidean".
+            reference (str, optional): The point of each box the distances are measured from:
+                "top_left", "center", or "edge" for the gap between the boxes. Defaults to "top_left".
+            block_size (int, optional): The number of rows computed at a time. Defaults to all the rows.
+            as_tensor (bool, optional): Whether to return a torch tensor. Defaults to False.
+            dtype (np.dtype, optional): The dtype of the matrix. Defaults to np.float64.
+
+        Returns:
+            np.ndarray or torch.Tensor: The (N, N) distance matrix.
+
+        Raises:
+            ValueError: If the metric or the reference point is unknown.
+
+        Example:
+        >>> LayoutUtils.distance_matrix(document, metric="manhattan", reference="center")
+        """
+        LayoutUtils._check_distance_args(metric, reference)
+        bboxes = LayoutUtils.bbox_array(elements)
+        n = len(bboxes)
+        block_size = n if not block_size else block_size
+        matrix = np.empty((n, n), dtype=dtype)
+        for start in range(0, n, max(block_size, 1)):
+            stop = min(start + block_size, n)
+            matrix[start:stop] = LayoutUtils._pairwise_distances(
+                bboxes[start:stop], bboxes, metric, reference
+            )
+        return torch.from_numpy(matrix) if as_tensor else matrix
+
+    @staticmethod
+    def iter_distance_blocks(
+        elements,
+        block_size: int = 1024,
+        metric: str = "euclidean",
+        reference: str = "top_left",
+        dtype=np.float64,
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Iterate over the rows of the distance matrix, `block_size` rows at a time.
+
+        Unlike `distance_matrix`, the full matrix is never held in memory, which suits pages
+        whose matrix does not fit.
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The elements.
+            block_size (int, optional): The number of rows of each block. Defaults to 1024.
+            metric (str, optional): "euclidean", "manhattan" or "chebyshev". Defaults to "euclidean".
+            reference (str, optional): "top_left", "center" or "edge". Defaults to "top_left".
+            dtype (np.dtype, optional): The dtype of the blocks. Defaults to np.float64.
+
+        Yields:
+            Tuple[int, np.ndarray]: The index of the first row of the block and the
+            (block_size, N) block of distances.
+
+        Raises:
+            ValueError: If the metric or the reference point is unknown.
+        """
+        LayoutUtils._check_distance_args(metric, reference)
+        bboxes = LayoutUtils.bbox_array(elements)
+        for start in range(0, len(bboxes), block_size):
+            block = LayoutUtils._pairwise_distances(
+                bboxes[start : start + block_size], bboxes, metric, reference
+            )
+            yield start, block.astype(dtype, copy=False)
+
     @staticmethod
     def relative_position(
         doc_element: DocElement, document: Document
@@ -54,6 +216,30 @@ class LayoutUtils:
         else:
             return ContentRelativePosition.BOTTOM_HEIGHT
 
+    @staticmethod
+    def relative_position_codes(document: Document) -> np.ndarray:
+        """
+        Determine the relative position of every element of a document at once.
+
+        Args:
+            document (Document): The document.
+
+        Returns:
+            np.ndarray: The (N,) int8 array of the `ContentRelativePosition` values of the
+            elements, equal to the values returned by `relative_position`.
+        """
+        bboxes = LayoutUtils.bbox_array(document)
+        center_y = bboxes[:, 1] + bboxes[:, 3] / 2
+        height = document.shape[1]
+        return np.select(
+            [center_y <= height / 3, center_y <= height * 2 / 3],
+            [
+                ContentRelativePosition.TOP_HEIGHT.value,
+                ContentRelativePosition.CENTRAL_HEIGHT.value,
+            ],
+            ContentRelativePosition.BOTTOM_HEIGHT.value,
+        ).astype(np.int8)
+
     @staticmethod
     def euclidean_distance(a: DocElement, b: DocElement) -> float:
         """
@@ -159,6 +345,270 @@ class LayoutUtils:
 
         return overlap_ratio
 
+    @staticmethod
+    def overlap_pairs(
+        elements, with_iou: bool = False, min_overlap: float = 0.0
+    ) -> dict:
+        """
+        Find every pair of overlapping elements and their degree of overlap.
+
+        The boxes are sorted along one axis, so the candidates of a box are the boxes starting
+        inside its span, found by binary search. The axis with the fewest candidates is used,
+        and only the candidate pairs are compared, instead of all N² pairs. The overlap of a
+        pair is the one of `calculate_overlap`: the intersection area over the area of the
+        smaller box.
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The elements.
+            with_iou (bool, optional): Whether to also return the intersection over union.
+                Defaults to False.
+            min_overlap (float, optional): The smallest overlap of the returned pairs. Pairs with
+                no intersection are never returned. Defaults to 0.0.
+
+        Returns:
+            dict: A dictionary in COO form holding one entry per pair, sorted by "row" then "col":
+                  - "row": The (K,) index of the first element of each pair.
+                  - "col": The (K,) index of the second element, always greater than "row".
+                  - "overlap": The (K,) overlap of each pair.
+                  - "iou": The (K,) intersection over union of each pair, if `with_iou` is True.
+
+        Example:
+        >>> pairs = LayoutUtils.overlap_pairs(document, min_overlap=0.5)
+        >>> duplicates = list(zip(pairs["row"], pairs["col"]))
+        """
+        bboxes = LayoutUtils.bbox_array(elements)
+        n = len(bboxes)
+        x0, y0 = bboxes[:, 0], bboxes[:, 1]
+        x1, y1 = x0 + bboxes[:, 2], y0 + bboxes[:, 3]
+
+        def candidates(lo: np.ndarray, hi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            # For each box in `lo` order, the number of following boxes starting in its span
+            order = np.argsort(lo, kind="stable")
+            ends = np.searchsorted(lo[order], hi[order], side="left")
+            return order, np.maximum(ends - np.arange(n) - 1, 0)
+
+        order, counts = candidates(x0, x1)
+        order_y, counts_y = candidates(y0, y1)
+        if counts_y.sum() < counts.sum():
+            order, counts = order_y, counts_y
+
+        first = np.repeat(np.arange(n), counts)
+        second = (
+            np.arange(counts.sum())
+            - np.repeat(np.cumsum(counts) - counts, counts)
+            + first
+            + 1
+        )
+        a, b = order[first], order[second]
+
+        inter_w = np.minimum(x1[a], x1[b]) - np.maximum(x0[a], x0[b])
+        inter_h = np.minimum(y1[a], y1[b]) - np.maximum(y0[a], y0[b])
+        keep = (inter_w > 0) & (inter_h > 0)
+        a, b = a[keep], b[keep]
+        intersection = inter_w[keep] * inter_h[keep]
+
+        areas = bboxes[:, 2] * bboxes[:, 3]
+        overlap = intersection / np.minimum(areas[a], areas[b])
+        keep = overlap >= min_overlap
+        row, col = np.minimum(a, b)[keep], np.maximum(a, b)[keep]
+        sort = np.lexsort((col, row))
+
+        pairs = {
+            "row": row[sort],
+            "col": col[sort],
+            "overlap": overlap[keep][sort],
+        }
+        if with_iou:
+            union = areas[a] + areas[b] - intersection
+            pairs["iou"] = (intersection / union)[keep][sort]
+        return pairs
+
+    @staticmethod
+    def overlap_matrix(
+        elements, metric: str = "overlap", min_overlap: float = 0.0
+    ) -> torch.Tensor:
+        """
+        Build the sparse, symmetric matrix of the overlaps between the elements.
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The elements.
+            metric (str, optional): "overlap" (as `calculate_overlap`) or "iou". Defaults to "overlap".
+            min_overlap (float, optional): The smallest overlap of the stored pairs. Defaults to 0.0.
+
+        Returns:
+            torch.Tensor: A coalesced sparse COO tensor of shape (N, N) holding the nonzero values
+            of the pairs, with an empty diagonal.
+
+        Raises:
+            ValueError: If the metric is unknown.
+        """
+        if metric not in ("overlap", "iou"):
+            raise ValueError(f"Unknown metric '{metric}', expected 'overlap' or 'iou'.")
+        bboxes = LayoutUtils.bbox_array(elements)
+        pairs = LayoutUtils.overlap_pairs(
+            bboxes, with_iou=metric == "iou", min_overlap=min_overlap
+        )
+        indices = np.stack(
+            [
+                np.concatenate([pairs["row"], pairs["col"]]),
+                np.concatenate([pairs["col"], pairs["row"]]),
+            ]
+        )
+        values = np.concatenate([pairs[metric], pairs[metric]])
+        return torch.sparse_coo_tensor(
+            torch.from_numpy(indices), torch.from_numpy(values), (len(bboxes),) * 2
+        ).coalesce()
+
+    @staticmethod
+    def nms(
+        elements,
+        scores: Optional[Sequence[float]] = None,
+        threshold: float = 0.5,
+        metric: str = "iou",
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run greedy non-maximum suppression over boxes.
+
+        The boxes are visited by decreasing score, and each box that is kept suppresses the
+        boxes of lower score overlapping it by at least `threshold`. Only the overlapping pairs
+        found by `overlap_pairs` are visited, so the cost grows with the number of duplicates
+        rather than with the square of the number of boxes.
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The elements.
+            scores (Sequence[float], optional): The score of each box, e.g. an OCR confidence.
+                Defaults to the box areas. Ties go to the lowest index.
+            threshold (float, optional): The overlap from which a box is suppressed. Defaults to 0.5.
+            metric (str, optional): "iou", or "overlap" for the intersection over the smaller area
+                (as `calculate_overlap`). Defaults to "iou".
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The sorted indices of the kept boxes, and the (N,)
+            index of the box suppressing each box (-1 for the kept boxes).
+
+        Raises:
+            ValueError: If the metric is unknown.
+        """
+        if metric not in ("iou", "overlap"):
+            raise ValueError(f"Unknown metric '{metric}', expected 'iou' or 'overlap'.")
+        bboxes = LayoutUtils.bbox_array(elements)
+        n = len(bboxes)
+        if scores is None:
+            scores = bboxes[:, 2] * bboxes[:, 3]
+        rank = np.empty(n, dtype=np.int64)
+        rank[np.lexsort((np.arange(n), -np.asarray(scores, dtype=np.float64)))] = (
+            np.arange(n)
+        )
+
+        # The IoU of a pair never exceeds its overlap, so both metrics can prune on the overlap
+        pairs = LayoutUtils.overlap_pairs(
+            bboxes, with_iou=metric == "iou", min_overlap=threshold
+        )
+        close = pairs[metric] >= threshold
+        row, col = pairs["row"][close], pairs["col"][close]
+        winner = np.where(rank[row] < rank[col], row, col)
+        loser = row + col - winner
+        sort = np.argsort(rank[winner], kind="stable")
+        winner, loser = winner[sort].tolist(), loser[sort].tolist()
+
+        suppressed_by = [-1] * n
+        for w, l in zip(winner, loser):
+            # A suppressed box does not suppress others
+            if suppressed_by[w] < 0 and suppressed_by[l] < 0:
+                suppressed_by[l] = w
+        suppressed_by = np.asarray(suppressed_by, dtype=np.int64)
+        return np.flatnonzero(suppressed_by < 0), suppressed_by
+
+    @staticmethod
+    def deduplicate(
+        document: Document,
+        threshold: float = 0.5,
+        metric: str = "iou",
+        scores: Optional[Sequence[float]] = None,
+        merge: str = "concat",
+        merge_boxes: bool = False,
+        separator: str = " ",
+    ) -> Document:
+        """
+        Remove the duplicate and heavily overlapping boxes of a document, e.g. after combining
+        several OCR engines or overlapping tiles.
+
+        The boxes kept by `nms` absorb the boxes they suppress. The elements keep their order,
+        and the labels of a `DocumentEntityClassification` are those of the kept boxes.
+
+        Args:
+            document (Document): The document to clean.
+            threshold (float, optional): The overlap from which a box is suppressed. Defaults to 0.5.
+            metric (str, optional): "iou" or "overlap". Defaults to "iou".
+            scores (Sequence[float], optional): The score of each box. Defaults to the box areas.
+            merge (str, optional): How the contents of a group are combined: "keep" the content
+                of the kept box, the "longest" content, or "concat" the distinct contents from
+                left to right. Defaults to "concat".
+            merge_boxes (bool, optional): Whether each kept box becomes the union of its group.
+                Defaults to False.
+            separator (str, optional): The string inserted between concatenated contents.
+                Defaults to " ".
+
+        Returns:
+            Document: A document of the same class and storage mode holding the kept elements.
+
+        Raises:
+            ValueError: If the metric or the merge policy is unknown.
+
+        Example:
+        >>> clean = LayoutUtils.deduplicate(document, threshold=0.7, merge="longest")
+        """
+        if merge not in LayoutUtils.MERGE_POLICIES:
+            raise ValueError(
+                f"Unknown merge policy '{merge}', expected one of {LayoutUtils.MERGE_POLICIES}."
+            )
+        bboxes = np.asarray(document.bboxes)
+        keep, suppressed_by = LayoutUtils.nms(bboxes, scores, threshold, metric)
+        contents = document.contents
+
+        # Group each kept box with the boxes it suppressed, from left to right
+        n = len(bboxes)
+        owner = np.where(suppressed_by < 0, np.arange(n), suppressed_by)
+        members = np.lexsort((np.arange(n), bboxes[:, 0], owner)) if n else owner
+        starts = np.flatnonzero(np.diff(owner[members], prepend=-1))
+        ends = np.r_[starts[1:], n].astype(np.int64)
+
+        new_contents = []
+        for kept, start, end in zip(keep.tolist(), starts.tolist(), ends.tolist()):
+            group = members[start:end].tolist()
+            if merge == "keep":
+                new_contents.append(contents[kept])
+            elif merge == "longest":
+                others = [i for i in group if i != kept]
+                candidates = [contents[i] for i in [kept] + others]
+                new_contents.append(max(candidates, key=lambda c: len(str(c))))
+            else:
+                distinct = list(dict.fromkeys(str(contents[i]) for i in group))
+                new_contents.append(separator.join(distinct))
+
+        new_bboxes = bboxes[keep]
+        if merge_boxes and n:
+            ordered = bboxes[members]
+            x0 = np.minimum.reduceat(ordered[:, 0], starts)
+            y0 = np.minimum.reduceat(ordered[:, 1], starts)
+            x1 = np.maximum.reduceat(ordered[:, 0] + ordered[:, 2], starts)
+            y1 = np.maximum.reduceat(ordered[:, 1] + ordered[:, 3], starts)
+            new_bboxes = np.stack([x0, y0, x1 - x0, y1 - y0], axis=1)
+
+        labels = None
+        if isinstance(document, DocumentEntityClassification):
+            labels = document.labels
+            labels = [labels[i] for i in keep.tolist()]
+        return type(document).from_arrays(
+            document.img_path,
+            new_bboxes,
+            new_contents,
+            labels=labels,
+            shape=document.shape,
+            device=document.device,
+            columnar=document.is_columnar,
+        )
+
     @staticmethod
     def calculate_horizontal_alignment(
         a: DocElement, b: DocElement
@@ -189,6 +639,61 @@ class LayoutUtils:
             else:
                 return HorizontalAlignment.RIGHT
 
+    @staticmethod
+    def _alignment_codes(start: np.ndarray, size: np.ndarray, before, same, after):
+        """Compute the (N, N) alignment codes along one axis, as the scalar functions."""
+        a_start, b_start = start[:, None], start[None, :]
+        a_end, b_end = (start + size)[:, None], (start + size)[None, :]
+        codes = np.where(
+            a_start < b_start,
+            np.where(a_end == b_start, after.value, before.value),
+            np.where(b_end == a_start, before.value, after.value),
+        )
+        codes[a_start == b_start] = same.value
+        return codes.astype(np.int8)
+
+    @staticmethod
+    def horizontal_alignment_codes(elements) -> np.ndarray:
+        """
+        Calculate the horizontal alignment between every pair of elements at once.
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The elements.
+
+        Returns:
+            np.ndarray: The (N, N) int8 matrix whose entry (i, j) is the `HorizontalAlignment`
+            value of `calculate_horizontal_alignment(elements[i], elements[j])`.
+        """
+        bboxes = LayoutUtils.bbox_array(elements)
+        return LayoutUtils._alignment_codes(
+            bboxes[:, 0],
+            bboxes[:, 2],
+            HorizontalAlignment.LEFT,
+            HorizontalAlignment.CENTER,
+            HorizontalAlignment.RIGHT,
+        )
+
+    @staticmethod
+    def vertical_alignment_codes(elements) -> np.ndarray:
+        """
+        Calculate the vertical alignment between every pair of elements at once.
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The elements.
+
+        Returns:
+            np.ndarray: The (N, N) int8 matrix whose entry (i, j) is the `VerticalAlignment`
+            value of `calculate_vertical_alignment(elements[i], elements[j])`.
+        """
+        bboxes = LayoutUtils.bbox_array(elements)
+        return LayoutUtils._alignment_codes(
+            bboxes[:, 1],
+            bboxes[:, 3],
+            VerticalAlignment.TOP,
+            VerticalAlignment.MIDDLE,
+            VerticalAlignment.BOTTOM,
+        )
+
     @staticmethod
     def calculate_vertical_alignment(a: DocElement, b: DocElement) -> VerticalAlignment:
         """
@@ -0,0 +1,137 @@
+from collections import Counter
+from typing import Tuple
+
+import numpy as np
+
+from DocumentAI_std.base.document import Document
+from DocumentAI_std.base.document_entity_classification import (
+    DocumentEntityClassification,
+)
+from DocumentAI_std.utils.layout_utils import LayoutUtils
+
+
+class LineUtils:
+    @staticmethod
+    def group_lines(elements, min_overlap: float = 0.5) -> np.ndarray:
+        """
+        Cluster word boxes into text lines.
+
+        The boxes are sorted by vertical center and swept once: a box joins the current line
+        when its vertical overlap with the line is at least `min_overlap` times the smaller of
+        their heights, and starts a new line otherwise. The line then spans both.
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The word boxes.
+            min_overlap (float, optional): The smallest vertical overlap, relative to the smaller
+                height, for a box to join a line. Defaults to 0.5.
+
+        Returns:
+            np.ndarray: The (N,) line index of each box, the lines numbered from top to bottom.
+        """
+        bboxes = LayoutUtils.bbox_array(elements)
+        labels = np.empty(len(bboxes), dtype=np.int64)
+        tops = bboxes[:, 1].tolist()
+        bottoms = (bboxes[:, 1] + bboxes[:, 3]).tolist()
+        order = np.argsort(bboxes[:, 1] + bboxes[:, 3] / 2, kind="stable").tolist()
+
+        line = -1
+        line_top = line_bottom = 0.0
+        for i in order:
+            top, bottom = tops[i], bottoms[i]
+            if line >= 0:
+                overlap = min(bottom, line_bottom) - max(top, line_top)
+                if overlap >= min_overlap * min(bottom - top, line_bottom - line_top):
+                    labels[i] = line
+                    line_top, line_bottom = min(top, line_top), max(bottom, line_bottom)
+                    continue
+            line += 1
+            labels[i] = line
+            line_top, line_bottom = top, bottom
+        return labels
+
+    @staticmethod
+    def reading_order(
+        elements, min_overlap: float = 0.5
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Compute the reading order of word boxes, line by line and from left to right.
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The word boxes.
+            min_overlap (float, optional): The line clustering threshold of `group_lines`.
+                Defaults to 0.5.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The (N,) line index of each box, and the (N,)
+            permutation listing the boxes in reading order.
+
+        Example:
+        >>> lines, order = LineUtils.reading_order(document)
+        >>> words = [document.contents[i] for i in order]
+        """
+        bboxes = LayoutUtils.bbox_array(elements)
+        lines = LineUtils.group_lines(bboxes, min_overlap)
+        return lines, np.lexsort((bboxes[:, 0], lines))
+
+    @staticmethod
+    def merge_lines(
+        document: Document, min_overlap: float = 0.5, separator: str = " "
+    ) -> Document:
+        """
+        Build the line-level document of a word-level document.
+
+        Each line element is the bounding box of its words, with their contents joined in
+        reading order. For a `DocumentEntityClassification`, each line takes the most common
+        label of its words (the first one in reading order on ties).
+
+        Args:
+            document (Document): The word-level document.
+            min_overlap (float, optional): The line clustering threshold of `group_lines`.
+                Defaults to 0.5.
+            separator (str, optional): The string inserted between the words of a line.
+                Defaults to " ".
+
+        Returns:
+            Document: A document of the same class and storage mode, holding one element per line.
+        """
+        bboxes = np.asarray(document.bboxes)
+        lines, order = LineUtils.reading_order(bboxes, min_overlap)
+        contents = document.contents
+        labels = (
+            document.labels
+            if isinstance(document, DocumentEntityClassification)
+            else None
+        )
+
+        sorted_lines = lines[order]
+        starts = np.flatnonzero(np.diff(sorted_lines, prepend=-1))
+        ends = np.r_[starts[1:], len(order)].astype(np.int64)
+        if len(order):
+            ordered = bboxes[order]
+            x0 = np.minimum.reduceat(ordered[:, 0], starts)
+            y0 = np.minimum.reduceat(ordered[:, 1], starts)
+            x1 = np.maximum.reduceat(ordered[:, 0] + ordered[:, 2], starts)
+            y1 = np.maximum.reduceat(ordered[:, 1] + ordered[:, 3], starts)
+            line_bboxes = np.stack([x0, y0, x1 - x0, y1 - y0], axis=1)
+        else:
+            line_bboxes = np.zeros((0, 4), dtype=bboxes.dtype)
+
+        order = order.tolist()
+        line_contents = []
+        line_labels = [] if labels is not None else None
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            words = order[start:end]
+            line_contents.append(separator.join(str(contents[i]) for i in words))
+            if labels is not None:
+                counts = Counter(labels[i] for i in words)
+                line_labels.append(counts.most_common(1)[0][0])
+
+        return type(document).from_arrays(
+            document.img_path,
+            line_bboxes,
+            line_contents,
+            labels=line_labels,
+            shape=document.shape,
+            device=document.device,
+            columnar=document.is_columnar,
+        )
@@ -0,0 +1,129 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from DocumentAI_std.utils.layout_utils import LayoutUtils
+
+
+class SegmentationUtils:
+    @staticmethod
+    def _valleys(
+        lo: np.ndarray, hi: np.ndarray, min_gap: float
+    ) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Find the whitespace valleys of the projection profile of intervals.
+
+        The intervals are sorted by start; the running maximum of their ends is the right
+        edge of the occupied part of the profile, so a valley lies wherever the next interval
+        starts after it.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, float]: The sort order of the intervals, the group of
+            each sorted interval once the profile is cut at the valleys at least `min_gap` wide,
+            and the width of the widest valley (0 if there is none).
+        """
+        order = np.argsort(lo, kind="stable")
+        starts = lo[order]
+        covered = np.maximum.accumulate(hi[order])
+        gaps = starts[1:] - covered[:-1]
+        cuts = (gaps > 0) & (gaps >= min_gap)
+        groups = np.concatenate([[0], np.cumsum(cuts)])
+        widest = float(gaps[cuts].max()) if cuts.any() else 0.0
+        return order, groups, widest
+
+    @staticmethod
+    def xy_cut(
+        elements,
+        min_gap_x: Optional[float] = None,
+        min_gap_y: Optional[float] = None,
+        max_depth: Optional[int] = None,
+    ) -> dict:
+        """
+        Segment a page into nested regions with the recursive XY-cut algorithm.
+
+        At each region, the horizontal and vertical projection profiles of its boxes are
+        computed with NumPy, and the region is cut at every whitespace valley of the profile
+        holding the widest one (rows are preferred on ties). Each part is then segmented the
+        same way, until no valley is wide enough.
+
+        Args:
+            elements (Document, Sequence[DocElement], np.ndarray or List[List]): The word boxes.
+            min_gap_x (float, optional): The narrowest vertical whitespace (between columns)
+                to cut at. Defaults to the median box height.
+            min_gap_y (float, optional): The narrowest horizontal whitespace (between rows)
+                to cut at. Defaults to the median box height.
+            max_depth (int, optional): The largest depth of the tree. Defaults to no limit.
+
+        Returns:
+            dict: The root region. Each region is a dictionary with the keys:
+                  - "bbox": The [x, y, w, h] box enclosing the members of the region.
+                  - "indices": The sorted (M,) indices of the elements of the region.
+                  - "axis": "y" if the region is cut into rows, "x" if it is cut into columns,
+                    None for a leaf.
+                  - "children": The sub-regions, from top to bottom or from left to right.
+
+        Example:
+        >>> tree = SegmentationUtils.xy_cut(document, min_gap_x=30, min_gap_y=20)
+        >>> blocks = SegmentationUtils.leaves(tree)
+        """
+        bboxes = LayoutUtils.bbox_array(elements)
+        x0, y0 = bboxes[:, 0], bboxes[:, 1]
+        x1, y1 = x0 + bboxes[:, 2], y0 + bboxes[:, 3]
+        median_height = float(np.median(bboxes[:, 3])) if len(bboxes) else 0.0
+        min_gap_x = median_height if min_gap_x is None else min_gap_x
+        min_gap_y = median_height if min_gap_y is None else min_gap_y
+
+        def segment(indices: np.ndarray, depth: int) -> dict:
+            region = {
+                "bbox": (
+                    [
+                        float(x0[indices].min()),
+                        float(y0[indices].min()),
+                        float(x1[indices].max() - x0[indices].min()),
+                        float(y1[indices].max() - y0[indices].min()),
+                    ]
+                    if len(indices)
+                    else [0.0, 0.0, 0.0, 0.0]
+                ),
+                "indices": indices,
+                "axis": None,
+                "children": [],
+            }
+            if len(indices) < 2 or (max_depth is not None and depth >= max_depth):
+                return region
+
+            rows = SegmentationUtils._valleys(y0[indices], y1[indices], min_gap_y)
+            columns = SegmentationUtils._valleys(x0[indices], x1[indices], min_gap_x)
+            if rows[2] == 0 and columns[2] == 0:
+                return region
+            axis, (order, groups, _) = (
+                ("y", rows) if rows[2] >= columns[2] else ("x", columns)
+            )
+
+            region["axis"] = axis
+            bounds = np.flatnonzero(np.diff(groups, prepend=-1, append=groups[-1] + 1))
+            for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                members = np.sort(indices[order[start:end]])
+                region["children"].append(segment(members, depth + 1))
+            return region
+
+        return segment(np.arange(len(bboxes)), 0)
+
+    @staticmethod
+    def leaves(region: dict) -> List[np.ndarray]:
+        """
+        List the element indices of the leaf regions of an XY-cut tree, in reading order.
+
+        Args:
+            region (dict): A region returned by `xy_cut`.
+
+        Returns:
+            List[np.ndarray]: The indices of each leaf region, top to bottom and left to right.
+        """
+        if not region["children"]:
+            return [region["indices"]] if len(region["indices"]) else []
+        return [
+            indices
+            for child in region["children"]
+            for indices in SegmentationUtils.leaves(child)
+        ]